@@ -0,0 +1,67 @@
+"""Synthetic data for the benchmarks, generated from the schema of the DB.
+
+The first field of the schema holds the number of the row, so every row is unique. The other
+fields get random values, and the str fields take one of a few values, like a city or a status.
+"""
+from typing import Any
+from typing import Dict
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+SchemaDictType = Dict[str, Dict[str, object]]
+
+# the number of distinct values of the str fields other than the first one
+STR_CARDINALITY = 50
+
+# the int values are kept small, so they fit in every dtype of the int fields
+INT_RANGE = 100
+
+
+def generate_columns(schema: SchemaDictType, rows: int, start: int = 0, seed: int = 0) -> Dict[str, List[Any]]:
+    """Returns the values of the rows start to start + rows, as a list of python values for
+        every field. The same seed and start always give the same values
+    """
+
+    rand = np.random.default_rng([seed, start])
+    columns: Dict[str, List[Any]] = {}
+
+    for pos, (field, props) in enumerate(schema.items()):
+        type_ = props["type"]
+        numbers = np.arange(start, start + rows)
+
+        if type_ == "str":
+            if pos == 0:
+                columns[field] = [f"{field}{i}" for i in numbers.tolist()]
+            else:
+                choices = [f"{field}{i}" for i in range(STR_CARDINALITY)]
+                columns[field] = [choices[i] for i in rand.integers(0, STR_CARDINALITY, rows).tolist()]
+
+        elif type_ == "int":
+            columns[field] = numbers.tolist() if pos == 0 else rand.integers(0, INT_RANGE, rows).tolist()
+
+        elif type_ == "float":
+            columns[field] = numbers.astype(float).tolist() if pos == 0 else rand.random(rows).round(3).tolist()
+
+        elif type_ == "bool":
+            if pos == 0:
+                raise ValueError("The first field of the schema must not be a bool, as it holds the row number")
+            columns[field] = (rand.random(rows) < 0.5).tolist()
+
+        else:
+            raise ValueError(f"Unknown type {type_!r} of the field {field!r}")
+
+    return columns
+
+
+def generate_frame(schema: SchemaDictType, rows: int, start: int = 0, seed: int = 0) -> pd.DataFrame:
+    """Returns the rows as a DataFrame, for add_bulk"""
+    return pd.DataFrame(generate_columns(schema, rows, start, seed))
+
+
+def generate_records(schema: SchemaDictType, rows: int, start: int = 0, seed: int = 0) -> List[Dict[str, Any]]:
+    """Returns the rows as a list of dicts, for add"""
+
+    columns = generate_columns(schema, rows, start, seed)
+    return [dict(zip(columns, values)) for values in zip(*columns.values())]
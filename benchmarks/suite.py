@@ -0,0 +1,208 @@
+"""Benchmarks of every operation of OnstroDb, on DBs of synthetic rows.
+
+    python -m benchmarks.suite --rows 10000 100000 1000000 10000000 --output results.json
+    python -m benchmarks.suite --rows 10000 --baseline results.json
+
+For every number of rows, a DB is filled with add_bulk, committed, and then every operation is
+timed --repeat times, each call on different rows. The results are written as JSON, and are
+compared to the results in --baseline if it is provided. The benchmark fails if the median time
+of an operation grew by more than --threshold.
+"""
+import argparse
+import functools
+import json
+import platform
+import shutil
+import statistics
+import tempfile
+import time
+from typing import Any
+from typing import Callable
+from typing import cast
+from typing import Dict
+from typing import List
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+import onstrodb
+from .data import generate_frame
+from .data import generate_records
+from .data import SchemaDictType
+from onstrodb import OnstroDb
+from onstrodb.core.hashing import HashIdType
+
+DEFAULT_ROWS = [10_000, 100_000, 1_000_000, 10_000_000]
+
+# the sha256 ids collide once the DB holds around 100,000 rows
+DEFAULT_HASH_SCHEME = "blake2b64"
+
+schema: SchemaDictType = {
+    "name": {"type": "str", "required": True},
+    "age": {"type": "int", "dtype": "int32"},
+    "score": {"type": "float"},
+    "active": {"type": "bool"},
+    "place": {"type": "str", "default": "place0", "index": True}
+}
+
+ResultType = Dict[str, Any]
+
+
+def time_calls(fn: Callable[[int], object], repeat: int) -> List[float]:
+    """Calls fn with 0 to repeat - 1, and returns the time taken by every call"""
+
+    times = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        fn(i)
+        times.append(time.perf_counter() - start)
+
+    return times
+
+
+def summarize(op: str, rows: int, storage_format: str, times: List[float]) -> ResultType:
+    return {
+        "op": op,
+        "rows": rows,
+        "storage_format": storage_format,
+        "calls": len(times),
+        "min_s": min(times),
+        "median_s": statistics.median(times),
+        "mean_s": statistics.fmean(times),
+        "max_s": max(times)
+    }
+
+
+def run(rows: int, storage_format: str, repeat: int, hash_scheme: str) -> List[ResultType]:
+    """Runs every benchmark on a DB of the rows, and returns the results"""
+
+    results: List[ResultType] = []
+    db_path = tempfile.mkdtemp(prefix="onstro-bench-")
+
+    def record(op: str, times: List[float]) -> None:
+        result = summarize(op, rows, storage_format, times)
+        results.append(result)
+        print(f"{rows:>10,} {storage_format:>8} {op:<20} median {result['median_s'] * 1000:10.3f} ms")
+
+    try:
+        db = OnstroDb("bench", schema=schema, db_path=db_path, storage_format=storage_format, hash_scheme=hash_scheme)
+        frame = generate_frame(schema, rows)
+        ids: List[HashIdType] = []
+
+        def add_bulk(rows: pd.DataFrame, _: int) -> None:
+            ids.extend(cast(List[HashIdType], db.add_bulk(rows, get_hash_id=True)))
+
+        # the frame is bound to the call, and not referenced by add_bulk, so it can be deleted once added
+        record("add_bulk", time_calls(functools.partial(add_bulk, frame), 1))
+        names = frame["name"].tolist()
+        del frame
+
+        record("commit_full", time_calls(lambda _: db.commit(), 1))
+        record("open", time_calls(lambda _: OnstroDb("bench", db_path=db_path), repeat))
+
+        # the mutating benchmarks use different rows, so every call changes a row
+        rand = np.random.default_rng(0)
+        positions = rand.choice(rows, size=min(rows, 7 * repeat), replace=False).tolist()
+        parts = [positions[i::7] for i in range(7)]
+        repeat = min(repeat, len(parts[-1]))
+
+        record("get_by_query", time_calls(lambda i: db.get_by_query({"name": names[parts[0][i]]}), repeat))
+        record("get_by_query_index", time_calls(lambda i: db.get_by_query({"place": f"place{i}"}), repeat))
+        record("get_by_hash_id", time_calls(lambda i: db.get_by_hash_id(ids[parts[0][i]]), repeat))
+        record("get_hash_id", time_calls(lambda i: db.get_hash_id({"name": names[parts[0][i]]}), repeat))
+        record("get_by_filter", time_calls(
+            lambda i: db.get_by_filter({"place": f"place{i}", "age": {"$gte": 95}}), repeat))
+
+        record("update_by_query", time_calls(
+            lambda i: db.update_by_query({"name": names[parts[0][i]]}, {"score": -1.0}), repeat))
+        record("update_by_hash_id", time_calls(
+            lambda i: db.update_by_hash_id(ids[parts[1][i]], {"score": -1.0}), repeat))
+        record("update_by_filter", time_calls(
+            lambda i: db.update_by_filter({"name": {"$eq": names[parts[2][i]]}}, {"score": -1.0}), repeat))
+
+        record("delete_by_query", time_calls(lambda i: db.delete_by_query({"name": names[parts[3][i]]}), repeat))
+        record("delete_by_hash_id", time_calls(lambda i: db.delete_by_hash_id(ids[parts[4][i]]), repeat))
+        record("delete_by_filter", time_calls(
+            lambda i: db.delete_by_filter({"name": {"$eq": names[parts[5][i]]}}), repeat))
+
+        new_rows = generate_records(schema, repeat, start=rows)
+        record("add", time_calls(lambda i: db.add([new_rows[i]]), repeat))
+
+        # a commit appends the changes made since the last one to the write ahead log
+        commit_times: List[float] = []
+        for i in range(repeat):
+            db.update_by_hash_id(ids[parts[6][i]], {"age": i})
+            commit_times.extend(time_calls(lambda _: db.commit(), 1))
+        record("commit", commit_times)
+
+        record("checkpoint", time_calls(lambda _: db.checkpoint(), 1))
+        record("open_checkpoint", time_calls(lambda _: OnstroDb("bench", db_path=db_path), repeat))
+
+    finally:
+        shutil.rmtree(db_path, ignore_errors=True)
+
+    return results
+
+
+def compare(results: List[ResultType], baseline: List[ResultType], threshold: float) -> List[str]:
+    """Returns a line for every operation whose median time grew by more than the threshold"""
+
+    old = {(i["op"], i["rows"], i["storage_format"]): i["median_s"] for i in baseline}
+    regressions = []
+
+    for result in results:
+        key = (result["op"], result["rows"], result["storage_format"])
+        if key in old and result["median_s"] > old[key] * (1 + threshold):
+            regressions.append(f"{key[0]} ({key[1]:,} rows, {key[2]}): "
+                               f"{old[key] * 1000:.3f} ms -> {result['median_s'] * 1000:.3f} ms")
+
+    return regressions
+
+
+def environment() -> Dict[str, str]:
+    return {
+        "onstrodb": onstrodb.__version__,
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z")
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=DEFAULT_ROWS, help="the numbers of rows of the DBs")
+    parser.add_argument("--formats", nargs="+", default=["pickle"], choices=["pickle", "columnar"],
+                        help="the storage formats of the DBs")
+    parser.add_argument("--repeat", type=int, default=20, help="the number of calls of every operation")
+    parser.add_argument("--hash-scheme", default=DEFAULT_HASH_SCHEME, help="the hash scheme of the DBs")
+    parser.add_argument("--output", default="benchmark_results.json", help="the file the results are written to")
+    parser.add_argument("--baseline", help="the results of an earlier run, to compare the results with")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="the fraction by which the median time of an operation can grow")
+    args = parser.parse_args(argv)
+
+    if args.repeat < 1:
+        parser.error("--repeat must be at least 1")
+
+    results = [r for rows in args.rows for fmt in args.formats for r in run(rows, fmt, args.repeat, args.hash_scheme)]
+
+    with open(args.output, "w") as f:
+        json.dump({"environment": environment(), "arguments": vars(args), "results": results}, f, indent=2)
+    print(f"results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f)["results"], args.threshold)
+
+        for line in regressions:
+            print(f"regression: {line}")
+        return 1 if regressions else 0
+
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
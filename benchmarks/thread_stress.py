@@ -0,0 +1,142 @@
+"""A multi-threaded stress benchmark of OnstroDb, with many readers and a single writer.
+
+    python -m benchmarks.thread_stress --rows 100000 --readers 8 --seconds 10
+
+The readers check that every row they get matches their query, so the benchmark also
+fails if a reader sees a half written change.
+"""
+import argparse
+import random
+import statistics
+import threading
+import time
+from typing import Any
+from typing import Callable
+from typing import cast
+from typing import Dict
+from typing import List
+from typing import Optional
+
+from onstrodb import OnstroDb
+
+PLACES = ["canada", "france", "texas", "india", "japan"]
+
+RowsType = Dict[str, Dict[str, Any]]
+
+schema: Dict[str, Dict[str, object]] = {
+    "name": {"type": "str", "required": True},
+    "age": {"type": "int", "required": True},
+    "place": {"type": "str", "default": "canada"}
+}
+
+
+class Worker(threading.Thread):
+
+    """Runs the operation until stopped, and records the latency of every call"""
+
+    def __init__(self, name: str, op: Callable[[random.Random], None], stop: threading.Event) -> None:
+        super().__init__(name=name)
+        self.op = op
+        self.stop = stop
+        self.latencies: List[float] = []
+        self.error: Optional[BaseException] = None
+
+    def run(self) -> None:
+        rand = random.Random(self.name)
+        try:
+            while not self.stop.is_set():
+                start = time.perf_counter()
+                self.op(rand)
+                self.latencies.append(time.perf_counter() - start)
+        except BaseException as e:
+            self.error = e
+            self.stop.set()
+
+
+def build_db(rows: int) -> OnstroDb:
+    db = OnstroDb("stress", schema=schema, in_memory=True)
+    db.add_bulk([{"name": f"name{i}", "age": i % 100, "place": PLACES[i % len(PLACES)]} for i in range(rows)])
+    db.create_index("place")
+    return db
+
+
+def reader(db: OnstroDb) -> Callable[[random.Random], None]:
+    def op(rand: random.Random) -> None:
+        place = rand.choice(PLACES)
+        if rand.random() < 0.5:
+            rows = cast(RowsType, db.get_by_query({"place": place}, columns=["place"]))
+            assert all(row["place"] == place for row in rows.values()), "get_by_query returned a wrong row"
+
+        else:
+            age = rand.randrange(100)
+            rows = cast(RowsType, db.get_by_filter({"place": place, "age": {"$gte": age}}))
+            assert all(row["place"] == place and row["age"] >= age for row in rows.values()), \
+                "get_by_filter returned a wrong row"
+
+    return op
+
+
+def writer(db: OnstroDb) -> Callable[[random.Random], None]:
+    counter = iter(range(10 ** 12))
+
+    def op(rand: random.Random) -> None:
+        i = next(counter)
+        place = rand.randrange(len(PLACES))
+        ids = cast(List[str], db.add([{"name": f"new{i}", "age": rand.randrange(100), "place": PLACES[place]}],
+                                     get_hash_id=True))
+
+        # moves the row to another place, which changes the index of the readers
+        new_idx = db.update_by_hash_id(ids[0], {"place": PLACES[(place + 1) % len(PLACES)]})
+        if rand.random() < 0.5:
+            db.delete_by_hash_id(new_idx[ids[0]])
+
+    return op
+
+
+def report(role: str, workers: List[Worker], seconds: float) -> None:
+    latencies = sorted(i for w in workers for i in w.latencies)
+    if not latencies:
+        print(f"{role}: no operations completed")
+        return
+
+    p99 = latencies[int(len(latencies) * 0.99) - 1] if len(latencies) >= 100 else latencies[-1]
+    print(f"{role}: {len(latencies) / seconds:,.1f} ops/s, "
+          f"p50 {statistics.median(latencies) * 1000:.2f} ms, p99 {p99 * 1000:.2f} ms")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000, help="the number of rows in the DB")
+    parser.add_argument("--readers", type=int, default=8, help="the number of reader threads")
+    parser.add_argument("--seconds", type=float, default=10.0, help="how long the benchmark runs")
+    args = parser.parse_args()
+
+    db = build_db(args.rows)
+    stop = threading.Event()
+
+    readers = [Worker(f"reader-{i}", reader(db), stop) for i in range(args.readers)]
+    writers = [Worker("writer", writer(db), stop)]
+
+    start = time.perf_counter()
+    for w in readers + writers:
+        w.start()
+
+    stop.wait(args.seconds)
+    stop.set()
+    for w in readers + writers:
+        w.join()
+    elapsed = time.perf_counter() - start
+
+    errors = [w.error for w in readers + writers if w.error is not None]
+    for e in errors:
+        print(f"error: {e!r}")
+
+    report("readers", readers, elapsed)
+    report("writer", writers, elapsed)
+    print(f"rows at the end: {len(db)}")
+
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
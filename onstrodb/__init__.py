@@ -1,3 +1,26 @@
-from .core.db import OnstroDb  # noqa:F401
+from typing import Any
+from typing import TYPE_CHECKING
 
 __version__ = "0.2.2"
+
+__all__ = ["AsyncOnstroDb", "OnstroDb"]
+
+if TYPE_CHECKING:
+    from .core.async_db import AsyncOnstroDb  # noqa:F401
+    from .core.db import OnstroDb  # noqa:F401
+
+
+def __getattr__(name: str) -> Any:
+    """Imports the DB classes when they are first used, since they import pandas, which
+        takes most of the time of importing the package
+    """
+
+    if name == "OnstroDb":
+        from .core.db import OnstroDb
+        return OnstroDb
+
+    if name == "AsyncOnstroDb":
+        from .core.async_db import AsyncOnstroDb
+        return AsyncOnstroDb
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
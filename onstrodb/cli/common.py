@@ -2,19 +2,22 @@
 # the user might user, like the create, delete and the purge ...etc to name a few
 import os
 from argparse import _SubParsersAction
+from argparse import ArgumentParser
 
 
-def create(sub_parser: _SubParsersAction) -> None:
+def create(sub_parser: "_SubParsersAction[ArgumentParser]") -> None:
     create = sub_parser.add_parser("create")
     create.add_argument("name", type=str, help="The name of the DB")
     create.add_argument("schema", type=str,
                         help="The path to the schema with which to create the DB from (*.json)")
+    create.add_argument("--hash-scheme", type=str, choices=["sha256", "blake2b64", "blake2b128"],
+                        help="The hash scheme of the hash ids, sha256 by default.")
     create.add_argument("-d", type=str, nargs="?",
                         default=os.path.join(os.getcwd(), "onstro-db"),
                         help="The directory where all the DB's are stored.")
 
 
-def purge(sub_parser: _SubParsersAction) -> None:
+def purge(sub_parser: "_SubParsersAction[ArgumentParser]") -> None:
     purge = sub_parser.add_parser("purge")
     purge.add_argument("name", type=str, help="The name of the DB to purge.")
     purge.add_argument("-d", type=str, nargs="?",
@@ -22,7 +25,7 @@ def purge(sub_parser: _SubParsersAction) -> None:
                        help="The directory where all the DB's are stored.")
 
 
-def delete(sub_parser: _SubParsersAction) -> None:
+def delete(sub_parser: "_SubParsersAction[ArgumentParser]") -> None:
     delete = sub_parser.add_parser("delete")
     delete.add_argument("name", type=str, help="The name of the DB to delete.")
     delete.add_argument("-d", type=str, nargs="?",
@@ -30,7 +33,59 @@ def delete(sub_parser: _SubParsersAction) -> None:
                         help="The directory where all the DB's are stored.")
 
 
-def add_common_cmds(sub_parser: _SubParsersAction) -> None:
+def import_(sub_parser: "_SubParsersAction[ArgumentParser]") -> None:
+    import_ = sub_parser.add_parser("import", help="Add the rows of a CSV or JSON Lines file to the DB")
+    import_.add_argument("name", type=str, help="The name of the DB to add the rows to.")
+    import_.add_argument("file", type=str, help="The file to read the rows from (*.csv, *.jsonl)")
+    import_.add_argument("--format", type=str, choices=["csv", "jsonl"],
+                         help="The format of the file, if it can't be found from its extension.")
+    import_.add_argument("--chunk-size", type=int, default=100_000,
+                         help="The number of rows that are read and added at a time.")
+    import_.add_argument("-d", type=str, nargs="?",
+                         default=os.path.join(os.getcwd(), "onstro-db"),
+                         help="The directory where all the DB's are stored.")
+
+
+def export(sub_parser: "_SubParsersAction[ArgumentParser]") -> None:
+    export = sub_parser.add_parser("export", help="Write the rows of the DB to a CSV or JSON Lines file")
+    export.add_argument("name", type=str, help="The name of the DB to export.")
+    export.add_argument("file", type=str, help="The file to write the rows to (*.csv, *.jsonl)")
+    export.add_argument("--format", type=str, choices=["csv", "jsonl"],
+                        help="The format of the file, if it can't be found from its extension.")
+    export.add_argument("--chunk-size", type=int, default=100_000,
+                        help="The number of rows that are written at a time.")
+    export.add_argument("--columns", type=str, nargs="+", help="The columns to export, all of them by default.")
+    export.add_argument("-d", type=str, nargs="?",
+                        default=os.path.join(os.getcwd(), "onstro-db"),
+                        help="The directory where all the DB's are stored.")
+
+
+def query(sub_parser: "_SubParsersAction[ArgumentParser]") -> None:
+    query = sub_parser.add_parser("query", help="Print the rows of the DB that matches the conditions as JSON Lines")
+    query.add_argument("name", type=str, help="The name of the DB to query.")
+    query.add_argument("conditions", type=str, nargs="*", metavar="field=value",
+                       help="The values the rows must have, all the rows are printed if there are none.")
+    query.add_argument("--columns", type=str, nargs="+", help="The columns to print, all of them by default.")
+    query.add_argument("--limit", type=int, help="The maximum number of rows to print.")
+    query.add_argument("-d", type=str, nargs="?",
+                       default=os.path.join(os.getcwd(), "onstro-db"),
+                       help="The directory where all the DB's are stored.")
+
+
+def stats(sub_parser: "_SubParsersAction[ArgumentParser]") -> None:
+    stats = sub_parser.add_parser("stats", help="Print the number of rows, the memory and the disk space of the DB")
+    stats.add_argument("name", type=str, help="The name of the DB.")
+    stats.add_argument("--json", action="store_true", help="Print the stats as JSON.")
+    stats.add_argument("-d", type=str, nargs="?",
+                       default=os.path.join(os.getcwd(), "onstro-db"),
+                       help="The directory where all the DB's are stored.")
+
+
+def add_common_cmds(sub_parser: "_SubParsersAction[ArgumentParser]") -> None:
     create(sub_parser)
     purge(sub_parser)
     delete(sub_parser)
+    import_(sub_parser)
+    export(sub_parser)
+    query(sub_parser)
+    stats(sub_parser)
@@ -0,0 +1,302 @@
+# the query and the stats commands. The stats of a columnar DB are read from the meta data of its
+# files, so its columns are not loaded. The stats command never changes the files of the DB
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Set
+from typing import Tuple
+from typing import TYPE_CHECKING
+
+from onstrodb.core.files import current_columnar_path
+from onstrodb.core.files import load_cached_schema
+from onstrodb.core.files import load_columnar_meta
+from onstrodb.core.files import load_generation
+from onstrodb.core.files import load_index_fields
+from onstrodb.core.files import lock_path
+from onstrodb.core.lock import FileLock
+
+if TYPE_CHECKING:
+    from onstrodb import OnstroDb
+
+# the size of a python str object without its characters, and of the pointer to it in an object array
+STR_OVERHEAD = 49 + 8
+
+# the size of the offset of every value of an arrow string array
+ARROW_OFFSET_SIZE = 8
+
+
+def parse_conditions(conditions: List[str], schema: Dict[str, Dict[str, object]]) -> Dict[str, object]:
+    """Parses the field=value conditions to a query, with the values converted to the types of the schema"""
+
+    query: Dict[str, object] = {}
+    for condition in conditions:
+        field, sep, value = condition.partition("=")
+        if not sep:
+            raise ValueError(f"The condition {condition!r} must look like field=value")
+        if field not in schema:
+            raise ValueError(f"The field {field!r} is not in the schema")
+
+        type_ = schema[field]["type"]
+        try:
+            if type_ == "int":
+                query[field] = int(value)
+            elif type_ == "float":
+                query[field] = float(value)
+            elif type_ == "bool":
+                if value.lower() not in ("true", "false"):
+                    raise ValueError
+                query[field] = value.lower() == "true"
+            else:
+                query[field] = value
+
+        except ValueError:
+            raise ValueError(f"The value {value!r} of the field {field!r} is not a valid {type_}") from None
+
+    return query
+
+
+def query_rows(db: "OnstroDb", query: Dict[str, object], columns: Optional[List[str]] = None,
+               limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Returns the rows that matches the query as {hash_id: row} dicts, at most limit of them. The rows
+        are read in chunks when the query has at most one condition, so only the returned rows are converted
+    """
+
+    rows: List[Dict[str, Any]] = []
+    if limit == 0:
+        return rows
+
+    if len(query) > 1:
+        result = db.get_by_filter(query, columns) or {}
+        return [{k: v} for k, v in list(result.items())[:limit]]
+
+    chunk_size = min(limit or 1000, 1000)
+    for frame in db.iter_frames(query or None, columns, chunk_size):
+        # the missing values, which are NaN in the float columns, are returned as None
+        records = frame.astype(object).where(frame.notna(), None).to_dict("index")
+        rows.extend({k: v} for k, v in records.items())
+
+        if limit is not None and len(rows) >= limit:
+            return rows[:limit]
+
+    return rows
+
+
+def dump_rows(rows: List[Dict[str, Any]]) -> str:
+    return "".join(json.dumps(i, ensure_ascii=False, default=str) + "\n" for i in rows)
+
+
+def _file_size(path: str) -> int:
+    return os.path.getsize(path) if Path(path).is_file() else 0
+
+
+def _dir_size(path: str) -> int:
+    return sum(i.stat().st_size for i in Path(path).iterdir() if i.is_file()) if Path(path).is_dir() else 0
+
+
+def _column_files_size(path: str, name: str) -> int:
+    """returns the size of the files of the column, and of its dictionary if it has one"""
+    return sum(i.stat().st_size for i in Path(path).iterdir() if i.name.split(".")[0] in (name, f"{name}d"))
+
+
+def _python_strings() -> bool:
+    """returns whether the str columns are loaded as python strings, and not as arrow strings"""
+    import pandas as pd
+
+    return bool(pd.StringDtype().storage == "python")
+
+
+def _estimated_memory(path: str, name: str, meta: Dict[str, Any], rows: int, python_strings: bool = True) -> int:
+    """Estimates the memory used by the values of the column once it is loaded, from its meta data
+        and its files. The caches built by pandas, like the hash tables of the dictionaries, are not counted
+    """
+
+    if meta["kind"] == "numeric":
+        return rows * int(meta["dtype"][2:])
+
+    if meta["kind"] == "masked":
+        return rows * (int(meta["dtype"][2:]) + 1)
+
+    if meta["kind"] == "dictionary":
+        # the dictionaries are always python strings
+        return _estimated_memory(path, name, meta["codes"], rows) + \
+            _estimated_memory(path, f"{name}d", meta["dictionary"], meta["size"])
+
+    if meta["kind"] == "str":
+        data_size = _file_size(os.path.join(path, f"{name}.dat"))
+        if python_strings:
+            return rows * STR_OVERHEAD + data_size
+
+        # the arrow strings are stored as their utf-8 bytes, with an offset and a validity bit each
+        return data_size + rows * ARROW_OFFSET_SIZE + (rows + 7) // 8
+
+    # the size of the pickled values is the closest estimate there is
+    return _file_size(os.path.join(path, f"{name}.pkl"))
+
+
+def table_stats(db_name: str, db_dir: str) -> Dict[str, Any]:
+    """Returns the number of rows, the memory and the disk space used by every column, the size of
+        the files, the status of the indexes and the time of the last commit of the stored DB
+    """
+
+    db_path = os.path.join(db_dir, db_name)
+    schema = load_cached_schema(db_path) or {}
+    cols_path = current_columnar_path(db_path, db_name)
+
+    memory: Dict[str, int]
+    wal_indexes: Set[str]
+
+    with FileLock(lock_path(db_path, db_name)).hold(shared=True):
+        meta = load_columnar_meta(db_path, db_name)
+        wal_size = _file_size(os.path.join(db_path, f"{db_name}.wal"))
+
+        if meta is not None and not wal_size:
+            rows, memory, wal_indexes, exact = meta["rows"], {}, set(), True
+        else:
+            # the columns of a columnar DB are estimated from its files instead of the log
+            rows, memory, wal_indexes, exact = _replayed_stats(db_path, db_name, count_memory=meta is None)
+
+    estimated = set() if exact else set(memory)
+    if meta is not None:
+        # the str columns are loaded with the string storage set in the options of pandas, which is
+        # only imported if there are any
+        python_strings = _python_strings() if any(i["kind"] == "str" for i in meta["kinds"]) else True
+
+        for pos, column in enumerate(meta["columns"]):
+            if column not in memory:
+                memory[column] = _estimated_memory(cols_path, str(pos), meta["kinds"][pos], rows, python_strings)
+                estimated.add(column)
+
+    disk = {column: _column_files_size(cols_path, str(pos)) for pos, column in enumerate(meta["columns"])} \
+        if meta is not None else {}
+
+    index_fields = load_index_fields(db_path, db_name)
+    indexes = {}
+    for field in schema:
+        stored = index_fields is not None and field in index_fields[1]
+        if schema[field].get("index") or stored or field in wal_indexes:
+            indexes[field] = "stored" if stored and index_fields is not None and index_fields[0] == rows \
+                else "rebuilt when the DB is opened"
+
+    gen_path = os.path.join(db_path, f"{db_name}.gen")
+    files = {
+        "table": _file_size(os.path.join(db_path, f"{db_name}.db")) + _dir_size(cols_path),
+        "wal": wal_size,
+        "indexes": _file_size(os.path.join(db_path, f"{db_name}.idx")),
+    }
+
+    return {
+        "name": db_name,
+        "storage_format": "columnar" if meta is not None else "pickle",
+        "rows": rows,
+        "columns": {
+            column: {
+                "type": props["type"],
+                "memory": memory.get(column, 0),
+                "memory_estimated": column in estimated,
+                "disk": disk.get(column)
+            } for column, props in schema.items()
+        },
+        "files": {**files, "total": sum(files.values())},
+        "indexes": indexes,
+        "generation": load_generation(db_path, db_name),
+        "last_commit": os.path.getmtime(gen_path) if Path(gen_path).is_file() else None
+    }
+
+
+def _replayed_stats(db_path: str, db_name: str, count_memory: bool) -> Tuple[int, Dict[str, int], Set[str], bool]:
+    """Returns the number of rows of the DB, the memory used by its columns if count_memory is True,
+        the fields indexed by the write ahead log, and whether the memory is exact. The log is replayed
+        over the hash ids of the stored DB, and is not truncated. The memory of the rows added by the
+        log is counted from the log, and is scaled to the number of rows left. Only the index of a
+        columnar DB is loaded
+    """
+
+    from onstrodb.core.utils import load_db
+    from onstrodb.core.utils import load_wal
+
+    data = load_db(db_path, db_name, columns=[])
+    entries, _ = load_wal(db_path, db_name)
+
+    ids = set() if data is None else set(data.index)
+    lsn = 0 if data is None else data.attrs.get("lsn", 0)
+    frames = [] if data is None else [data]
+    indexes: Set[str] = set()
+    exact = True
+
+    for entry_lsn, op, payload in entries:
+        if entry_lsn <= lsn:
+            continue
+
+        exact = False
+        # the same rules as when the DB replays the log
+        if op == "add":
+            frames.append(payload.loc[~payload.index.isin(ids)])
+            ids.update(payload.index)
+        elif op == "update":
+            for old, new in payload["ids"].items():
+                if old in ids and (old == new or new not in ids):
+                    ids.discard(old)
+                    ids.add(new)
+        elif op == "delete":
+            ids.difference_update(payload)
+        elif op == "purge":
+            ids.clear()
+            frames = []
+        elif op == "index":
+            indexes.add(payload)
+
+    memory: Dict[str, int] = {}
+    for frame in frames if count_memory else []:
+        for column, size in frame.memory_usage(index=False, deep=True).items():
+            memory[str(column)] = memory.get(str(column), 0) + int(size)
+
+    counted = sum(len(i.index) for i in frames)
+    memory = {k: v * len(ids) // counted if counted else 0 for k, v in memory.items()}
+    return len(ids), memory, indexes, exact
+
+
+def human_size(size: float) -> str:
+    if size < 1024:
+        return f"{size:.0f} B"
+
+    for unit in ["KB", "MB"]:
+        size /= 1024
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+
+    return f"{size / 1024:.1f} GB"
+
+
+def format_stats(stats: Dict[str, Any]) -> str:
+    """Formats the stats returned by table_stats as a report for the terminal"""
+
+    lines = [
+        f"name:           {stats['name']}",
+        f"storage format: {stats['storage_format']}",
+        f"rows:           {stats['rows']:,}",
+        f"generation:     {stats['generation']}",
+        "last commit:    " + (time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(stats["last_commit"]))
+                              if stats["last_commit"] is not None else "never"),
+        "",
+        f"{'column':<20} {'type':<6} {'memory':>12} {'disk':>12}"
+    ]
+
+    for column, info in stats["columns"].items():
+        memory = ("~" if info["memory_estimated"] else "") + human_size(info["memory"])
+        disk = human_size(info["disk"]) if info["disk"] is not None else "-"
+        lines.append(f"{column:<20} {info['type']:<6} {memory:>12} {disk:>12}")
+
+    lines.append("")
+    lines.extend(f"{name + ' size:':<16}{human_size(size)}" for name, size in stats["files"].items())
+
+    lines.append("")
+    lines.extend(f"{'index ' + field + ':':<16}{status}" for field, status in stats["indexes"].items())
+    if not stats["indexes"]:
+        lines.append(f"{'indexes:':<16}none")
+
+    return "\n".join(lines)
@@ -0,0 +1,150 @@
+# the import and the export commands, which stream the rows of a DB from and to CSV or JSON Lines
+# files, chunk_size rows at a time. pandas is imported only when a file is read or written
+import json
+import os
+import sys
+import time
+from typing import Any
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import TextIO
+from typing import TYPE_CHECKING
+
+from onstrodb.errors.common_errors import DataDuplicateError
+from onstrodb.errors.common_errors import DataError
+
+if TYPE_CHECKING:
+    import pandas as pd
+    from onstrodb import OnstroDb
+
+FILE_FORMATS = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl", ".json": "jsonl"}
+
+
+def file_format(path: str, fmt: Optional[str] = None) -> str:
+    """returns the format of the file, from its extension if the format is not provided"""
+
+    if fmt:
+        return fmt
+
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in FILE_FORMATS:
+        raise ValueError(f"The format of {path!r} can't be found from its extension, use --format")
+
+    return FILE_FORMATS[ext]
+
+
+class Progress:
+
+    """Reports the number of rows done and the throughput to stderr. On a terminal the report
+        is updated in place, otherwise every update is a new line, which suits a log file
+    """
+
+    def __init__(self, verb: str, out: Optional[TextIO] = None) -> None:
+        self.verb = verb
+        self.out = out or sys.stderr
+        self.tty = self.out.isatty()
+        self.rows = 0
+        self.start = time.perf_counter()
+        self.updated = False
+
+    def update(self, rows: int) -> None:
+        self.rows += rows
+        self.updated = True
+        self._print(f"{self.verb} {self.rows:,} rows ({self.rate():,.0f} rows/s)", "" if self.tty else "\n")
+
+    def fail(self) -> None:
+        """Ends the line of the report, so that the error is printed on its own line"""
+        if self.updated and self.tty:
+            print(file=self.out)
+
+    def done(self) -> None:
+        elapsed = time.perf_counter() - self.start
+        self._print(f"{self.verb} {self.rows:,} rows in {elapsed:.2f} s ({self.rate():,.0f} rows/s)", "\n")
+
+    def _print(self, line: str, end: str) -> None:
+        print(f"\r{line}" if self.tty else line, end=end, file=self.out, flush=True)
+
+    def rate(self) -> float:
+        elapsed = time.perf_counter() - self.start
+        return self.rows / elapsed if elapsed > 0 else 0.0
+
+
+def _read_csv(path: str, schema: Dict[str, Dict[str, object]], chunk_size: int) -> Iterator["pd.DataFrame"]:
+    import pandas as pd
+    from onstrodb.core.validator import DTYPES
+
+    # the values are parsed to the types of the schema. Empty values are missing values
+    dtypes = {field: DTYPES[str(props["type"])] for field, props in schema.items()}
+    with pd.read_csv(path, dtype=dtypes, chunksize=chunk_size) as reader:
+        yield from reader
+
+
+def _read_jsonl(path: str, chunk_size: int) -> Iterator[List[Dict[str, object]]]:
+    with open(path, "r", encoding="utf-8") as f:
+        chunk: List[Dict[str, object]] = []
+        for line in f:
+            if line.strip():
+                chunk.append(json.loads(line))
+
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+
+        if chunk:
+            yield chunk
+
+
+def import_rows(db: "OnstroDb", path: str, fmt: str, chunk_size: int) -> int:
+    """Adds the rows of the file to the DB, chunk_size rows at a time, and returns the number of rows.
+        Every chunk is validated and checked for duplicates by add_bulk
+    """
+
+    chunks: Iterator[Any] = _read_csv(path, db._schema or {}, chunk_size) if fmt == "csv" \
+        else _read_jsonl(path, chunk_size)
+    progress = Progress("imported")
+
+    try:
+        for chunk in chunks:
+            try:
+                db.add_bulk(chunk)
+            except (DataError, DataDuplicateError) as e:
+                raise type(e)(f"{e.message} (in the {len(chunk):,} rows after row {progress.rows:,})") from e
+
+            progress.update(len(chunk))
+
+    except BaseException:
+        progress.fail()
+        raise
+
+    progress.done()
+    return progress.rows
+
+
+def export_rows(db: "OnstroDb", path: str, fmt: str, chunk_size: int, columns: Optional[List[str]] = None) -> int:
+    """Writes the rows of the DB to the file, chunk_size rows at a time, and returns the number of rows.
+        The hash ids are not written, since they are computed from the values when the rows are imported,
+        except for the rows that were added with their fields out of the order of the schema
+    """
+
+    frames = db.iter_frames(columns=columns, chunk_size=chunk_size)
+    progress = Progress("exported")
+
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        for pos, chunk in enumerate(frames):
+            if fmt == "csv":
+                chunk.to_csv(f, header=pos == 0, index=False)
+
+            else:
+                # the missing values, which are NaN in the float columns, are written as null
+                records = chunk.astype(object).where(chunk.notna(), None).to_dict("records")
+                f.writelines(json.dumps(i, ensure_ascii=False) + "\n" for i in records)
+
+            progress.update(len(chunk.index))
+
+        if not progress.rows and fmt == "csv":
+            f.write(",".join(columns or list(db._schema or {})) + "\n")
+
+    progress.done()
+    return progress.rows
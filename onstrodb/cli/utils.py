@@ -7,7 +7,19 @@ from typing import Any
 from typing import Dict
 
 from onstrodb import __version__
-from onstrodb import OnstroDb
+from onstrodb.core.files import current_columnar_path
+from onstrodb.core.files import purge_db
+from onstrodb.cli.report import dump_rows
+from onstrodb.cli.report import format_stats
+from onstrodb.cli.report import parse_conditions
+from onstrodb.cli.report import query_rows
+from onstrodb.cli.report import table_stats
+from onstrodb.cli.transfer import export_rows
+from onstrodb.cli.transfer import file_format
+from onstrodb.cli.transfer import import_rows
+from onstrodb.errors import DataDuplicateError
+from onstrodb.errors import DataError
+from onstrodb.errors import QueryError
 from onstrodb.errors import SchemaError
 
 
@@ -29,12 +41,15 @@ def cmd_parser(args: Dict[str, Any]) -> int:
         sub_command: str = args["sub_command"]
 
         if sub_command == "create":
+            # pandas is imported only by the commands that load the DB
+            from onstrodb import OnstroDb
+
             try:
                 schema = load_json(args["schema"])
 
                 try:
                     o = OnstroDb(db_name=args["name"],
-                                 schema=schema, db_path=args["d"])
+                                 schema=schema, db_path=args["d"], hash_scheme=args["hash_scheme"])
                     o.commit()
                     return 0
 
@@ -58,16 +73,14 @@ def cmd_parser(args: Dict[str, Any]) -> int:
                 return 1
 
         if sub_command == "purge":
-            db_file_path = os.path.join(
-                args["d"], args["name"], f"{args['name']}.db")
-            schema_file = os.path.join(args["d"], args["name"], "db.schema")
+            db_path = os.path.join(args["d"], args["name"])
+            db_file_path = os.path.join(db_path, f"{args['name']}.db")
+            schema_file = os.path.join(db_path, "db.schema")
 
-            if Path(db_file_path).is_file():
+            if Path(db_file_path).is_file() or Path(current_columnar_path(db_path, args["name"])).is_dir():
                 if Path(schema_file).is_file():
-                    o = OnstroDb(db_name=args["name"],
-                                 db_path=args["d"])
-                    o.purge()
-                    o.commit()
+                    # the rows are removed from the files, without loading them
+                    purge_db(db_path, args["name"])
 
                 else:
                     print(
@@ -79,4 +92,86 @@ def cmd_parser(args: Dict[str, Any]) -> int:
                     f"The DB file does not exists ({args['name']}.db)", file=sys.stderr)
                 return 1
 
+        if sub_command in ("import", "export"):
+            return transfer(sub_command, args)
+
+        if sub_command in ("query", "stats"):
+            return report(sub_command, args)
+
+    return 0
+
+
+def report(sub_command: str, args: Dict[str, Any]) -> int:
+    """Runs the query or the stats command"""
+
+    if not Path(os.path.join(args["d"], args["name"], "db.schema")).is_file():
+        print("The DB does not exists", file=sys.stderr)
+        return 1
+
+    if sub_command == "stats":
+        stats = table_stats(args["name"], args["d"])
+        print(json.dumps(stats, indent=2) if args["json"] else format_stats(stats))
+        return 0
+
+    if args["limit"] is not None and args["limit"] < 0:
+        print("The limit must not be negative", file=sys.stderr)
+        return 1
+
+    from onstrodb import OnstroDb
+
+    db = OnstroDb(db_name=args["name"], db_path=args["d"])
+
+    try:
+        query = parse_conditions(args["conditions"], db._schema or {})
+        rows = query_rows(db, query, args["columns"], args["limit"])
+    except (QueryError, ValueError) as e:
+        print(e, file=sys.stderr)
+        return 1
+
+    sys.stdout.write(dump_rows(rows))
+    return 0
+
+
+def transfer(sub_command: str, args: Dict[str, Any]) -> int:
+    """Runs the import or the export command. The rows are committed once all of them are imported,
+        so nothing is imported if a row is invalid or a duplicate
+    """
+
+    if not Path(os.path.join(args["d"], args["name"], "db.schema")).is_file():
+        print("The DB does not exists", file=sys.stderr)
+        return 1
+
+    if args["chunk_size"] < 1:
+        print("The chunk size must be greater than 0", file=sys.stderr)
+        return 1
+
+    try:
+        fmt = file_format(args["file"], args["format"])
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+
+    from onstrodb import OnstroDb
+
+    db = OnstroDb(db_name=args["name"], db_path=args["d"])
+
+    if sub_command == "import":
+        try:
+            import_rows(db, args["file"], fmt, args["chunk_size"])
+        except FileNotFoundError:
+            print(f"The file {args['file']} does not exists", file=sys.stderr)
+            return 1
+        except (DataError, DataDuplicateError, ValueError) as e:
+            print(f"Nothing was imported: {e}", file=sys.stderr)
+            return 1
+
+        db.commit()
+
+    else:
+        try:
+            export_rows(db, args["file"], fmt, args["chunk_size"], args["columns"])
+        except QueryError as e:
+            print(e, file=sys.stderr)
+            return 1
+
     return 0
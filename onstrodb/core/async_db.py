@@ -0,0 +1,205 @@
+import asyncio
+import functools
+from concurrent.futures import Executor
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+from typing import Union
+
+import pandas as pd
+
+from .db import DBDataType
+from .db import GetType
+from .db import OnstroDb
+from .db import SchemaDictType
+from .hashing import HashIdType
+
+# a write waiting to be run, as the name of the method, its arguments and the future of its result
+WriteType = Tuple[str, Tuple[Any, ...], "asyncio.Future[Any]"]
+ResultType = Tuple[bool, Any]
+
+
+class AsyncOnstroDb:
+
+    """An asyncio API for the DB. The methods of the DB are run in the executor, or the default
+        executor of the event loop if it is None, so they never block the event loop.
+        The writes made at the same time are run together, in the order they were made,
+        and the values added by consecutive calls to add are added in a single call
+    """
+
+    def __init__(self, db: OnstroDb, executor: Optional[Executor] = None) -> None:
+        self.db = db
+        self._executor = executor
+        self._pending: List[WriteType] = []
+        self._flusher: Optional["asyncio.Future[None]"] = None
+
+    @classmethod
+    async def open(cls, db_name: str, schema: Optional[SchemaDictType] = None,
+                   executor: Optional[Executor] = None, **kwargs: Any) -> "AsyncOnstroDb":
+        """Loads the DB in the executor. The keyword arguments are passed to OnstroDb"""
+
+        loop = asyncio.get_running_loop()
+        db = await loop.run_in_executor(executor, functools.partial(OnstroDb, db_name, schema, **kwargs))
+        return cls(db, executor)
+
+    async def __aenter__(self) -> "AsyncOnstroDb":
+        return self
+
+    async def __aexit__(self, *args: object) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        """Waits for the pending writes to finish"""
+
+        while self._flusher is not None and not self._flusher.done():
+            await asyncio.shield(self._flusher)
+
+    async def add(self, values: List[Dict[str, object]], get_hash_id: bool = False) -> Union[None, List[HashIdType]]:
+        return await self._write("add", values, get_hash_id)
+
+    async def add_bulk(self, values: Union[List[Dict[str, object]], pd.DataFrame],
+                       get_hash_id: bool = False) -> Union[None, List[HashIdType]]:
+        return await self._write("add_bulk", values, get_hash_id)
+
+    async def get_by_query(self, query: Dict[str, object], columns: Optional[List[str]] = None) -> GetType:
+        return await self._read(self.db.get_by_query, query, columns)
+
+    async def get_by_hash_id(self, hash_id: HashIdType, columns: Optional[List[str]] = None) -> GetType:
+        return await self._read(self.db.get_by_hash_id, hash_id, columns)
+
+    async def get_by_filter(self, query: Dict[str, object], columns: Optional[List[str]] = None) -> GetType:
+        return await self._read(self.db.get_by_filter, query, columns)
+
+    async def get_hash_id(self, condition: Dict[str, object]) -> List[HashIdType]:
+        return await self._read(self.db.get_hash_id, condition)
+
+    async def get_all(self, columns: Optional[List[str]] = None) -> GetType:
+        return await self._read(self.db.get_all, columns)
+
+    async def update_by_query(self, query: Dict[str, object], update_data: DBDataType) -> Dict[HashIdType, HashIdType]:
+        return await self._write("update_by_query", query, update_data)
+
+    async def update_by_filter(self, query: Dict[str, object], update_data: DBDataType) -> Dict[HashIdType, HashIdType]:
+        return await self._write("update_by_filter", query, update_data)
+
+    async def update_by_hash_id(self, hash_id: HashIdType, update_data: DBDataType) -> Dict[HashIdType, HashIdType]:
+        return await self._write("update_by_hash_id", hash_id, update_data)
+
+    async def delete_by_query(self, query: Dict[str, object]) -> None:
+        await self._write("delete_by_query", query)
+
+    async def delete_by_filter(self, query: Dict[str, object]) -> None:
+        await self._write("delete_by_filter", query)
+
+    async def delete_by_hash_id(self, hash_id: HashIdType) -> None:
+        await self._write("delete_by_hash_id", hash_id)
+
+    async def purge(self) -> None:
+        await self._write("purge")
+
+    async def create_index(self, field: str) -> None:
+        await self._write("create_index", field)
+
+    async def commit(self) -> None:
+        """Commits the changes, including the ones made by the pending writes. The commits
+            made at the same time are done once
+        """
+        await self._write("commit")
+
+    async def checkpoint(self) -> None:
+        await self._write("checkpoint")
+
+    async def refresh(self) -> bool:
+        return await self._write("refresh")
+
+    async def _read(self, method: Any, *args: Any) -> Any:
+        """Runs the read in the executor. The reads need no lock, so they run alongside the writes"""
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(method, *args))
+
+    async def _write(self, method: str, *args: Any) -> Any:
+        """Queues the write, to be run with the other writes made before the queue is flushed"""
+
+        future: "asyncio.Future[Any]" = asyncio.get_running_loop().create_future()
+        self._pending.append((method, args, future))
+
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.ensure_future(self._flush())
+
+        return await future
+
+    async def _flush(self) -> None:
+        """Runs the queued writes in the executor, one batch at a time"""
+
+        loop = asyncio.get_running_loop()
+
+        while self._pending:
+            batch, self._pending = self._pending, []
+            calls = [(method, args) for method, args, _ in batch]
+
+            try:
+                results = await loop.run_in_executor(self._executor, self._run_batch, calls)
+            except BaseException as e:
+                results = [(False, e)] * len(batch)
+
+            for (_, _, future), (ok, value) in zip(batch, results):
+                if not future.done():
+                    if ok:
+                        future.set_result(value)
+                    else:
+                        future.set_exception(value)
+
+    def _run_batch(self, calls: List[Tuple[str, Tuple[Any, ...]]]) -> List[ResultType]:
+        """Runs the writes in order, and returns whether each of them succeeded, along with its
+            result or its exception. Consecutive adds and consecutive commits are run together
+        """
+
+        results: List[ResultType] = []
+        start = 0
+
+        while start < len(calls):
+            method = calls[start][0]
+            end = start + 1
+            if method in ("add", "commit"):
+                while end < len(calls) and calls[end][0] == method:
+                    end += 1
+
+            if method == "add":
+                results.extend(self._run_adds([args for _, args in calls[start:end]]))
+
+            else:
+                results.extend([self._run(method, calls[start][1])] * (end - start))
+
+            start = end
+
+        return results
+
+    def _run_adds(self, calls: List[Tuple[Any, ...]]) -> List[ResultType]:
+        """Adds the values of all the calls at once. If that fails, the calls are run one by one,
+            so that only the calls with invalid or duplicate values fail
+        """
+
+        if len(calls) == 1:
+            return [self._run("add", calls[0])]
+
+        try:
+            ids = self.db.add([v for values, _ in calls for v in values], get_hash_id=True) or []
+        except Exception:
+            return [self._run("add", args) for args in calls]
+
+        results: List[ResultType] = []
+        start = 0
+        for values, get_hash_id in calls:
+            results.append((True, ids[start:start + len(values)] if get_hash_id else None))
+            start += len(values)
+
+        return results
+
+    def _run(self, method: str, args: Tuple[Any, ...]) -> ResultType:
+        try:
+            return True, getattr(self.db, method)(*args)
+        except Exception as e:
+            return False, e
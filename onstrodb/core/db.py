@@ -1,24 +1,70 @@
+import functools
+import threading
+import time
 import uuid
+from contextlib import contextmanager
+from contextlib import nullcontext
 from pprint import pformat
+from typing import Any
+from typing import Callable
+from typing import cast
 from typing import Dict
+from typing import Iterator
 from typing import List
+from typing import Mapping
 from typing import Optional
+from typing import Set
+from typing import Tuple
+from typing import TypeVar
 from typing import Union
 
+import numpy as np
 import pandas as pd
 
-from .utils import add_default_to_data
+from .files import dump_generation
+from .files import load_cached_schema
+from .files import load_generation
+from .files import lock_path
+from .files import truncate_wal
+from .hashing import HASH_SCHEMES
+from .hashing import hash_frame
+from .hashing import hash_row
+from .hashing import HashIdType
+from .index import SecondaryIndex
+from .lock import FileLock
+from .metrics import HookType
+from .metrics import measured
+from .metrics import Metrics
+from .planner import execute_plan
+from .planner import plan_query
+from .planner import PlanNode
+from .query import BoolOp
+from .query import compile_query
+from .query import equals
+from .stats import TableStats
+from .storage import ColumnReader
+from .storage import STORAGE_FORMATS
+from .utils import append_wal
 from .utils import create_db_folders
 from .utils import dump_cached_schema
 from .utils import dump_db
-from .utils import generate_hash_id
+from .utils import dump_hash_scheme
+from .utils import dump_indexes
+from .utils import dump_stats
 from .utils import get_db_path
-from .utils import load_cached_schema
 from .utils import load_db
-from .utils import validate_data_with_schema
+from .utils import load_hash_scheme
+from .utils import load_indexes
+from .utils import load_stats
+from .utils import load_wal
+from .utils import records_to_df
+from .utils import validate_columns
 from .utils import validate_query_data
 from .utils import validate_schema
 from .utils import validate_update_data
+from .validator import cast_value
+from .validator import DTYPES
+from .validator import SchemaValidator
 from onstrodb.errors.common_errors import DataDuplicateError
 from onstrodb.errors.common_errors import DataError
 from onstrodb.errors.schema_errors import SchemaError
@@ -27,6 +73,35 @@ from onstrodb.errors.schema_errors import SchemaError
 DBDataType = Dict[str, object]
 SchemaDictType = Dict[str, Dict[str, object]]
 GetType = Union[Dict[str, Union[Dict[str, object], str]], None]
+F = TypeVar("F", bound=Callable[..., Any])
+
+# the segments of appended rows are merged into the DB in the background, once they hold
+# this fraction of the rows of the DB, and at least COMPACT_MIN_ROWS rows
+COMPACT_RATIO = 0.5
+COMPACT_MIN_ROWS = 10000
+
+# the number of records from which add hashes them all at once, instead of one by one
+HASH_BATCH_ROWS = 64
+
+
+def _writer(method: F) -> F:
+    """Runs the method with the write lock of the DB held, so that there is only one writer at a time"""
+
+    @functools.wraps(method)
+    def wrapper(self: "OnstroDb", *args: Any, **kwargs: Any) -> Any:
+        with self._lock:
+            return method(self, *args, **kwargs)
+
+    return cast(F, wrapper)
+
+
+def _has_dictionary(column: pd.Series, dtype: pd.CategoricalDtype) -> bool:
+    """returns whether the column is encoded with the dictionary of the dtype. The dtypes of the
+        dictionaries are compared too, as Index.equals ignores them, but concat does not
+    """
+
+    return isinstance(column.dtype, pd.CategoricalDtype) and \
+        column.dtype.categories.dtype == dtype.categories.dtype and column.dtype.categories.equals(dtype.categories)
 
 
 class OnstroDb:
@@ -35,20 +110,81 @@ class OnstroDb:
 
     def __init__(self, db_name: str, schema: Optional[SchemaDictType] = None,
                  db_path: Optional[str] = None, allow_data_duplication: bool = False,
-                 in_memory: bool = False) -> None:
+                 in_memory: bool = False, wal_checkpoint_size: int = 64 * 1024 * 1024,
+                 storage_format: str = "pickle", write_buffer_size: int = 0,
+                 write_buffer_delay: float = 1.0, group_commit_delay: float = 0.0,
+                 hash_scheme: Optional[str] = None, metrics: bool = False) -> None:
+
+        if storage_format not in STORAGE_FORMATS:
+            raise ValueError(f"The storage format must be any of {STORAGE_FORMATS!r}")
+
+        if write_buffer_size < 0 or write_buffer_delay < 0 or group_commit_delay < 0:
+            raise ValueError("The write buffer size and the delays must not be negative")
+
+        if hash_scheme is not None and hash_scheme not in HASH_SCHEMES:
+            raise ValueError(f"The hash scheme must be any of {HASH_SCHEMES!r}")
 
         self._db_name = db_name
         self._schema = schema
         self._data_dupe = allow_data_duplication
         self._in_memory = in_memory
-
-        # db variables
-        self._db: pd.DataFrame = None
+        self._wal_checkpoint_size = wal_checkpoint_size
+        self._storage_format = storage_format
+        self._write_buffer_size = write_buffer_size
+        self._write_buffer_delay = write_buffer_delay
+        self._group_commit_delay = group_commit_delay
+        self._hash_scheme = hash_scheme or "sha256"
+
+        # the number of calls and the latencies of the operations, measured only when enabled
+        self._metrics = Metrics(metrics)
+
+        # db variables. The parts are the base frame followed by the segments of appended rows, that
+        # are merged into the base frame in the background. The readers use the parts as they are,
+        # and _db is the merged frame, kept until the parts change
+        self._parts: Tuple[pd.DataFrame, ...] = (None,)
+        self._merged: Optional[Tuple[Tuple[pd.DataFrame, ...], pd.DataFrame]] = None
+        self._compacting = 0
+        self._column_reader: Optional[ColumnReader] = None
+        self._hash_ids: Set[HashIdType] = set()
+        self._indexes: Dict[str, SecondaryIndex] = {}
+        self._stats = TableStats([])
         self._db_path: str = get_db_path(db_name)
 
+        # the values of every dictionary encoded field, in the order of their codes. A dictionary only
+        # grows, so the categories of every frame of the DB are the start of the dictionary
+        self._dictionaries: Dict[str, pd.Index] = {}
+
+        # the writers hold the lock, and replace the DB instead of changing it, so the readers
+        # need no lock. The version is odd while the indexes are changed
+        self._lock = threading.RLock()
+        self._version = 0
+        self._publish_depth = 0
+
+        # the rows staged by add, which are merged into the DB all at once
+        self._buffer_rows: List[Dict[str, object]] = []
+        self._buffer_ids: List[HashIdType] = []
+        self._buffer_time = 0.0
+
+        # write ahead log variables
+        self._lsn = 0
+        self._wal_pending: List[Tuple[int, str, object]] = []
+        self._has_snapshot = False
+
+        # group commit variables. The commits are numbered, and a commit waits for
+        # the commit that is being written, if it is done after it was requested
+        self._commit_cond = threading.Condition()
+        self._commit_requests = 0
+        self._commits_done = 0
+        self._committing = False
+
         if db_path:
             self._db_path = f"{db_path}/{self._db_name}"
 
+        # the processes using the same DB folder hold the file lock while they read or write the
+        # files of the DB. The generation stored with the DB is increased by every commit
+        self._file_lock = FileLock(lock_path(self._db_path, self._db_name))
+        self._generation = 0
+
         # validate the user defined schema
         self._validate_schema()
 
@@ -57,224 +193,1034 @@ class OnstroDb:
             self._columns = list(self._schema.keys())
 
         # start the loading sequence
-        self._load_initial_schema()
+        self._load_initial_schema(hash_scheme)
+        self._validator = SchemaValidator(self._schema or {})
         self._reload_db()
 
+    @property
+    def _db(self) -> pd.DataFrame:
+        parts = self._parts
+        if len(parts) == 1:
+            return parts[0]
+
+        merged = self._merged
+        if merged is None or merged[0] is not parts:
+            merged = (parts, self._concat(list(parts), self._dictionary_dtypes()))
+            self._merged = merged
+
+        # the merged frame replaces the parts, unless a writer holds the lock or the parts are being
+        # merged in the background, since the reader would wait for the one or discard the other
+        if self._lock.acquire(blocking=False):
+            try:
+                if self._parts is parts and not self._compacting:
+                    self._parts = (merged[1],)
+                    self._merged = None
+            finally:
+                self._lock.release()
+
+        return merged[1]
+
+    @_db.setter
+    def _db(self, frame: pd.DataFrame) -> None:
+        self._parts = (frame,)
+        self._merged = None
+
     def __repr__(self) -> str:
-        return pformat(self._to_dict(self._db), indent=4, width=80, sort_dicts=False)
+        return pformat(self._to_dict(self._frame()), indent=4, width=80, sort_dicts=False)
 
     def __len__(self) -> int:
-        return len(self._db.index)
+        self._flush_buffer()
+        return sum(len(i.index) for i in self._parts)
+
+    @measured("add")
+    @_writer
+    def add(self, values: List[Dict[str, object]],
+            get_hash_id: bool = False) -> Union[None, List[HashIdType]]:
+        """Adds a list of values to the DB. If the write buffer is enabled, the values are
+            staged, and merged into the DB along with the other staged values
+        """
 
-    def add(self, values: List[Dict[str, object]], get_hash_id: bool = False) -> Union[None, List[str]]:
-        """Adds a list of values to the DB"""
+        if not values:
+            return [] if get_hash_id else None
 
         new_data: List[Dict[str, object]] = []
-        new_hashes: List[str] = []
+        hash_set: Set[HashIdType] = set()
 
-        for data in values:
-            if self._schema:
-                if validate_data_with_schema(data, self._schema):
-                    data = add_default_to_data(data, self._schema)
-                    hash_id = self._get_hash(
-                        [str(i) for i in data.values()], list(self._db.index) + new_hashes)
-                    new_data.append(data)
-                    new_hashes.append(hash_id)
+        with self._metrics.measure("validate"):
+            for data in values:
+                if self._schema:
+                    if self._validator.validate_record(data):
+                        new_data.append(self._validator.add_defaults(data))
 
-                else:
-                    raise DataError(
-                        f"The data {data!r} does not comply with the schema")
+                    else:
+                        raise DataError(
+                            f"The data {data!r} does not comply with the schema")
 
-        new_df = pd.DataFrame(new_data, new_hashes)
+        new_hashes = self._hash_records(new_data, hash_set)
 
-        try:
-            self._db = pd.concat([self._db, new_df],
-                                 verify_integrity=not self._data_dupe)
-        except ValueError:
-            raise DataDuplicateError(
-                "The data provided, contains duplicate values") from None
+        if not self._data_dupe:
+            hash_set.update(new_hashes)
+            if len(hash_set) != len(new_hashes) or not self._hash_ids.isdisjoint(hash_set):
+                raise DataDuplicateError(
+                    "The data provided, contains duplicate values")
+
+        if self._write_buffer_size:
+            if not self._buffer_ids:
+                self._buffer_time = time.monotonic()
+
+            self._buffer_rows.extend(new_data)
+            self._buffer_ids.extend(new_hashes)
+            self._hash_ids.update(new_hashes)
+
+            if (len(self._buffer_ids) >= self._write_buffer_size
+                    or time.monotonic() - self._buffer_time >= self._write_buffer_delay):
+                self._flush_buffer()
+
+        else:
+            new_df = self._typed(records_to_df(new_data))
+            new_df.index = pd.Index(new_hashes)
+            self._append_rows(new_df)
+            self._log("add", new_df)
 
         if get_hash_id:
             return new_hashes
 
         return None
 
-    def get_by_query(self, query: Dict[str, object]) -> GetType:
-        """Get values from the DB. queries must comply with the schema and must be of length 1"""
+    @measured("add_bulk")
+    @_writer
+    def add_bulk(self, values: Union[List[Dict[str, object]], pd.DataFrame],
+                 get_hash_id: bool = False) -> Union[None, List[HashIdType]]:
+        """Adds a list of values or a DataFrame to the DB. The data is validated and hashed
+            column by column, which is a lot faster than add for large batches
+        """
+
+        if not self._schema:
+            return None
+
+        if not len(values):
+            return [] if get_hash_id else None
+
+        self._flush_buffer()
+        if isinstance(values, pd.DataFrame):
+            new_df = values.reset_index(drop=True)
+        else:
+            new_df = records_to_df(values)
+
+        with self._metrics.measure("validate"):
+            if not self._validator.validate_df(new_df):
+                raise DataError(
+                    "The data provided does not comply with the schema")
+
+            columns = list(new_df.columns)
+            missing = new_df.isna().to_numpy()
+            new_df = self._typed(self._validator.add_defaults_to_df(new_df))
+
+        # the hash ids are the ones add computes for the same records. The columns of the df are in
+        # the order of the keys of the records, if all of them have the same keys
+        hash_set: Set[HashIdType] = set()
+        if isinstance(values, pd.DataFrame) or len({tuple(i) for i in values}) == 1:
+            with self._metrics.measure("hash"):
+                new_hashes = self._hash_rows(new_df, columns, missing, hash_set)
+        else:
+            new_hashes = self._hash_records([self._validator.add_defaults(i) for i in values], hash_set)
+
+        if not self._data_dupe:
+            hash_set.update(new_hashes)
+            if len(hash_set) != len(new_hashes) or not self._hash_ids.isdisjoint(hash_set):
+                raise DataDuplicateError(
+                    "The data provided, contains duplicate values")
+
+        new_df.index = pd.Index(new_hashes)
+
+        self._append_rows(new_df)
+        self._log("add", new_df)
+
+        if get_hash_id:
+            return new_hashes
+
+        return None
+
+    @measured("get_by_query")
+    def get_by_query(self, query: Dict[str, object], columns: Optional[List[str]] = None) -> GetType:
+        """Get values from the DB. queries must comply with the schema and must be of length 1.
+            If columns is provided only those columns are returned
+        """
         if self._schema:
             if validate_query_data(query, self._schema):
                 key = list(query)[0]
-                filt = self._db[key] == query[key]
-                return self._to_dict(self._db.loc[filt])
+                return self._to_dict(self._rows(*self._query_positions(key, query[key], columns), columns))
 
         return None
 
-    def get_by_hash_id(self, hash_id: str) -> GetType:
-        """Get values from the DB based on their hash ID"""
-
-        if hash_id in self._db.index:
-            return self._to_dict(self._db.loc[hash_id])
+    @measured("get_by_hash_id")
+    def get_by_hash_id(self, hash_id: HashIdType, columns: Optional[List[str]] = None) -> GetType:
+        """Get values from the DB based on their hash ID. If columns is provided only those columns are returned"""
+
+        parts = self._frames(columns)
+        if hash_id in self._hash_ids:
+            # the row can be added to the hash ids before the frame that holds it replaces the DB
+            for frame in parts:
+                position = frame.index.get_indexer([hash_id])[0]
+                if position >= 0:
+                    return self._to_dict(self._project(frame, columns).iloc[position])
         return {}
 
-    def get_hash_id(self, condition: Dict[str, object]) -> List[str]:
+    @measured("get_by_filter")
+    def get_by_filter(self, query: Dict[str, object], columns: Optional[List[str]] = None) -> GetType:
+        """Get the rows that matches a query with multiple conditions and operators.
+            If columns is provided only those columns are returned
+        """
+
+        return self._to_dict(self._rows(*self._filter_positions(query, columns), columns))
+
+    def explain(self, query: Dict[str, object]) -> str:
+        """Returns the plan used to evaluate a filter query, with the conditions in the order
+            in which they are evaluated
+        """
+
+        if not self._schema:
+            return ""
+
+        return "\n".join(self._plan(compile_query(query, self._schema), self._indexes).explain(len(self)))
+
+    @measured("get_hash_id")
+    def get_hash_id(self, condition: Dict[str, object]) -> List[HashIdType]:
         """Returns a hash id or a list of ids that matches all the conditions"""
 
         # the validate_update_method can be used as the same verification style is required here.
         if self._schema:
             if validate_update_data(condition, self._schema):
-                return list(self._db.loc[(self._db[list(condition)]
-                                          == pd.Series(condition)).all(axis=1)].index)
+                ids: List[HashIdType] = []
+                for frame in self._frames(list(condition)):
+                    mask = np.ones(len(frame.index), dtype=bool)
+                    for key, val in condition.items():
+                        mask &= equals(frame[key], cast_value(key, val, self._schema))
+                    ids.extend(frame.index[mask])
+                return ids
         return []
 
-    def get_all(self) -> GetType:
-        """Return the entire DB in a dict representation"""
+    @measured("get_all")
+    def get_all(self, columns: Optional[List[str]] = None) -> GetType:
+        """Return the entire DB in a dict representation. If columns is provided only those columns are returned"""
 
-        return self._to_dict(self._db)
+        return self._to_dict(self._project(self._frame(columns), columns))
 
-    def update_by_query(self, query: Dict[str, object], update_data: DBDataType) -> Dict[str, str]:
-        """Update the records in the DB with a query"""
+    def iter_all(self, columns: Optional[List[str]] = None,
+                 chunk_size: int = 1000) -> Iterator[Tuple[str, Dict[str, object]]]:
+        """Returns an iterator over the hash ids and the values of all the rows in the DB.
+            The rows are converted to dicts chunk_size rows at a time
+        """
+
+        return self._iter_records(self.iter_chunks(columns=columns, chunk_size=chunk_size))
+
+    def iter_by_query(self, query: Dict[str, object], columns: Optional[List[str]] = None,
+                      chunk_size: int = 1000) -> Iterator[Tuple[str, Dict[str, object]]]:
+        """Returns an iterator over the hash ids and the values of the rows that matches the query.
+            The rows are converted to dicts chunk_size rows at a time
+        """
+
+        return self._iter_records(self.iter_chunks(query, columns, chunk_size))
+
+    def iter_chunks(self, query: Optional[Dict[str, object]] = None, columns: Optional[List[str]] = None,
+                    chunk_size: int = 1000) -> Iterator[Dict[str, Dict[str, object]]]:
+        """Returns an iterator over the rows that matches the query, or all the rows if there is
+            no query, in dicts of at most chunk_size rows. The iterator is not affected by the
+            changes made to the DB after it is created
+        """
 
-        u_db = self._db.copy(deep=True)
+        return self._iter_dicts(self.iter_frames(query, columns, chunk_size))
+
+    def iter_frames(self, query: Optional[Dict[str, object]] = None, columns: Optional[List[str]] = None,
+                    chunk_size: int = 1000) -> Iterator[pd.DataFrame]:
+        """Same as iter_chunks, but the rows are returned as DataFrames indexed by their hash ids,
+            which can be written to a file without converting them to dicts
+        """
+
+        if chunk_size < 1:
+            raise ValueError("The chunk_size must be greater than 0")
+
+        if query is not None and self._schema:
+            if validate_query_data(query, self._schema):
+                key = list(query)[0]
+                return self._iter_frame(self._rows(*self._query_positions(key, query[key], columns), columns),
+                                        None, chunk_size)
+
+        return self._iter_frame(self._project(self._frame(columns), columns), None, chunk_size)
+
+    @measured("update_by_query")
+    @_writer
+    def update_by_query(self, query: Dict[str, object], update_data: DBDataType) -> Dict[HashIdType, HashIdType]:
+        """Update the records in the DB with a query"""
 
         if self._schema:
             if validate_query_data(query, self._schema) and validate_update_data(update_data, self._schema):
                 q_key = list(query)[0]
                 q_val = query[q_key]
 
-                filt = u_db[q_key] == q_val
-                for key, val in update_data.items():
-                    u_db.loc[filt, key] = val
-
-                # update the indexes
-                new_vals = u_db.loc[filt].to_dict("index")
-                new_idx = self._verify_and_get_new_idx(
-                    new_vals, list(u_db.index))
+                return self._update_rows(self._merged_positions(*self._query_positions(q_key, q_val)), update_data)
+        return {}
 
-                if new_idx:
-                    new_df = self._update_hash_id(new_idx, u_db)
-                    self._db = new_df.copy(deep=True)
+    @measured("update_by_filter")
+    @_writer
+    def update_by_filter(self, query: Dict[str, object], update_data: DBDataType) -> Dict[HashIdType, HashIdType]:
+        """Update the records in the DB that matches a query with multiple conditions and operators"""
 
-                    del [u_db, new_df]
-                    return new_idx
+        if self._schema:
+            if validate_update_data(update_data, self._schema):
+                return self._update_rows(self._merged_positions(*self._filter_positions(query)), update_data)
         return {}
 
-    def update_by_hash_id(self, hash_id: str, update_data: DBDataType) -> Dict[str, str]:
+    @measured("update_by_hash_id")
+    @_writer
+    def update_by_hash_id(self, hash_id: HashIdType, update_data: DBDataType) -> Dict[HashIdType, HashIdType]:
         """Update the records in the DB using their hash id"""
 
-        u_db = self._db.copy(deep=True)
-
-        if hash_id in u_db.index:
+        # the columns are loaded before the row is found, as loading them can reload the DB
+        frame = self._frame()
+        if hash_id in self._hash_ids:
             if self._schema:
                 if validate_update_data(update_data, self._schema):
-                    for key, val in update_data.items():
-                        u_db.loc[hash_id, key] = val
-
-                    # update the indexes
-                    new_vals = pd.DataFrame(
-                        u_db.loc[hash_id].to_dict(), index=[hash_id]).to_dict("index")
-                    new_idx = self._verify_and_get_new_idx(
-                        new_vals, list(u_db.index))
-
-                    if new_idx:
-                        new_df = self._update_hash_id(new_idx, u_db)
-                        self._db = new_df.copy(deep=True)
-
-                        del [u_db, new_df]
-                        return new_idx
+                    return self._update_rows(frame.index.get_indexer([hash_id]), update_data)
 
         return {}
 
+    @measured("delete_by_query")
+    @_writer
     def delete_by_query(self, query: Dict[str, object]) -> None:
         """Delete the records from the db that complies to the query"""
 
         if self._schema:
             if validate_query_data(query, self._schema):
                 key = list(query)[0]
-                filt = self._db[key] != query[key]
-                self._db = self._db.loc[filt]
-
-    def delete_by_hash_id(self, hash_id: str) -> None:
+                positions = self._merged_positions(*self._query_positions(key, query[key]))
+                if len(positions):
+                    self._log("delete", list(self._db.index[positions]))
+                    self._drop_rows(positions)
+
+    @measured("delete_by_filter")
+    @_writer
+    def delete_by_filter(self, query: Dict[str, object]) -> None:
+        """Delete the records from the DB that matches a query with multiple conditions and operators"""
+
+        positions = self._merged_positions(*self._filter_positions(query))
+        if len(positions):
+            self._log("delete", list(self._db.index[positions]))
+            self._drop_rows(positions)
+
+    @measured("delete_by_hash_id")
+    @_writer
+    def delete_by_hash_id(self, hash_id: HashIdType) -> None:
         """Delete the a records from thr DB based on their hash_id"""
 
-        ids = list(self._db.index)
-        if hash_id in ids:
-            self._db = self._db.drop(hash_id)
+        # the columns are loaded before the row is found, as loading them can reload the DB
+        frame = self._frame()
+        if hash_id in self._hash_ids:
+            self._log("delete", [hash_id])
+            self._drop_rows(frame.index.get_indexer([hash_id]))
 
     def raw_db(self) -> pd.DataFrame:
         """Returns the in in memory representation of the DB"""
-        return self._db.copy(deep=True)
+        return self._frame().copy(deep=True)
 
+    def stats(self, reset: bool = False) -> Dict[str, Dict[str, Any]]:
+        """Returns the number of calls and the latency histogram of every operation, and of the
+            steps they are made of, measured while the metrics are enabled. The metrics are
+            cleared if reset is True
+        """
+        return self._metrics.snapshot(reset)
+
+    def enable_metrics(self, enabled: bool = True) -> None:
+        """Starts or stops measuring the operations"""
+        self._metrics.enabled = enabled
+
+    def add_metrics_hook(self, hook: HookType) -> None:
+        """Calls the hook with the name and the seconds taken by every measured operation.
+            Adding a hook enables the metrics
+        """
+        self._metrics.add_hook(hook)
+        self._metrics.enabled = True
+
+    def remove_metrics_hook(self, hook: HookType) -> None:
+        self._metrics.remove_hook(hook)
+
+    @measured("purge")
+    @_writer
     def purge(self) -> None:
         """Removes all the data from the runtime instance of the db"""
-        self._db = self._db.iloc[0:0]
+        self._log("purge", None)
+        self._clear_rows()
 
+    @measured("commit")
     def commit(self) -> None:
-        """Store the current db in a file"""
+        """Store the changes made since the last commit in the write ahead log.
+            The first commit stores the entire db in a file. With group commit, the
+            commits made by other threads within group_commit_delay seconds are
+            written together
+        """
+
+        if not self._group_commit_delay:
+            self._commit()
+            return
+
+        with self._commit_cond:
+            self._commit_requests += 1
+            ticket = self._commit_requests
+
+            # a commit that started before this one, may not include its changes
+            while self._committing and self._commits_done < ticket:
+                self._commit_cond.wait()
+
+            if self._commits_done >= ticket:
+                return
+
+            self._committing = True
+
+        done = self._commits_done
+        try:
+            time.sleep(self._group_commit_delay)
+            with self._commit_cond:
+                last = self._commit_requests
+
+            self._commit()
+            done = last
+
+        finally:
+            with self._commit_cond:
+                self._commits_done = done
+                self._committing = False
+                self._commit_cond.notify_all()
+
+    @_writer
+    def _commit(self) -> None:
+        """Writes the changes made since the last commit"""
+
+        if isinstance(self._db, pd.DataFrame):
+            if not self._in_memory:
+                self._flush_buffer()
+                with self._file_lock.hold():
+                    self._sync()
+
+                    if not self._has_snapshot:
+                        self.checkpoint()
+
+                    elif self._wal_pending:
+                        with self._metrics.measure("append_wal"):
+                            size = append_wal(self._wal_pending, self._db_path, self._db_name)
+                        self._wal_pending = []
+                        self._next_generation()
+
+                        if size >= self._wal_checkpoint_size:
+                            self.checkpoint()
+
+    @measured("checkpoint")
+    @_writer
+    def checkpoint(self) -> None:
+        """Store the current db in a file, and clear the write ahead log"""
         if isinstance(self._db, pd.DataFrame):
             if not self._in_memory:
-                dump_db(self._db, self._db_path, self._db_name)
+                self._flush_buffer()
+                with self._file_lock.hold():
+                    self._sync()
+
+                    self._ensure_columns()
+                    with self._metrics.measure("dump_db"):
+                        dump_db(self._db, self._db_path, self._db_name, self._lsn, self._storage_format)
+                    if self._indexes:
+                        dump_indexes({f: i.mapping for f, i in self._indexes.items()},
+                                     len(self._db.index), self._lsn, self._db_path, self._db_name)
+                    dump_stats({**self._stats.to_dict(), "lsn": self._lsn}, self._db_path)
+
+                    truncate_wal(self._db_path, self._db_name)
+                    self._wal_pending = []
+                    self._has_snapshot = True
+                    self._next_generation()
+
+    @measured("refresh")
+    @_writer
+    def refresh(self) -> bool:
+        """Reloads the DB if another process committed changes to it, since it was loaded or
+            committed by this one. The changes that are not committed yet are kept.
+            Returns whether the DB was reloaded
+        """
+
+        if self._in_memory or load_generation(self._db_path, self._db_name) == self._generation:
+            return False
+
+        self._flush_buffer()
+        with self._file_lock.hold(shared=True):
+            return self._sync()
+
+    @measured("create_index")
+    @_writer
+    def create_index(self, field: str) -> None:
+        """Create a secondary index on the field, which is used by the queries on that field"""
 
-    def _get_hash(self, values: List[str], hash_list: List[str]) -> str:
-        """returns the hash id based on the dupe value"""
+        if not self._schema or field not in self._schema:
+            raise SchemaError(f"The field {field!r} is not present in the schema")
 
-        def gen_dupe_hash(extra: int = 0) -> str:
+        self._flush_buffer()
+        if field not in self._indexes:
+            self._log("index", field)
+            self._build_index(field)
+
+    def _get_hash(self, values: List[object], hash_set: Set[HashIdType]) -> HashIdType:
+        """returns the hash id based on the dupe value. hash_set holds the ids
+            taken by the current batch, that are not yet in the DB
+        """
+
+        def gen_dupe_hash(extra: int = 0) -> HashIdType:
             if extra:
-                hash_ = generate_hash_id(values + [str(extra)])
+                hash_ = hash_row(values + [extra], self._hash_scheme)
             else:
-                hash_ = generate_hash_id(values)
-            if hash_ in hash_list:
+                hash_ = hash_row(values, self._hash_scheme)
+            if hash_ in self._hash_ids or hash_ in hash_set:
                 return gen_dupe_hash(uuid.uuid4().int)
             else:
-                hash_list.append(hash_)
+                hash_set.add(hash_)
                 return hash_
 
         if not self._data_dupe:
-            return generate_hash_id(values)
+            return hash_row(values, self._hash_scheme)
 
         else:
             return gen_dupe_hash()
 
-    def _update_hash_id(self, new_hashes: Dict[str, str], _df: pd.DataFrame) -> pd.DataFrame:
-        """Updates the hash to the new hashes """
+    def _get_hashes(self, _df: pd.DataFrame, hash_set: Set[HashIdType]) -> List[HashIdType]:
+        """returns the hash ids of all the rows in the df, which are hashed all at once"""
 
-        for idx, hash_ in new_hashes.items():
-            _df.rename(index={idx: hash_}, inplace=True)
+        hashes = hash_frame(_df, self._hash_scheme)
+        if not self._data_dupe:
+            return hashes
 
-        return _df
+        # the rows whose hash id is taken get a new one, as in _get_hash
+        for pos, hash_ in enumerate(hashes):
+            if hash_ in self._hash_ids or hash_ in hash_set:
+                hashes[pos] = self._get_hash(_df.iloc[pos].tolist(), hash_set)
+            else:
+                hash_set.add(hash_)
 
-    def _verify_and_get_new_idx(self, new_vals: Dict[str, Dict[str, object]], hash_list: List[str]) -> Dict[str, str]:
-        """verify whether the updated is not a duplicate of an existing data"""
-        new_hashes: Dict[str, str] = {}
-        idxs = list(new_vals)
+        return hashes
 
-        for k, v in new_vals.items():
-            hash_ = self._get_hash(
-                list(map(str, v.values())), hash_list)
+    @measured("hash")
+    def _hash_records(self, records: List[Dict[str, object]], hash_set: Set[HashIdType]) -> List[HashIdType]:
+        """returns the hash ids of the records, from their values as they are stored. The values are
+            hashed in the order of their keys, so a large batch is hashed all at once only if all
+            of the records have the same keys
+        """
 
-            if hash_ in self._db.index or (hash_ in idxs and k != hash_) or hash_ in new_hashes.values():
-                if not self._data_dupe:
-                    new_hashes.clear()
-                    raise DataDuplicateError(
-                        "The updated data is a duplicate of an existing data in the DB")
+        if len(records) >= HASH_BATCH_ROWS and len({tuple(i) for i in records}) == 1:
+            return self._get_hashes(self._typed(records_to_df(records)), hash_set)
 
-                else:
-                    new_hashes[k] = hash_
+        return [self._get_hash(self._validator.stored_values(i), hash_set) for i in records]
+
+    def _hash_rows(self, _df: pd.DataFrame, columns: List[str], missing: np.ndarray,
+                   hash_set: Set[HashIdType]) -> List[HashIdType]:
+        """returns the hash ids of the rows of the df, as add computes them from records with the
+            columns: the values of the columns in their order, then the fields missing from the records.
+            A missing value is a missing field, so the rows with missing values are hashed one by one
+        """
+
+        order = columns + [i for i in self._validator.fields if i not in columns]
+        partial = missing.any(axis=1)
+        if not partial.any():
+            return self._get_hashes(_df[order], hash_set)
+
+        hashes: List[HashIdType] = [""] * len(_df.index)
+        full = np.flatnonzero(~partial)
+        for pos, hash_ in zip(full.tolist(), self._get_hashes(_df[order].iloc[full], hash_set)):
+            hashes[pos] = hash_
+
+        positions = np.flatnonzero(partial)
+        rows = _df[columns].iloc[positions].astype(object).to_numpy()
+        for pos, row in zip(positions.tolist(), rows):
+            record = {col: val for col, val, na in zip(columns, row, missing[pos]) if not na}
+            hashes[pos] = self._get_hash(self._validator.stored_values(self._validator.add_defaults(record)),
+                                         hash_set)
+
+        return hashes
+
+    def _typed(self, _df: pd.DataFrame) -> pd.DataFrame:
+        """Returns the df with its columns converted to the dtypes of the schema"""
+
+        dtypes = {col: dtype for col, dtype in self._validator.dtypes.items()
+                  if col in _df.columns and col not in self._validator.encoded and _df[col].dtype != dtype}
+
+        for col in self._validator.encoded:
+            if col in _df.columns:
+                dtype = self._dictionary_dtype(_df[col])
+                if not _has_dictionary(_df[col], dtype):
+                    dtypes[col] = dtype
+
+        if not dtypes:
+            return _df
+
+        try:
+            return _df.astype(dtypes)
+        except (TypeError, ValueError, OverflowError) as e:
+            raise DataError("The data does not fit in the dtypes of the schema") from e
+
+    def _dictionary_dtype(self, column: pd.Series) -> pd.CategoricalDtype:
+        """Adds the values of the column that are not in the dictionary of its field to the end
+            of the dictionary, and returns the dtype of the codes of the dictionary
+        """
+
+        name = str(column.name)
+        dictionary = self._dictionaries.get(name, pd.Index([], dtype=object))
+
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            values = pd.Index(column.dtype.categories, dtype=object)
+        else:
+            values = pd.Index(column.dropna().unique(), dtype=object)
+
+        new_values = values[~values.isin(dictionary)]
+        if len(new_values):
+            # the dictionaries are always object indexes, like the ones loaded from the column files
+            dictionary = pd.Index(dictionary.append(new_values), dtype=object)
+            self._dictionaries[name] = dictionary
+
+        return pd.CategoricalDtype(dictionary)
+
+    def _dictionary_dtypes(self) -> Dict[str, pd.CategoricalDtype]:
+        """returns the current dtypes of the dictionary encoded fields"""
+        return {col: pd.CategoricalDtype(self._dictionaries.get(col, pd.Index([], dtype=object)))
+                for col in self._validator.encoded}
+
+    @measured("concat")
+    def _concat(self, frames: List[pd.DataFrame], dtypes: Dict[str, pd.CategoricalDtype]) -> pd.DataFrame:
+        """Concatenates the frames. The dictionary encoded columns are converted to the dtypes
+            first, since columns with different dictionaries would be concatenated as strings
+        """
+
+        if dtypes:
+            frames = [i.astype({col: dtype for col, dtype in dtypes.items()
+                                if col in i.columns and not _has_dictionary(i[col], dtype)}) for i in frames]
+
+        return pd.concat(frames)
+
+    def _set_values(self, column: pd.Series, positions: Union[slice, np.ndarray], val: object) -> pd.Series:
+        """Returns a copy of the column, with the value set at the positions. The copy keeps
+            the dtype of the column, and its dictionary is extended with the value if needed
+        """
 
+        try:
+            if isinstance(column.dtype, pd.CategoricalDtype):
+                column = column.astype(self._dictionary_dtype(pd.Series([val], name=column.name, dtype=object)))
             else:
-                new_hashes[k] = hash_
+                column = column.copy()
+            column.iloc[positions] = val
+
+        except (TypeError, ValueError, OverflowError) as e:
+            raise DataError(f"The value of {column.name!r} does not fit in the dtype of the schema") from e
+
+        return column
+
+    def _update_rows(self, positions: np.ndarray, update_data: DBDataType) -> Dict[HashIdType, HashIdType]:
+        """Updates the rows at the positions, if the updated rows are not duplicates"""
+
+        if not len(positions):
+            return {}
+
+        self._ensure_columns()
+        # the values are set in copies of the columns, which keeps their dtypes. The rows taken are
+        # already a copy, the shallow copy only marks them as not being a slice of the DB for pandas < 3
+        new_rows = self._db.iloc[positions].copy(deep=False)
+        for key, val in update_data.items():
+            new_rows[key] = self._set_values(new_rows[key], slice(None), val)
+
+        # update the indexes
+        new_idx = self._verify_and_get_new_idx(new_rows)
+        if not new_idx:
+            return {}
+
+        self._write_rows(positions, update_data, new_idx)
+        self._log("update", {"ids": new_idx, "data": dict(update_data)})
+
+        return new_idx
+
+    def _write_rows(self, positions: np.ndarray, update_data: DBDataType,
+                    new_idx: Dict[HashIdType, HashIdType]) -> None:
+        """Writes the update data to the rows at the positions, and re-keys them with their
+            new hash ids. The changes are made to a shallow copy of the DB in which only the
+            updated columns are copied, which replaces the DB once all of them are made
+        """
+
+        self._ensure_columns()
+        with self._metrics.measure("copy"):
+            frame = self._db.copy(deep=False)
+            old_rows = frame.iloc[positions]
+
+            for key, val in update_data.items():
+                frame[key] = self._set_values(frame[key], positions, val)
+
+        labels = frame.index.to_numpy(copy=True)
+        labels[positions] = [new_idx[i] for i in old_rows.index]
+        frame.index = pd.Index(labels)
+
+        with self._publishing():
+            self._db = frame
+            self._unindex_rows(old_rows)
+            self._index_rows(frame.iloc[positions])
+
+    def _append_rows(self, _df: pd.DataFrame) -> None:
+        """Appends the rows to the DB as a new segment, so only the new rows are copied.
+            The last segment is merged with the one before it while it is as large, which
+            keeps the number of segments logarithmic in the number of rows
+        """
+
+        if self._ensure_columns():
+            # the DB was reloaded, and may hold some of the rows already, like when the log is replayed
+            _df = _df.loc[~_df.index.isin(self._db.index)]
+
+        parts = list(self._parts) + [_df]
+
+        # the segments being merged into the DB in the background are left as they are
+        while len(parts) - self._compacting >= 3 and len(parts[-2].index) <= len(parts[-1].index):
+            parts[-2:] = [self._concat(parts[-2:], self._dictionary_dtypes())]
+
+        with self._publishing():
+            self._parts = tuple(parts)
+            self._index_rows(_df)
+
+        rows = sum(len(i.index) for i in parts[1:])
+        if not self._compacting and rows >= max(len(parts[0].index) * COMPACT_RATIO, COMPACT_MIN_ROWS):
+            self._compacting = len(parts) - 1
+            threading.Thread(target=self._compact_in_background, daemon=True).start()
+
+    def _compact_in_background(self) -> None:
+        """Merges the segments that existed when it was started into the DB, without holding
+            the lock while they are merged. Nothing is changed if the DB was changed meanwhile
+        """
+
+        try:
+            with self._lock:
+                parts = self._parts[:self._compacting + 1]
+                dtypes = self._dictionary_dtypes()
+
+            frame = self._concat(list(parts), dtypes)
+
+            with self._lock:
+                current = self._parts[:len(parts)]
+                if len(current) == len(parts) and all(i is j for i, j in zip(current, parts)):
+                    self._parts = (frame,) + self._parts[len(parts):]
+                    self._merged = None
+
+        finally:
+            with self._lock:
+                self._compacting = 0
+
+    def _drop_rows(self, positions: np.ndarray) -> None:
+        """Removes the rows at the positions from the DB"""
+
+        self._ensure_columns()
+        filt = np.ones(len(self._db.index), dtype=bool)
+        filt[positions] = False
+        old_rows = self._db.iloc[positions]
+        with self._metrics.measure("copy"):
+            frame = self._db.loc[filt]
+
+        with self._publishing():
+            self._db = frame
+            self._unindex_rows(old_rows)
+
+    def _clear_rows(self) -> None:
+        """Removes all the rows from the DB"""
+
+        if self._column_reader:
+            # the columns that are not loaded yet, need not be read from the disk
+            frame = self._typed(pd.DataFrame(columns=self._column_reader.columns))
+        else:
+            frame = self._parts[0].iloc[0:0]
+
+        with self._publishing():
+            self._db = frame
+            self._column_reader = None
+            self._buffer_rows = []
+            self._buffer_ids = []
+            self._hash_ids.clear()
+            self._stats = TableStats(self._columns)
+            for index in self._indexes.values():
+                index.clear()
+
+    def _build_index(self, field: str) -> None:
+        """Builds the secondary index of the field from the DB"""
+
+        self._ensure_columns([field])
+        index = SecondaryIndex(field)
+        index.build(self._db[field])
+        self._indexes[field] = index
+
+    def _log(self, op: str, payload: object) -> None:
+        """Records the change to be written to the write ahead log on the next commit"""
+
+        if not self._in_memory:
+            self._lsn += 1
+            self._wal_pending.append((self._lsn, op, payload))
+
+    @measured("verify")
+    def _verify_and_get_new_idx(self, new_rows: pd.DataFrame) -> Dict[HashIdType, HashIdType]:
+        """verify whether the updated rows are not duplicates of an existing data, and
+            returns the new hash id of every row
+        """
+        hash_set: Set[HashIdType] = set()
+        hashes = self._get_hashes(new_rows, hash_set)
+
+        if not self._data_dupe:
+            hash_set.update(hashes)
+            if len(hash_set) != len(hashes) or not self._hash_ids.isdisjoint(hash_set):
+                raise DataDuplicateError(
+                    "The updated data is a duplicate of an existing data in the DB")
+
+        return dict(zip(new_rows.index.tolist(), hashes))
+
+    def _index_rows(self, _df: pd.DataFrame) -> None:
+        """Adds the rows to the hash id index and the secondary indexes"""
+
+        self._hash_ids.update(_df.index)
+        self._stats.add(_df)
+        for field, index in self._indexes.items():
+            index.add(_df[field])
+
+    def _unindex_rows(self, _df: pd.DataFrame) -> None:
+        """Removes the rows from the hash id index and the secondary indexes"""
+
+        self._hash_ids.difference_update(_df.index)
+        self._stats.remove(_df)
+        for field, index in self._indexes.items():
+            index.remove(_df[field])
+
+    def _query_positions(self, key: str, value: object, columns: Optional[List[str]] = None
+                         ) -> Tuple[Tuple[pd.DataFrame, ...], List[np.ndarray]]:
+        """Returns the parts of the DB with the key and the columns loaded, and the sorted positions
+            of the rows of each part where the key equals the value. The secondary index of the key
+            is used if there is one.
+        """
+
+        if self._schema:
+            value = cast_value(key, value, self._schema)
+
+        version = self._version
+        parts = self._frames(None if columns is None else [key] + columns)
+
+        if key in self._indexes:
+            ids = list(self._indexes[key].lookup(value))
+            if self._unchanged(parts, version):
+                positions = [np.sort(i.index.get_indexer(ids)) for i in parts]
+                return parts, [i[i >= 0] for i in positions]
+
+        return parts, [np.flatnonzero(equals(i[key], value)) for i in parts]
+
+    def _filter_positions(self, query: Dict[str, object], columns: Optional[List[str]] = None
+                          ) -> Tuple[Tuple[pd.DataFrame, ...], List[np.ndarray]]:
+        """Returns the parts of the DB with the columns loaded, and the sorted positions of the
+            rows of each part that matches the query, evaluated with the plan of the query
+        """
+
+        if not self._schema:
+            parts = self._frames(columns)
+            return parts, [np.empty(0, dtype=np.intp) for _ in parts]
+
+        condition = compile_query(query, self._schema)
+        version = self._version
+        plan = self._plan(condition, self._indexes)
+        parts = self._frames(None if columns is None else plan.columns() + columns)
+        positions = [execute_plan(plan, i, self._indexes) for i in parts]
+
+        if self._indexes and not self._unchanged(parts, version):
+            # a writer changed the indexes while they were used, so the conditions are scanned instead
+            plan = self._plan(condition, {})
+            parts = self._frames(None if columns is None else plan.columns() + columns)
+            positions = [execute_plan(plan, i, {}) for i in parts]
+
+        return parts, positions
+
+    def _merged_positions(self, parts: Tuple[pd.DataFrame, ...], positions: List[np.ndarray]) -> np.ndarray:
+        """Returns the positions of the rows of the parts in the merged frame of the parts"""
+
+        offsets = np.cumsum([0] + [len(i.index) for i in parts[:-1]])
+        return np.concatenate([pos + offset for pos, offset in zip(positions, offsets)])
+
+    def _rows(self, parts: Tuple[pd.DataFrame, ...], positions: List[np.ndarray],
+              columns: Optional[List[str]]) -> pd.DataFrame:
+        """Returns the rows of the parts at their positions, with only the columns if they are
+            provided. Only the selected rows are concatenated
+        """
+
+        frames = [self._project(frame, columns).iloc[pos] for frame, pos in zip(parts, positions)]
+        found = [i for i in frames if len(i.index)]
+        if len(found) < 2:
+            return found[0] if found else frames[0]
+        return self._concat(found, self._dictionary_dtypes())
+
+    def _plan(self, condition: BoolOp, indexes: Mapping[str, SecondaryIndex]) -> PlanNode:
+        """Plans the evaluation of the condition, after updating the stale statistics
+            of the columns it needs. The statistics are left as they are while a writer
+            holds the lock, as they only change the order of the conditions
+        """
+
+        for field in condition.columns(indexes):
+            if self._stats.columns[field].stale(self._stats.rows) and self._lock.acquire(blocking=False):
+                try:
+                    stats = self._stats.columns[field]
+                    if stats.stale(self._stats.rows):
+                        parts = self._frames([field])
+                        stats.analyze(self._concat([i[[field]] for i in parts], self._dictionary_dtypes())[field])
+                finally:
+                    self._lock.release()
+
+        return plan_query(condition, self._stats, indexes)
+
+    def _unchanged(self, parts: Tuple[pd.DataFrame, ...], version: int) -> bool:
+        """Checks whether the indexes were not changed since the version was read, in which
+            case they match the parts, if they are still the parts of the DB
+        """
+
+        return not version % 2 and version == self._version and parts is self._parts
+
+    @contextmanager
+    def _publishing(self) -> Iterator[None]:
+        """Marks the indexes as being changed, while a writer replaces the DB and updates them"""
+
+        self._publish_depth += 1
+        if self._publish_depth == 1:
+            self._version += 1
+
+        try:
+            yield
+
+        finally:
+            self._publish_depth -= 1
+            if not self._publish_depth:
+                self._version += 1
+
+    def _frame(self, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """Returns the DB, with the columns loaded from the disk and the staged rows merged
+            into it. All the columns are loaded if columns is None. The returned frame is never
+            changed, as the writers replace the DB instead, so it can be read without the lock
+        """
+
+        if columns is not None and self._schema:
+            validate_columns(columns, self._schema)
 
-        return new_hashes
+        self._flush_buffer()
+        self._ensure_columns(columns)
+        return self._db
 
+    def _frames(self, columns: Optional[List[str]] = None) -> Tuple[pd.DataFrame, ...]:
+        """Same as _frame, but the parts of the DB are returned without merging them, so the
+            readers need not wait for the segments to be merged
+        """
+
+        if columns is not None and self._schema:
+            validate_columns(columns, self._schema)
+
+        self._flush_buffer()
+        self._ensure_columns(columns)
+        return self._parts
+
+    def _flush_buffer(self) -> None:
+        """Merges the rows staged by add into the DB"""
+
+        if not self._buffer_ids:
+            return
+
+        with self._lock:
+            if self._buffer_ids:
+                new_df = self._typed(records_to_df(self._buffer_rows))
+                new_df.index = pd.Index(self._buffer_ids)
+                self._append_rows(new_df)
+                self._log("add", new_df)
+
+                self._buffer_rows = []
+                self._buffer_ids = []
+
+    def _project(self, _df: pd.DataFrame, columns: Optional[List[str]]) -> pd.DataFrame:
+        """Returns the df with only the columns, or all of them if columns is None"""
+        return _df if columns is None else _df[columns]
+
+    def _ensure_columns(self, columns: Optional[List[str]] = None) -> bool:
+        """Loads the columns that are not read yet from the column files. All the columns
+            are loaded if columns is None. If another process replaced the files since they
+            were opened, the DB is reloaded first, and True is returned
+        """
+
+        if self._column_reader is None:
+            return False
+
+        with self._lock, self._file_lock.hold(shared=True):
+            reloaded = False
+            if self._column_reader is not None and not self._column_reader.is_current():
+                # the rows of the new files are not the ones of the loaded hash ids
+                reloaded = self._sync()
+
+            reader = self._column_reader
+            if reader is None:
+                return reloaded
+
+            frame = self._db.copy(deep=False)
+            for col in reader.columns if columns is None else columns:
+                if col not in frame.columns:
+                    frame[col] = reader.column(col)
+                    frame = self._typed(frame)
+
+            if len(frame.columns) < len(reader.columns):
+                self._db = frame
+            else:
+                self._db = frame[reader.columns]
+                self._column_reader = None
+
+            return reloaded
+
+    def _iter_frame(self, _df: pd.DataFrame, positions: Optional[np.ndarray],
+                    chunk_size: int) -> Iterator[pd.DataFrame]:
+        """Yields the rows of the df at the positions, or all the rows, chunk_size rows at a time"""
+
+        rows = len(_df.index) if positions is None else len(positions)
+
+        for start in range(0, rows, chunk_size):
+            if positions is None:
+                chunk = _df.iloc[start:start + chunk_size]
+            else:
+                chunk = _df.iloc[positions[start:start + chunk_size]]
+
+            yield self._decoded(chunk)
+
+    def _iter_dicts(self, frames: Iterator[pd.DataFrame]) -> Iterator[Dict[str, Dict[str, object]]]:
+        """Yields the rows of every df as a dict"""
+
+        for frame in frames:
+            with self._metrics.measure("to_dict"):
+                records = frame.to_dict("index")
+            yield records
+
+    def _iter_records(self, chunks: Iterator[Dict[str, Dict[str, object]]]) -> Iterator[Tuple[str, Dict[str, object]]]:
+        """Yields the hash id and the values of every row in the chunks"""
+
+        for chunk in chunks:
+            yield from chunk.items()
+
+    @measured("to_dict")
     def _to_dict(self, _df: Union[pd.DataFrame, pd.Series]) -> Dict[str, Union[Dict[str, object], str]]:
         """Returns the dict representation of the DB based on
             the allow_data_duplication value
         """
 
         if isinstance(_df, pd.DataFrame):
-            return _df.to_dict("index")
+            return self._decoded(_df).to_dict("index")
 
-        else:
-            return _df.to_dict()
+        record = _df.to_dict()
+        # the missing values of the dictionary encoded fields are NaN, as in a str field they are None
+        for col in self._validator.encoded:
+            if col in record and pd.isna(record[col]):
+                record[col] = None
+
+        return record
+
+    def _decoded(self, _df: pd.DataFrame) -> pd.DataFrame:
+        """Returns the df with the dictionary encoded columns converted to str columns"""
+
+        dtypes = {col: DTYPES["str"] for col in self._validator.encoded if col in _df.columns}
+        return _df.astype(dtypes) if dtypes else _df
 
     def _validate_schema(self) -> None:
         if self._schema:
@@ -283,19 +1229,136 @@ class OnstroDb:
     def _reload_db(self) -> None:
         """Reload the the pandas DF"""
 
-        if not self._in_memory:
-            data = load_db(self._db_path, self._db_name)
-            if isinstance(data, pd.DataFrame):
-                self._db = data
+        with self._publishing():
+            data = None
+            self._lsn = 0
+            self._dictionaries = {}
+            self._has_snapshot = False
+            self._wal_pending = []
 
-            else:
-                self._db = pd.DataFrame(columns=self._columns)
+            with self._file_lock.hold(shared=True) if not self._in_memory else nullcontext():
+                if not self._in_memory:
+                    self._generation = load_generation(self._db_path, self._db_name)
+                    # the columns of a columnar DB are loaded only when they are used
+                    with self._metrics.measure("load_db"):
+                        data = load_db(self._db_path, self._db_name, columns=[])
+
+                if isinstance(data, pd.DataFrame):
+                    self._lsn = data.attrs.get("lsn", 0)
+                    self._has_snapshot = True
+                    data = self._typed(data)
+                    data.attrs = {}
+
+                    # the reader is set first, so the DB is never seen without its columns
+                    if len(data.columns) < len(self._columns):
+                        self._column_reader = ColumnReader(self._db_path, self._db_name)
+                    self._db = data
+
+                else:
+                    self._db = self._typed(pd.DataFrame(columns=self._columns))
+                    self._column_reader = None
+
+                self._hash_ids = set(self._db.index)
+                self._load_stats()
+                self._load_indexes()
+
+                if not self._in_memory:
+                    self._replay_wal()
+
+    def _replay_wal(self) -> None:
+        """Applies the committed changes in the write ahead log, that are not in the stored DB"""
+
+        with self._metrics.measure("load_wal"):
+            entries, size = load_wal(self._db_path, self._db_name)
+        truncate_wal(self._db_path, self._db_name, size)
+
+        for lsn, op, payload in entries:
+            if lsn > self._lsn:
+                self._apply(op, payload)
+                self._lsn = lsn
 
+    def _apply(self, op: str, payload: Any) -> None:
+        """Applies a change recorded in the write ahead log. The rows that were already
+            added, or that no longer exist, are skipped
+        """
+
+        if op == "add":
+            self._append_rows(self._typed(payload.loc[~payload.index.isin(self._db.index)]))
+
+        elif op == "update":
+            new_idx = {k: v for k, v in payload["ids"].items() if k == v or v not in self._hash_ids}
+            positions = self._db.index.get_indexer(list(new_idx))
+            self._write_rows(positions[positions >= 0], payload["data"], new_idx)
+
+        elif op == "delete":
+            positions = self._db.index.get_indexer(payload)
+            self._drop_rows(positions[positions >= 0])
+
+        elif op == "purge":
+            self._clear_rows()
+
+        elif op == "index" and payload not in self._indexes:
+            self._build_index(payload)
+
+    def _sync(self) -> bool:
+        """Reloads the DB if another process committed a newer generation of it, and applies
+            the changes that are not committed yet on top of it. Returns whether the DB
+            was reloaded. The file lock must be held
+        """
+
+        if load_generation(self._db_path, self._db_name) == self._generation:
+            return False
+
+        pending = self._wal_pending
+        with self._publishing():
+            self._reload_db()
+            for _, op, payload in pending:
+                self._apply(op, payload)
+                self._log(op, payload)
+
+        return True
+
+    def _next_generation(self) -> None:
+        """Increases the generation of the stored DB, so the other processes know it was changed"""
+
+        self._generation += 1
+        dump_generation(self._generation, self._db_path, self._db_name)
+
+    def _load_stats(self) -> None:
+        """Loads the statistics of the columns stored with the DB, if they were computed from
+            the snapshot that was loaded, which has the lsn they were dumped with
+        """
+
+        stored = None if self._in_memory else load_stats(self._db_path)
+
+        if stored and stored.get("lsn") == self._lsn and stored["rows"] == len(self._db.index):
+            self._stats = TableStats.from_dict(stored)
         else:
-            self._db = pd.DataFrame(columns=self._columns)
+            self._stats = TableStats(self._columns, len(self._db.index))
+
+    def _load_indexes(self) -> None:
+        """Loads the secondary indexes stored with the DB, and builds the ones marked in the schema
+            that are missing or out of date. The stored indexes are up to date if they were built
+            from the snapshot that was loaded, which has the lsn they were dumped with
+        """
+
+        self._indexes = {}
+        stored = None if self._in_memory else load_indexes(self._db_path, self._db_name)
 
-    def _load_initial_schema(self) -> None:
-        """Loads the schema that was provided when the DB was created for the first time"""
+        if stored and stored[1] == self._lsn and stored[0] == len(self._db.index):
+            for field, mapping in stored[2].items():
+                self._indexes[field] = SecondaryIndex(field, mapping)
+
+        fields = [f for f, p in self._schema.items() if p.get("index")] if self._schema else []
+        if stored:
+            fields += [f for f in stored[2] if f not in fields]
+
+        for field in fields:
+            if field not in self._indexes:
+                self._build_index(field)
+
+    def _load_initial_schema(self, hash_scheme: Optional[str]) -> None:
+        """Loads the schema and the hash scheme that were provided when the DB was created for the first time"""
         if not self._in_memory:
             create_db_folders(self._db_path)
         if not self._in_memory:
@@ -310,9 +1373,17 @@ class OnstroDb:
             else:
                 self._schema = schema.copy()
                 self._columns = list(self._schema.keys())
+
+            # the DBs created before the hash schemes were added use sha256
+            scheme = load_hash_scheme(self._db_path) or "sha256"
+            if hash_scheme and hash_scheme != scheme:
+                raise SchemaError(
+                    f"The hash scheme provided does not match with the initial hash scheme {scheme!r}")
+            self._hash_scheme = scheme
         else:
             if not self._schema:
                 raise SchemaError("The schema is not provided")
             else:
                 if not self._in_memory:
                     dump_cached_schema(self._db_path, self._schema)
+                    dump_hash_scheme(self._db_path, self._hash_scheme)
@@ -0,0 +1,161 @@
+# the files of a stored DB. This module does not import pandas, so that the CLI can
+# handle the files without loading the DB
+import os
+import pickle
+import shutil
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any
+from typing import BinaryIO
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Tuple
+from typing import Union
+
+from .lock import FileLock
+
+SchemaDictType = Dict[str, Dict[str, object]]
+
+
+@contextmanager
+def atomic_write(path: str) -> Iterator[BinaryIO]:
+    """Opens a temporary file to write to, which replaces the file at path once it is written
+        and flushed to the disk, so the file is never seen partly written
+    """
+    tmp_path = f"{path}.tmp"
+
+    try:
+        with open(tmp_path, "wb") as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+
+    except BaseException:
+        if Path(tmp_path).is_file():
+            os.remove(tmp_path)
+        raise
+
+    os.replace(tmp_path, path)
+
+
+def columnar_path(db_path: str, db_name: str) -> str:
+    """returns the path of the directory that holds the column files of the DB"""
+    return os.path.join(db_path, f"{db_name}.cols")
+
+
+def current_columnar_path(db_path: str, db_name: str) -> str:
+    """returns the path of the directory the column files of the DB are read from. The files are
+        written to the .tmp directory, which replaces the directory once it was moved to the .old
+        one, so a crash between the two leaves the new files in the .tmp directory, or the
+        previous ones in the .old one. The meta file is written last, so a directory that has
+        it holds all the files
+    """
+
+    path = columnar_path(db_path, db_name)
+    for i in [path, f"{path}.tmp", f"{path}.old"]:
+        if Path(os.path.join(i, "meta")).is_file():
+            return i
+
+    return path
+
+
+def remove_columnar(db_path: str, db_name: str) -> None:
+    """Removes the directory of the column files, and the ones left by a crashed checkpoint"""
+
+    path = columnar_path(db_path, db_name)
+    for i in [path, f"{path}.tmp", f"{path}.old"]:
+        if Path(i).is_dir():
+            shutil.rmtree(i)
+
+
+def load_columnar_meta(db_path: str, db_name: str) -> Union[Dict[str, Any], None]:
+    """Loads the meta data of the column files, with the number of rows and the kind of every column"""
+    path = os.path.join(current_columnar_path(db_path, db_name), "meta")
+
+    if Path(path).is_file():
+        with open(path, "rb") as f:
+            return pickle.load(f)
+    else:
+        return None
+
+
+def load_index_fields(db_path: str, db_name: str) -> Union[Tuple[int, List[str]], None]:
+    """Loads the number of rows the stored indexes were built from, and their fields, without the indexes"""
+    path = os.path.join(db_path, f"{db_name}.idx")
+
+    if Path(path).is_file():
+        with open(path, "rb") as f:
+            data = pickle.load(f)
+            return data["rows"], list(data["indexes"] if "indexes" in data else data["fields"])
+    else:
+        return None
+
+
+def truncate_wal(db_path: str, db_name: str, size: int = 0) -> None:
+    """Truncates the write ahead log to the size, if it is larger"""
+    path = os.path.join(db_path, f"{db_name}.wal")
+
+    if Path(path).is_file() and os.path.getsize(path) > size:
+        with open(path, "r+b") as f:
+            f.truncate(size)
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def dump_generation(generation: int, db_path: str, db_name: str) -> None:
+    """Stores the generation of the DB, which is increased by every commit"""
+    with atomic_write(os.path.join(db_path, f"{db_name}.gen")) as f:
+        f.write(str(generation).encode("ascii"))
+
+
+def load_generation(db_path: str, db_name: str) -> int:
+    """Returns the generation of the stored DB, which is 0 if it was never committed"""
+    path = os.path.join(db_path, f"{db_name}.gen")
+    if Path(path).is_file():
+        with open(path, "rb") as f:
+            return int(f.read() or 0)
+
+    else:
+        return 0
+
+
+def lock_path(db_path: str, db_name: str) -> str:
+    """returns the path of the lock file, that is shared by all the processes using the DB"""
+    return os.path.join(db_path, f"{db_name}.lock")
+
+
+def load_cached_schema(db_path: str) -> Union[SchemaDictType, None]:
+    """Loads the existing schema, that was provided when the DB was created for the first time."""
+    c_schema_path = os.path.join(db_path, "db.schema")
+
+    if Path(c_schema_path).is_file():
+        with open(c_schema_path, "rb") as f:
+            return pickle.load(f)
+    else:
+        return None
+
+
+def dump_cached_schema(db_path: str, schema: SchemaDictType) -> None:
+    """Dumps the schema in a pickle form for later use"""
+    c_schema_path = os.path.join(db_path, "db.schema")
+
+    with open(c_schema_path, "wb") as f:
+        pickle.dump(schema, f)
+
+
+def purge_db(db_path: str, db_name: str) -> None:
+    """Removes all the rows of the stored DB, without loading it. The schema and the hash scheme
+        are kept. The stored indexes no longer match the number of rows, so they are rebuilt
+        from the empty DB when it is opened, and replaced by its next commit
+    """
+
+    with FileLock(lock_path(db_path, db_name)).hold():
+        for path in [os.path.join(db_path, f"{db_name}.db"), os.path.join(db_path, "db.stats")]:
+            if Path(path).is_file():
+                os.remove(path)
+
+        remove_columnar(db_path, db_name)
+
+        truncate_wal(db_path, db_name)
+        dump_generation(load_generation(db_path, db_name) + 1, db_path, db_name)
@@ -0,0 +1,105 @@
+from hashlib import blake2b
+from hashlib import sha256
+from typing import cast
+from typing import List
+from typing import Sequence
+from typing import Union
+
+import numpy as np
+import pandas as pd
+
+from .utils import generate_hash_id
+
+# the hash ids are strings, or integers for the blake2b64 scheme
+HashIdType = Union[str, int]
+
+# sha256 is the original scheme, which keeps the first 8 hex characters of the sha256 of the
+# joined values. The blake2b schemes hash the length prefixed values to 64 or 128 bits
+HASH_SCHEMES = ["sha256", "blake2b64", "blake2b128"]
+
+ID_MASK = (1 << 62) - 1
+
+
+def encode_row(values: Sequence[object]) -> bytes:
+    """Encodes the values of a row, each with its length in front of it, so that different
+        rows never have the same encoding. Missing values, None or NaN, are encoded as "-:"
+    """
+
+    parts = []
+    for val in values:
+        if pd.isna(val):
+            parts.append(b"-:")
+        else:
+            data = str(val).encode("utf-8")
+            parts.append(b"%d:%s" % (len(data), data))
+
+    return b"".join(parts)
+
+
+def hash_row(values: Sequence[object], scheme: str = "sha256") -> HashIdType:
+    """Returns the hash id of the values of a row with the hash scheme"""
+
+    if scheme == "sha256":
+        # the missing values are hashed as None, whether they are None, NaN or NA
+        return generate_hash_id(["None" if pd.isna(i) else str(i) for i in values])
+
+    digest = blake2b(encode_row(values), digest_size=8 if scheme == "blake2b64" else 16).digest()
+    if scheme == "blake2b64":
+        # the top 2 bits are cleared, as pandas turns 2 integer ids into a range, which must
+        # not overflow the int64 it is computed in
+        return int.from_bytes(digest, "little") & ID_MASK
+
+    return digest.hex()
+
+
+def _column_strings(col: pd.Series) -> List[str]:
+    """Returns every value of the column as a string, and the missing values as None"""
+
+    values = col.to_numpy(dtype=object)
+    strings = list(map(str, values))
+
+    for pos in np.flatnonzero(pd.isna(values)).tolist():
+        strings[pos] = "None"
+
+    return strings
+
+
+def _encode_column(col: pd.Series) -> List[str]:
+    """Returns the encoding of every value of the column, as in encode_row"""
+
+    values = col.to_numpy(dtype=object)
+    strings = list(map(str, values))
+
+    # the length of an ascii string is its length in utf-8
+    if all(map(str.isascii, strings)):
+        parts = [f"{len(i)}:{i}" for i in strings]
+    else:
+        parts = [f"{len(i.encode('utf-8'))}:{i}" for i in strings]
+
+    for pos in np.flatnonzero(pd.isna(values)).tolist():
+        parts[pos] = "-:"
+
+    return parts
+
+
+def hash_frame(df: pd.DataFrame, scheme: str = "sha256") -> List[HashIdType]:
+    """Returns the hash ids of all the rows of the df, which are the same as the ones returned
+        by hash_row. The values are converted to strings column by column, so there is
+        a single pass over the rows, to hash them
+    """
+
+    if not len(df.columns):
+        return [hash_row([], scheme)] * len(df.index)
+
+    if scheme == "sha256":
+        columns = [_column_strings(df[col]) for col in df.columns]
+        return [sha256(i.encode("utf-8")).hexdigest()[:8] for i in map("".join, zip(*columns))]
+
+    rows = map("".join, zip(*[_encode_column(df[col]) for col in df.columns]))
+
+    if scheme == "blake2b64":
+        digests = b"".join([blake2b(i.encode("utf-8"), digest_size=8).digest() for i in rows])
+        ids = np.frombuffer(digests, dtype="<u8") & np.uint64(ID_MASK)
+        return cast(List[HashIdType], ids.astype(np.int64).tolist())
+
+    return [blake2b(i.encode("utf-8"), digest_size=16).hexdigest() for i in rows]
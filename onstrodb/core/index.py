@@ -0,0 +1,59 @@
+from typing import Dict
+from typing import Optional
+from typing import Set
+
+import numpy as np
+import pandas as pd
+
+from .hashing import HashIdType
+
+IndexMapType = Dict[object, Set[HashIdType]]
+
+
+def _keys(column: pd.Series) -> np.ndarray:
+    """Returns the values of the column to group the hash ids by. A nullable int column with missing
+        values is converted to floats by to_numpy, which can't hold the large ints, so the values of
+        a column with missing values are returned as python objects
+    """
+
+    if column.hasnans:
+        return column.to_numpy(dtype=object, na_value=None)
+
+    return column.to_numpy()
+
+
+class SecondaryIndex:
+
+    """Maps every value of a field to the set of hash ids of the rows having that value"""
+
+    def __init__(self, field: str, mapping: Optional[IndexMapType] = None) -> None:
+        self.field = field
+        self.mapping: IndexMapType = mapping if mapping is not None else {}
+
+    def __len__(self) -> int:
+        return sum(len(i) for i in self.mapping.values())
+
+    def build(self, column: pd.Series) -> None:
+        """Rebuild the index from the column"""
+        self.mapping = {}
+        self.add(column)
+
+    def add(self, column: pd.Series) -> None:
+        """Index the values of the column with the hash ids in the column's index"""
+        for val, ids in column.index.groupby(_keys(column)).items():
+            self.mapping.setdefault(val, set()).update(ids)
+
+    def remove(self, column: pd.Series) -> None:
+        """Remove the hash ids in the column's index from the index"""
+        for val, ids in column.index.groupby(_keys(column)).items():
+            if val in self.mapping:
+                self.mapping[val].difference_update(ids)
+                if not self.mapping[val]:
+                    del self.mapping[val]
+
+    def lookup(self, value: object) -> Set[HashIdType]:
+        """Returns the hash ids of the rows that has the value"""
+        return self.mapping.get(value, set())
+
+    def clear(self) -> None:
+        self.mapping = {}
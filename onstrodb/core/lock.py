@@ -0,0 +1,72 @@
+import sys
+import time
+from contextlib import contextmanager
+from typing import BinaryIO
+from typing import Iterator
+from typing import Optional
+
+if sys.platform == "win32":
+    import msvcrt
+
+    def _lock(f: BinaryIO, shared: bool) -> None:
+        # windows has no shared locks, so the readers lock the file as well
+        f.seek(0)
+        while True:
+            try:
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                return
+            except OSError:
+                time.sleep(0.01)
+
+    def _unlock(f: BinaryIO) -> None:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+else:
+    import fcntl
+
+    def _lock(f: BinaryIO, shared: bool) -> None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+
+    def _unlock(f: BinaryIO) -> None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class FileLock:
+
+    """An advisory lock on a file, that coordinates the processes using the same DB folder.
+        The lock is held by a process, and can be taken again while it is held, so it must
+        only be used by one thread at a time
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._file: Optional[BinaryIO] = None
+        self._depth = 0
+
+    @contextmanager
+    def hold(self, shared: bool = False) -> Iterator[None]:
+        """Holds the lock until the block exits. A shared lock can be held by many processes
+            at once, and an exclusive lock by only one. The lock is not changed if it is
+            already held, so an exclusive lock must be taken first when both are needed
+        """
+
+        if not self._depth:
+            f = open(self.path, "a+b")
+            try:
+                _lock(f, shared)
+            except BaseException:
+                f.close()
+                raise
+            self._file = f
+
+        self._depth += 1
+        try:
+            yield
+
+        finally:
+            self._depth -= 1
+            if not self._depth and self._file is not None:
+                _unlock(self._file)
+                self._file.close()
+                self._file = None
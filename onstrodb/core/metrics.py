@@ -0,0 +1,141 @@
+import bisect
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from contextlib import nullcontext
+from typing import Any
+from typing import Callable
+from typing import cast
+from typing import ContextManager
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import TypeVar
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+# the callbacks are called with the name of the operation and the seconds it took
+HookType = Callable[[str, float], None]
+
+# the upper bounds of the buckets of the latency histograms, from 1 microsecond to about 67 seconds.
+# The latencies above the last bound are counted in an extra bucket
+BUCKET_BOUNDS: List[float] = [2.0 ** i / 1_000_000 for i in range(27)]
+
+_DISABLED = nullcontext()
+
+
+class Histogram:
+
+    """The number of calls of an operation, and the distribution of their latencies"""
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+        self.buckets = [0] * (len(BUCKET_BOUNDS) + 1)
+
+    def add(self, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+        self.buckets[bisect.bisect_left(BUCKET_BOUNDS, seconds)] += 1
+
+    def quantile(self, q: float) -> float:
+        """Returns the upper bound of the bucket that holds the quantile, which is at most the max latency"""
+
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(BUCKET_BOUNDS, self.buckets):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+
+        return self.max
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "total_s": self.total,
+            "mean_s": self.total / self.count,
+            "min_s": self.min,
+            "max_s": self.max,
+            "p50_s": self.quantile(0.5),
+            "p99_s": self.quantile(0.99),
+            "histogram": [[BUCKET_BOUNDS[i] if i < len(BUCKET_BOUNDS) else None, count]
+                          for i, count in enumerate(self.buckets) if count]
+        }
+
+
+class Metrics:
+
+    """Counts the calls of the operations of a DB, and records their latencies. Nothing is
+        measured while it is disabled. The hooks are called after every measured call
+    """
+
+    def __init__(self, enabled: bool = False) -> None:
+        self.enabled = enabled
+        self._histograms: Dict[str, Histogram] = {}
+        self._hooks: List[HookType] = []
+        self._lock = threading.Lock()
+
+    def add_hook(self, hook: HookType) -> None:
+        self._hooks = self._hooks + [hook]
+
+    def remove_hook(self, hook: HookType) -> None:
+        self._hooks = [i for i in self._hooks if i is not hook]
+
+    def record(self, op: str, seconds: float) -> None:
+        with self._lock:
+            histogram = self._histograms.get(op)
+            if histogram is None:
+                histogram = self._histograms[op] = Histogram()
+            histogram.add(seconds)
+
+        for hook in self._hooks:
+            hook(op, seconds)
+
+    def measure(self, op: str) -> ContextManager[None]:
+        """Returns a context manager that records the time spent in it, if the metrics are enabled"""
+        return self._measure(op) if self.enabled else _DISABLED
+
+    @contextmanager
+    def _measure(self, op: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(op, time.perf_counter() - start)
+
+    def snapshot(self, reset: bool = False) -> Dict[str, Dict[str, Any]]:
+        """Returns the metrics of every operation that was measured, and clears them if reset is True"""
+
+        with self._lock:
+            result = {op: histogram.to_dict() for op, histogram in sorted(self._histograms.items())}
+            if reset:
+                self._histograms = {}
+
+        return result
+
+
+def measured(op: str) -> Callable[[F], F]:
+    """Records the calls of the method of the DB as the operation, if the metrics of the DB are enabled"""
+
+    def decorator(method: F) -> F:
+        @functools.wraps(method)
+        def wrapper(self: Any, *args: Any, **kwargs: Any) -> Any:
+            metrics = cast(Metrics, self._metrics)
+            if not metrics.enabled:
+                return method(self, *args, **kwargs)
+
+            start = time.perf_counter()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                metrics.record(op, time.perf_counter() - start)
+
+        return cast(F, wrapper)
+
+    return decorator
@@ -0,0 +1,124 @@
+from typing import List
+from typing import Mapping
+from typing import Optional
+from typing import Union
+
+import numpy as np
+import pandas as pd
+
+from .index import SecondaryIndex
+from .query import BoolOp
+from .query import Predicate
+from .stats import TableStats
+
+# an index lookup is only used if the predicate is estimated to match at most
+# this fraction of the rows, otherwise scanning the column is cheaper
+INDEX_SELECTIVITY_LIMIT = 0.3
+
+
+class PlanNode:
+
+    """A condition of the query, along with the estimated fraction of the rows it matches,
+        and whether it is evaluated with an index lookup or a scan of the column
+    """
+
+    def __init__(self, condition: Union[Predicate, BoolOp], selectivity: float,
+                 use_index: bool = False, children: Optional[List["PlanNode"]] = None) -> None:
+        self.condition = condition
+        self.selectivity = selectivity
+        self.use_index = use_index
+        self.children = children or []
+
+    def columns(self) -> List[str]:
+        """returns the columns that are scanned by the plan"""
+
+        if isinstance(self.condition, Predicate):
+            return [] if self.use_index else [self.condition.field]
+
+        return list(dict.fromkeys(c for i in self.children for c in i.columns()))
+
+    def explain(self, rows: int, depth: int = 0) -> List[str]:
+        """returns the plan as lines of text, in the order in which the conditions are evaluated"""
+
+        estimate = f"estimated rows: {round(self.selectivity * rows)}"
+
+        if isinstance(self.condition, Predicate):
+            method = "index lookup" if self.use_index else "scan"
+            return [f"{'  ' * depth}{self.condition!r}: {method}, {estimate}"]
+
+        lines = [f"{'  ' * depth}{self.condition.op}: {estimate}"]
+        for child in self.children:
+            lines.extend(child.explain(rows, depth + 1))
+
+        return lines
+
+
+def plan_query(condition: Union[Predicate, BoolOp], stats: TableStats,
+               indexes: Mapping[str, SecondaryIndex]) -> PlanNode:
+    """Estimates the selectivity of every condition and orders the conditions of $and, so
+        that the most selective ones are evaluated first, on the fewest rows
+    """
+
+    rows = stats.rows
+
+    if isinstance(condition, Predicate):
+        if condition.uses_index(indexes):
+            matched = len(condition.lookup(indexes[condition.field])) / rows if rows else 0.0
+            selectivity = 1 - matched if condition.op == "$ne" else matched
+            return PlanNode(condition, selectivity, selectivity <= INDEX_SELECTIVITY_LIMIT)
+
+        column = stats.columns[condition.field]
+        return PlanNode(condition, column.selectivity(condition.op, condition.value, rows))
+
+    children = [plan_query(i, stats, indexes) for i in condition.conditions]
+    selectivity = 1.0
+
+    if condition.op == "$and":
+        children.sort(key=lambda i: i.selectivity)
+        for child in children:
+            selectivity *= child.selectivity
+
+    else:
+        for child in children:
+            selectivity *= 1 - child.selectivity
+        selectivity = 1 - selectivity
+
+    return PlanNode(condition, selectivity, children=children)
+
+
+def execute_plan(plan: PlanNode, df: pd.DataFrame, indexes: Mapping[str, SecondaryIndex],
+                 positions: Optional[np.ndarray] = None) -> np.ndarray:
+    """Returns the sorted positions of the rows of the df that satisfies the plan. If positions
+        is provided only those rows are checked
+    """
+
+    condition = plan.condition
+
+    if isinstance(condition, Predicate):
+        if plan.use_index:
+            # the index holds the ids of the whole DB, and the df can be one of its parts
+            found = df.index.get_indexer(list(condition.lookup(indexes[condition.field])))
+            found = np.sort(found[found >= 0])
+            candidates = np.arange(len(df.index)) if positions is None else positions
+
+            if condition.op == "$ne":
+                return np.setdiff1d(candidates, found, assume_unique=True)
+            return np.intersect1d(candidates, found, assume_unique=True)
+
+        if positions is None:
+            return np.flatnonzero(condition.scan(df[condition.field]))
+        return positions[condition.scan(df[condition.field].iloc[positions])]
+
+    if condition.op == "$and":
+        for child in plan.children:
+            positions = execute_plan(child, df, indexes, positions)
+            if not len(positions):
+                break
+
+        return np.arange(len(df.index)) if positions is None else positions
+
+    result = np.empty(0, dtype=np.intp)
+    for child in plan.children:
+        result = np.union1d(result, execute_plan(child, df, indexes, positions))
+
+    return result
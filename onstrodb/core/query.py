@@ -0,0 +1,211 @@
+from typing import Callable
+from typing import cast
+from typing import Dict
+from typing import List
+from typing import Mapping
+from typing import Set
+from typing import Union
+
+import numpy as np
+import pandas as pd
+
+from .hashing import HashIdType
+from .index import SecondaryIndex
+from .validator import cast_value
+from onstrodb.errors.common_errors import QueryError
+
+SchemaDictType = Dict[str, Dict[str, object]]
+ConditionType = Union["Predicate", "BoolOp"]
+
+COMPARISON_OPERATORS: Dict[str, Callable[[pd.Series, object], pd.Series]] = {
+    "$gt": lambda col, val: col > val,
+    "$gte": lambda col, val: col >= val,
+    "$lt": lambda col, val: col < val,
+    "$lte": lambda col, val: col <= val,
+}
+
+FIELD_OPERATORS = ["$eq", "$ne", "$in"] + list(COMPARISON_OPERATORS)
+BOOL_OPERATORS = ["$and", "$or"]
+
+# the operators that can be answered by a secondary index
+INDEX_OPERATORS = ["$eq", "$ne", "$in"]
+
+
+class Predicate:
+
+    """A single condition on a field, like {"age": {"$gt": 3}}"""
+
+    def __init__(self, field: str, op: str, value: object) -> None:
+        self.field = field
+        self.op = op
+        self.value = value
+
+    def __repr__(self) -> str:
+        return f"{self.field} {self.op} {self.value!r}"
+
+    def uses_index(self, indexes: Mapping[str, SecondaryIndex]) -> bool:
+        return self.field in indexes and self.op in INDEX_OPERATORS
+
+    def columns(self, indexes: Mapping[str, SecondaryIndex]) -> List[str]:
+        """returns the columns that are needed to evaluate the predicate"""
+        return [] if self.uses_index(indexes) else [self.field]
+
+    def evaluate(self, df: pd.DataFrame, indexes: Mapping[str, SecondaryIndex]) -> np.ndarray:
+        """Returns a boolean mask of the rows of the df that satisfies the predicate"""
+
+        if self.uses_index(indexes):
+            mask = np.zeros(len(df.index), dtype=bool)
+            mask[df.index.get_indexer(list(self.lookup(indexes[self.field])))] = True
+            return ~mask if self.op == "$ne" else mask
+
+        return self.scan(df[self.field])
+
+    def lookup(self, index: SecondaryIndex) -> Set[HashIdType]:
+        """Returns the hash ids of the rows that are equal to the value, or any of
+            the values for $in, from the index
+        """
+
+        ids: Set[HashIdType] = set()
+        for val in cast(List[object], self.value) if self.op == "$in" else [self.value]:
+            ids |= index.lookup(val)
+
+        return ids
+
+    def scan(self, col: pd.Series) -> np.ndarray:
+        """Returns a boolean mask of the values of the column that satisfies the predicate"""
+
+        if self.op == "$eq":
+            return equals(col, self.value)
+
+        if self.op == "$ne":
+            return ~equals(col, self.value)
+
+        if self.op == "$in":
+            return col.isin(cast(List[object], self.value)).to_numpy(dtype=bool)
+
+        if isinstance(col.dtype, pd.CategoricalDtype):
+            # the values of the dictionary are compared once, and the missing values have the code -1,
+            # which picks the False appended to the result
+            categories = pd.Series(col.dtype.categories)
+            matches = np.append(COMPARISON_OPERATORS[self.op](categories, self.value).to_numpy(dtype=bool), False)
+            return matches[col.cat.codes.to_numpy()]
+
+        # missing values can't be compared, and never satisfy the comparison
+        notna = col.notna().to_numpy(dtype=bool)
+        mask = np.zeros(len(col.index), dtype=bool)
+        mask[notna] = COMPARISON_OPERATORS[self.op](col[notna], self.value).to_numpy(dtype=bool)
+        return mask
+
+
+def equals(col: pd.Series, value: object) -> np.ndarray:
+    """Returns a boolean mask of the values of the column that are equal to the value.
+        Missing values are never equal to the value
+    """
+
+    if isinstance(col.dtype, pd.CategoricalDtype):
+        # the dictionary encoded columns are compared by the code of the value
+        code = col.dtype.categories.get_indexer([value])[0]
+        if code < 0:
+            return np.zeros(len(col.index), dtype=bool)
+        return col.cat.codes.to_numpy() == code
+
+    return (col == value).to_numpy(dtype=bool, na_value=False)
+
+
+class BoolOp:
+
+    """Combines the conditions with $and or $or"""
+
+    def __init__(self, op: str, conditions: List[ConditionType]) -> None:
+        self.op = op
+        self.conditions = conditions
+
+    def __repr__(self) -> str:
+        return f"{self.op}({', '.join(map(repr, self.conditions))})"
+
+    def columns(self, indexes: Mapping[str, SecondaryIndex]) -> List[str]:
+        """returns the columns that are needed to evaluate the conditions"""
+        return list(dict.fromkeys(c for i in self.conditions for c in i.columns(indexes)))
+
+    def evaluate(self, df: pd.DataFrame, indexes: Mapping[str, SecondaryIndex]) -> np.ndarray:
+        """Returns a boolean mask of the rows of the df that satisfies the conditions"""
+
+        if self.op == "$and":
+            mask = np.ones(len(df.index), dtype=bool)
+            for condition in self.conditions:
+                mask &= condition.evaluate(df, indexes)
+
+        else:
+            mask = np.zeros(len(df.index), dtype=bool)
+            for condition in self.conditions:
+                mask |= condition.evaluate(df, indexes)
+
+        return mask
+
+
+def _check_type(field: str, value: object, schema: SchemaDictType) -> None:
+    if type(value).__name__ != schema[field]["type"]:
+        raise QueryError(
+            f"The type of {field!r} must be {schema[field]['type']!r}")
+
+
+def _compile_field(field: str, value: object, schema: SchemaDictType) -> List[ConditionType]:
+    """Compiles the condition on a single field to a list of predicates"""
+
+    if field not in schema:
+        raise QueryError(f"Unknown key {field!r} found in query")
+
+    if not isinstance(value, dict):
+        _check_type(field, value, schema)
+        return [Predicate(field, "$eq", cast_value(field, value, schema))]
+
+    if not value:
+        raise QueryError(f"No operator found for the key {field!r}")
+
+    predicates: List[ConditionType] = []
+    for op, val in value.items():
+        if op not in FIELD_OPERATORS:
+            raise QueryError(f"Unknown operator {op!r}, must be any of {FIELD_OPERATORS!r}")
+
+        if op == "$in":
+            if not isinstance(val, (list, tuple, set)):
+                raise QueryError(f"The value of '$in' must be a list, for the key {field!r}")
+            for i in val:
+                _check_type(field, i, schema)
+
+        else:
+            _check_type(field, val, schema)
+
+        if op == "$in":
+            predicates.append(Predicate(field, op, [cast_value(field, i, schema) for i in val]))
+        else:
+            predicates.append(Predicate(field, op, cast_value(field, val, schema)))
+
+    return predicates
+
+
+def compile_query(query: Dict[str, object], schema: SchemaDictType) -> BoolOp:
+    """Compiles a query to conditions that can be evaluated over the DB. Queries look like
+
+        {"age": {"$gt": 3, "$lt": 10}, "$or": [{"name": "ad"}, {"place": {"$in": ["texas", "canada"]}}]}
+
+        All the conditions at the same level must be satisfied. The values are type checked with the schema.
+    """
+
+    if not isinstance(query, dict):
+        raise QueryError("The query must be a dict")
+
+    conditions: List[ConditionType] = []
+
+    for key, value in query.items():
+        if key in BOOL_OPERATORS:
+            if not isinstance(value, list) or not value:
+                raise QueryError(f"The value of {key!r} must be a non empty list of queries")
+            # a sub query with a single condition needs no $and around it
+            sub_queries = [compile_query(i, schema) for i in value]
+            conditions.append(BoolOp(key, [i.conditions[0] if len(i.conditions) == 1 else i for i in sub_queries]))
+
+        else:
+            conditions.extend(_compile_field(key, value, schema))
+
+    return BoolOp("$and", conditions)
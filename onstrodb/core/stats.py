@@ -0,0 +1,171 @@
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_bool_dtype
+from pandas.api.types import is_numeric_dtype
+
+# the fraction of the rows of a column that can be changed before its statistics are recomputed
+ANALYZE_THRESHOLD = 0.2
+
+# the selectivity used for the comparisons that can't be estimated with the statistics
+DEFAULT_RANGE_SELECTIVITY = 1 / 3
+
+HISTOGRAM_BINS = 10
+
+
+def _non_null(column: pd.Series) -> pd.Series:
+    """returns the values of the column that are not missing. The dictionary encoded values
+        are decoded, since their dictionary is not sorted
+    """
+
+    values = column.dropna()
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values.astype(object)
+
+    return values
+
+
+class ColumnStats:
+
+    """Statistics of a column, used to estimate the number of rows a predicate matches.
+        The null count is exact, min / max only widen on changes, and the distinct count
+        and the histogram are recomputed once too many rows have changed.
+    """
+
+    def __init__(self) -> None:
+        self.nulls = 0
+        self.distinct = 0
+        self.min: Any = None
+        self.max: Any = None
+        self.histogram: Optional[List[List[float]]] = None
+        self.analyzed = False
+        self.modified = 0
+
+    def stale(self, rows: int) -> bool:
+        return not self.analyzed or self.modified > ANALYZE_THRESHOLD * rows
+
+    def analyze(self, column: pd.Series) -> None:
+        """Recompute all the statistics from the column"""
+
+        values = _non_null(column)
+
+        self.nulls = len(column.index) - len(values.index)
+        self.distinct = int(values.nunique())
+        self.min = values.min() if len(values.index) else None
+        self.max = values.max() if len(values.index) else None
+        self.histogram = None
+
+        if len(values.index) and is_numeric_dtype(values.dtype) and not is_bool_dtype(values.dtype):
+            try:
+                counts, edges = np.histogram(values.to_numpy(dtype=float), bins=HISTOGRAM_BINS)
+                self.histogram = [counts.tolist(), edges.tolist()]
+            except ValueError:
+                # the large ints are too close as floats to be split in bins, so min / max are used
+                pass
+
+        self.analyzed = True
+        self.modified = 0
+
+    def add(self, column: pd.Series) -> None:
+        values = _non_null(column)
+
+        self.nulls += len(column.index) - len(values.index)
+        self.modified += len(column.index)
+
+        if len(values.index):
+            low, high = values.min(), values.max()
+            self.min = low if self.min is None else min(self.min, low)
+            self.max = high if self.max is None else max(self.max, high)
+
+    def remove(self, column: pd.Series) -> None:
+        self.nulls -= int(column.isna().sum())
+        self.modified += len(column.index)
+
+    def selectivity(self, op: str, value: Any, rows: int) -> float:
+        """Returns the estimated fraction of the rows that satisfies the operator"""
+
+        if not rows:
+            return 0.0
+
+        non_null = (rows - self.nulls) / rows
+
+        if op == "$eq":
+            if self.min is None or value < self.min or value > self.max:
+                return 0.0
+            return non_null / max(self.distinct, 1)
+
+        if op == "$ne":
+            return 1 - self.selectivity("$eq", value, rows)
+
+        if op == "$in":
+            return min(sum(self.selectivity("$eq", i, rows) for i in value), non_null)
+
+        if self.min is None:
+            return 0.0
+
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return non_null * DEFAULT_RANGE_SELECTIVITY
+
+        below = self._fraction_below(value)
+        return non_null * (1 - below if op in ("$gt", "$gte") else below)
+
+    def _fraction_below(self, value: float) -> float:
+        """Returns the estimated fraction of the non null values that are below the value"""
+
+        if value <= self.min:
+            return 0.0
+        if value >= self.max:
+            return 1.0
+
+        if self.histogram:
+            counts, edges = self.histogram
+            total = sum(counts)
+            below = 0.0
+            for count, low, high in zip(counts, edges[:-1], edges[1:]):
+                if value >= high:
+                    below += count
+                elif value > low:
+                    below += count * (value - low) / (high - low)
+            return below / total if total else 0.0
+
+        return float((value - self.min) / (self.max - self.min))
+
+
+class TableStats:
+
+    """The statistics of all the columns of the DB, kept up to date with the changes made to the DB"""
+
+    def __init__(self, columns: List[str], rows: int = 0) -> None:
+        self.rows = rows
+        self.columns: Dict[str, ColumnStats] = {col: ColumnStats() for col in columns}
+
+    def add(self, df: pd.DataFrame) -> None:
+        if not len(df.index):
+            return
+
+        self.rows += len(df.index)
+        for col, stats in self.columns.items():
+            stats.add(df[col])
+
+    def remove(self, df: pd.DataFrame) -> None:
+        if not len(df.index):
+            return
+
+        self.rows -= len(df.index)
+        for col, stats in self.columns.items():
+            stats.remove(df[col])
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"rows": self.rows, "columns": {col: vars(stats) for col, stats in self.columns.items()}}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "TableStats":
+        table = cls(list(data["columns"]), data["rows"])
+        for col, values in data["columns"].items():
+            table.columns[col].__dict__.update(values)
+
+        return table
@@ -0,0 +1,220 @@
+import os
+import pickle
+import shutil
+import uuid
+from pathlib import Path
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Union
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import infer_dtype
+from pandas.api.types import is_extension_array_dtype
+
+from .files import columnar_path
+from .files import current_columnar_path
+from .files import load_columnar_meta
+
+# the storage formats of the DB file
+STORAGE_FORMATS = ["pickle", "columnar"]
+
+
+def _dump_column(values: Union[pd.Series, pd.Index], path: str, name: str) -> Dict[str, Any]:
+    """Writes the values to the column files starting with name, and returns
+        the meta data needed to read them back
+    """
+
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        # the dictionary encoded columns are stored as the codes of their values, and the dictionary
+        dictionary = values.dtype.categories
+        return {
+            "kind": "dictionary",
+            "codes": _dump_column(pd.Series(values.array.codes), path, name),
+            "size": len(dictionary),
+            "dictionary": _dump_column(dictionary, path, f"{name}d")
+        }
+
+    if is_extension_array_dtype(values.dtype) and values.dtype.kind in "iufb":
+        # the nullable columns are stored as their values, with the missing ones set to 0, and a mask
+        nulls = np.asarray(values.isna())
+        arr = values.to_numpy(dtype=values.dtype.numpy_dtype, na_value=0)
+        arr.tofile(os.path.join(path, f"{name}.bin"))
+
+        if nulls.any():
+            nulls.tofile(os.path.join(path, f"{name}.null"))
+
+        return {"kind": "masked", "dtype": arr.dtype.str, "nulls": bool(nulls.any())}
+
+    arr = values.to_numpy()
+
+    if arr.dtype.kind in "iufb":
+        arr.tofile(os.path.join(path, f"{name}.bin"))
+        return {"kind": "numeric", "dtype": arr.dtype.str}
+
+    if infer_dtype(values, skipna=True) in ("string", "empty"):
+        nulls = pd.isna(arr)
+        encoded = [b"" if n else str(v).encode("utf-8") for v, n in zip(arr.tolist(), nulls.tolist())]
+
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(i) for i in encoded], out=offsets[1:])
+
+        offsets.tofile(os.path.join(path, f"{name}.off"))
+        with open(os.path.join(path, f"{name}.dat"), "wb") as f:
+            f.write(b"".join(encoded))
+
+        if nulls.any():
+            nulls.tofile(os.path.join(path, f"{name}.null"))
+
+        return {"kind": "str", "nulls": bool(nulls.any())}
+
+    # the values that have no binary representation are pickled
+    with open(os.path.join(path, f"{name}.pkl"), "wb") as f:
+        pickle.dump(values.array, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    return {"kind": "pickle"}
+
+
+def _load_column(path: str, name: str, meta: Dict[str, Any], rows: int) -> Any:
+    """Reads the values of a column. Numeric columns are memory mapped, and are only
+        read from the disk when they are accessed
+    """
+
+    if meta["kind"] == "numeric":
+        if not rows:
+            return np.empty(0, dtype=np.dtype(meta["dtype"]))
+
+        # mode "c" keeps the changes made to the array in memory, and not in the file
+        return np.memmap(os.path.join(path, f"{name}.bin"), dtype=np.dtype(meta["dtype"]), mode="c", shape=(rows,))
+
+    if meta["kind"] == "dictionary":
+        codes = _load_column(path, name, meta["codes"], rows)
+        dictionary = _load_column(path, f"{name}d", meta["dictionary"], meta["size"])
+        return pd.Categorical.from_codes(codes, dtype=pd.CategoricalDtype(pd.Index(dictionary, dtype=object)))
+
+    if meta["kind"] == "masked":
+        data = _load_column(path, name, {"kind": "numeric", "dtype": meta["dtype"]}, rows)
+        if meta["nulls"]:
+            mask = np.fromfile(os.path.join(path, f"{name}.null"), dtype=bool)
+        else:
+            mask = np.zeros(rows, dtype=bool)
+
+        # the arrays are made from the memory mapped values, without copying them
+        if data.dtype.kind == "b":
+            return pd.arrays.BooleanArray(data, mask)
+        if data.dtype.kind == "f":
+            return pd.arrays.FloatingArray(data, mask)
+        return pd.arrays.IntegerArray(data, mask)
+
+    if meta["kind"] == "str":
+        offsets = np.fromfile(os.path.join(path, f"{name}.off"), dtype=np.int64).tolist()
+        with open(os.path.join(path, f"{name}.dat"), "rb") as f:
+            data = f.read()
+
+        values: List[object] = [data[i:j].decode("utf-8") for i, j in zip(offsets[:-1], offsets[1:])]
+
+        if meta["nulls"]:
+            nulls = np.fromfile(os.path.join(path, f"{name}.null"), dtype=bool)
+            for i in np.flatnonzero(nulls).tolist():
+                values[i] = None
+
+        return np.array(values, dtype=object)
+
+    with open(os.path.join(path, f"{name}.pkl"), "rb") as f:
+        return pickle.load(f)
+
+
+def dump_columnar(df: pd.DataFrame, db_path: str, db_name: str, lsn: int = 0) -> None:
+    """Stores the df as one binary file per column. The files are written to a temporary
+        directory first, which then replaces the existing one
+    """
+
+    path = columnar_path(db_path, db_name)
+    tmp_path = f"{path}.tmp"
+    old_path = f"{path}.old"
+
+    # the files left by a checkpoint that crashed while it replaced the directory are moved back to it
+    current = current_columnar_path(db_path, db_name)
+    if current != path:
+        os.rename(current, path)
+
+    for i in [tmp_path, old_path]:
+        if Path(i).is_dir():
+            shutil.rmtree(i)
+    os.mkdir(tmp_path)
+
+    meta: Dict[str, Any] = {
+        # every dump has its own id, so the readers of the files it replaces can tell they are gone
+        "id": uuid.uuid4().hex,
+        "rows": len(df.index),
+        "lsn": lsn,
+        "columns": list(df.columns),
+        "index": _dump_column(df.index, tmp_path, "index"),
+        "kinds": [_dump_column(df[col], tmp_path, str(i)) for i, col in enumerate(df.columns)]
+    }
+
+    with open(os.path.join(tmp_path, "meta"), "wb") as f:
+        pickle.dump(meta, f)
+
+    if Path(path).is_dir():
+        os.rename(path, old_path)
+        os.rename(tmp_path, path)
+        shutil.rmtree(old_path)
+
+    else:
+        os.rename(tmp_path, path)
+
+
+class ColumnReader:
+
+    """Reads the index and the columns of a DB stored in the columnar format, one at a time"""
+
+    def __init__(self, db_path: str, db_name: str) -> None:
+        self._db_path = db_path
+        self._db_name = db_name
+        self._path = current_columnar_path(db_path, db_name)
+        self._meta: Dict[str, Any] = load_columnar_meta(db_path, db_name) or {}
+
+        self.rows: int = self._meta["rows"]
+        self.lsn: int = self._meta["lsn"]
+        self.columns: List[str] = list(self._meta["columns"])
+
+    def is_current(self) -> bool:
+        """returns whether the column files are still the ones the reader was opened on. They
+            are replaced by the checkpoints and removed by the purges of the other processes, and
+            the files left by a crashed checkpoint are moved back to the directory by the next one
+        """
+
+        if current_columnar_path(self._db_path, self._db_name) != self._path:
+            return False
+
+        meta = load_columnar_meta(self._db_path, self._db_name)
+        return meta is not None and meta.get("id") == self._meta.get("id") and \
+            meta["lsn"] == self.lsn and meta["rows"] == self.rows
+
+    def index(self) -> pd.Index:
+        return pd.Index(_load_column(self._path, "index", self._meta["index"], self.rows))
+
+    def column(self, col: str) -> Any:
+        i = self.columns.index(col)
+        return _load_column(self._path, str(i), self._meta["kinds"][i], self.rows)
+
+
+def columnar_exists(db_path: str, db_name: str) -> bool:
+    return Path(os.path.join(current_columnar_path(db_path, db_name), "meta")).is_file()
+
+
+def load_columnar(db_path: str, db_name: str, columns: Optional[List[str]] = None) -> Union[pd.DataFrame, None]:
+    """Loads the df from the column files. If columns is provided only those columns are loaded"""
+
+    if not columnar_exists(db_path, db_name):
+        return None
+
+    reader = ColumnReader(db_path, db_name)
+    data = {col: reader.column(col) for col in reader.columns if columns is None or col in columns}
+
+    df = pd.DataFrame(data, index=reader.index(), copy=False)
+    df.attrs = {"lsn": reader.lsn}
+    return df
@@ -1,24 +1,44 @@
 import os
 import pickle
+import struct
+import zlib
 from hashlib import sha256
 from pathlib import Path
+from typing import Any
 from typing import Dict
 from typing import List
+from typing import Optional
+from typing import Sequence
+from typing import Set
+from typing import Tuple
 from typing import Union
 
 import pandas as pd
 
+from .files import atomic_write
+from .files import remove_columnar
+from .files import dump_cached_schema  # noqa: F401
+from .files import dump_generation  # noqa: F401
+from .files import load_cached_schema  # noqa: F401
+from .files import load_generation  # noqa: F401
+from .files import lock_path  # noqa: F401
+from .files import truncate_wal  # noqa: F401
+from .storage import dump_columnar
+from .storage import load_columnar
+from .validator import DTYPE_HINTS
+from .validator import SchemaValidator
 from onstrodb.errors.common_errors import DataError
 from onstrodb.errors.common_errors import QueryError
 from onstrodb.errors.schema_errors import SchemaError
 
 SchemaDictType = Dict[str, Dict[str, object]]
+IndexesType = Dict[str, Dict[object, Set[Union[str, int]]]]
 
 
 def validate_schema(schema: SchemaDictType) -> bool:
     """Check whether all the keys in schema are valid"""
 
-    valid_field_property_keys = ["type", "required", "default"]
+    valid_field_property_keys = ["type", "required", "default", "index", "dtype", "encoding"]
 
     for key, values in schema.items():
         if not isinstance(key, str):
@@ -47,29 +67,47 @@ def validate_schema(schema: SchemaDictType) -> bool:
                 raise SchemaError(
                     f"The type of 'required' must be 'bool' not {type(values['required']).__name__!r}")
 
+        if "index" in values:
+            if not isinstance(values["index"], bool):
+                raise SchemaError(
+                    f"The type of 'index' must be 'bool' not {type(values['index']).__name__!r}")
+
+        if "dtype" in values:
+            hints = DTYPE_HINTS.get(str(values["type"]), {})
+            if values["dtype"] not in hints:
+                raise SchemaError(
+                    f"The 'dtype' of the field {key!r} must be any of {list(hints)!r}")
+
+        if "encoding" in values:
+            if values["encoding"] != "dictionary" or values["type"] != "str":
+                raise SchemaError(
+                    f"The 'encoding' of the field {key!r} must be 'dictionary', for a field of type 'str'")
+
     return True
 
 
 def validate_data_with_schema(data: Dict[str, object], schema: SchemaDictType) -> bool:
-    """Check whether the data complies with the schema"""
+    """Check whether the data complies with the schema. The DB uses a SchemaValidator instead,
+        which compiles the schema once
+    """
+    return SchemaValidator(schema).validate_record(data)
 
-    # check whether all the keys are present in the schema
-    if not all(i in schema.keys() for i in data.keys()):
-        return False
 
-    # check whether the "required" values are inside the data
-    required: List[str] = [j for j in [
-        i for i in schema if "required" in schema[i]] if schema[j]["required"]]
-    for r in required:
-        if r not in data:
-            return False
+def records_to_df(records: List[Dict[str, object]]) -> pd.DataFrame:
+    """Converts a list of records to an object typed DataFrame, so that the python
+        types of the values are kept intact for the validation. Missing values are set to None
+    """
 
-    # verify the type of all the data
-    for d in data:
-        if type(data[d]).__name__ != schema[d]["type"]:
-            return False
+    columns: Dict[str, None] = {}
+    for record in records:
+        columns.update(dict.fromkeys(record))
 
-    return True
+    return pd.DataFrame({col: pd.Series([r.get(col) for r in records], dtype=object) for col in columns})
+
+
+def validate_df_with_schema(df: pd.DataFrame, schema: SchemaDictType) -> bool:
+    """Column wise version of validate_data_with_schema. Null values are treated as missing values"""
+    return SchemaValidator(schema).validate_df(df)
 
 
 def validate_query_data(data: Dict[str, object], schema: SchemaDictType) -> bool:
@@ -89,6 +127,13 @@ def validate_query_data(data: Dict[str, object], schema: SchemaDictType) -> bool
     return True
 
 
+def validate_columns(columns: List[str], schema: SchemaDictType) -> bool:
+    if not all(i in schema for i in columns):
+        raise QueryError("Unknown column found in columns")
+
+    return True
+
+
 def validate_update_data(data: Dict[str, object], schema: SchemaDictType) -> bool:
     if not all(i in schema for i in data.keys()):
         raise DataError("Unknown key found in data")
@@ -104,47 +149,136 @@ def validate_update_data(data: Dict[str, object], schema: SchemaDictType) -> boo
 
 
 def add_default_to_data(data: Dict[str, object], schema: SchemaDictType) -> Dict[str, object]:
-    """Adds the default values present in the schema to the required fields
-        if the values are not provided in the data
+    """Returns the data with the default values present in the schema, for the fields
+        that are not provided in the data. The fields without a default value are set to None
     """
+    return SchemaValidator(schema).add_defaults(data)
 
-    # add non as defaults to the field that is not required and does not have
-    # a default value
-    non_default_values = [i for i in schema if all(
-        j not in schema[i] for j in ["required", "default"])]
 
-    for val in non_default_values:
-        schema[val]["default"] = None
+def add_default_to_df(df: pd.DataFrame, schema: SchemaDictType) -> pd.DataFrame:
+    """Column wise version of add_default_to_data. Returns a new DataFrame with the
+        columns in the same order as the schema
+    """
+    return SchemaValidator(schema).add_defaults_to_df(df)
 
-    defaults: List[str] = [j for j in [
-        i for i in schema if "default" in schema[i]] if "default" in schema[j]]
 
-    if not all(i in data for i in defaults):
-        for i in defaults:
-            if i not in data:
-                data[i] = schema[i]["default"]
+def dump_db(df: pd.DataFrame, db_path: str, db_name: str, lsn: int = 0, storage_format: str = "pickle") -> None:
+    """Converts the df to a pickle file, or to column files if the storage format is columnar.
+        The lsn of the last write ahead log entry included in the df is stored along with it
+    """
+    pickle_path = os.path.join(db_path, f"{db_name}.db")
 
-        return data
+    if storage_format == "columnar":
+        dump_columnar(df, db_path, db_name, lsn)
+        if Path(pickle_path).is_file():
+            os.remove(pickle_path)
 
     else:
-        return data
-
+        snapshot = df.copy(deep=False)
+        snapshot.attrs = {"lsn": lsn}
+        with atomic_write(pickle_path) as f:
+            snapshot.to_pickle(f)
 
-def dump_db(df: pd.DataFrame, db_path: str, db_name: str) -> None:
-    """Converts the df to a pickle file"""
-    df.to_pickle(os.path.join(db_path, f"{db_name}.db"))
+        remove_columnar(db_path, db_name)
 
 
-def load_db(db_path: str, db_name: str) -> Union[pd.DataFrame, None]:
-    """loads the df from the pickle file"""
+def load_db(db_path: str, db_name: str, columns: Optional[List[str]] = None) -> Union[pd.DataFrame, None]:
+    """loads the df from the pickle file or the column files, whichever exists.
+        Only the columns provided are loaded from the column files
+    """
     path = os.path.join(db_path, f"{db_name}.db")
     if Path(path).is_file():
         return pd.read_pickle(path)
 
+    else:
+        return load_columnar(db_path, db_name, columns)
+
+
+def dump_indexes(indexes: IndexesType, rows: int, lsn: int, db_path: str, db_name: str) -> None:
+    """Dumps the secondary indexes along with the number of rows and the lsn of the snapshot they were
+        built from. The rows, the lsn and the indexed fields are dumped first, so they can be loaded
+        without the indexes
+    """
+    with atomic_write(os.path.join(db_path, f"{db_name}.idx")) as f:
+        pickle.dump({"rows": rows, "lsn": lsn, "fields": list(indexes)}, f)
+        pickle.dump(indexes, f)
+
+
+def load_indexes(db_path: str, db_name: str) -> Union[Tuple[int, Optional[int], IndexesType], None]:
+    """Loads the secondary indexes, and the number of rows and the lsn of the snapshot they were built
+        from. The lsn is None for the indexes dumped before it was dumped with them
+    """
+    path = os.path.join(db_path, f"{db_name}.idx")
+    if Path(path).is_file():
+        with open(path, "rb") as f:
+            data = pickle.load(f)
+            # the indexes dumped before the fields were dumped separately
+            if "indexes" in data:
+                return data["rows"], data.get("lsn"), data["indexes"]
+
+            return data["rows"], data.get("lsn"), pickle.load(f)
+
     else:
         return None
 
 
+def dump_stats(stats: Dict[str, Any], db_path: str) -> None:
+    """Dumps the statistics of the columns next to the schema"""
+    with atomic_write(os.path.join(db_path, "db.stats")) as f:
+        pickle.dump(stats, f)
+
+
+def load_stats(db_path: str) -> Union[Dict[str, Any], None]:
+    """Loads the statistics of the columns"""
+    path = os.path.join(db_path, "db.stats")
+    if Path(path).is_file():
+        with open(path, "rb") as f:
+            return pickle.load(f)
+
+    else:
+        return None
+
+
+def append_wal(entries: Sequence[object], db_path: str, db_name: str) -> int:
+    """Appends the entries to the write ahead log and flushes them to the disk.
+        Returns the size of the log
+    """
+    with open(os.path.join(db_path, f"{db_name}.wal"), "ab") as f:
+        for entry in entries:
+            data = pickle.dumps(entry, protocol=pickle.HIGHEST_PROTOCOL)
+            f.write(struct.pack("<II", len(data), zlib.crc32(data)) + data)
+
+        f.flush()
+        os.fsync(f.fileno())
+        return f.tell()
+
+
+def load_wal(db_path: str, db_name: str) -> Tuple[List[Any], int]:
+    """Loads the entries of the write ahead log, up to the first incomplete or corrupt entry.
+        Returns the entries and the size of the valid part of the log
+    """
+    path = os.path.join(db_path, f"{db_name}.wal")
+    entries: List[Any] = []
+    size = 0
+
+    if Path(path).is_file():
+        with open(path, "rb") as f:
+            while True:
+                header = f.read(8)
+                if len(header) < 8:
+                    break
+
+                length, crc = struct.unpack("<II", header)
+                data = f.read(length)
+                if len(data) < length or zlib.crc32(data) != crc:
+                    break
+
+                entries.append(pickle.loads(data))
+                size = f.tell()
+
+    return entries, size
+
+
 def get_db_path(db_name: str) -> str:
     """returns the absolute path of the DB"""
     # default = os.path.join(os.path.expanduser("~"), ".cache", "onstrodb")
@@ -160,23 +294,21 @@ def create_db_folders(db_path: str) -> None:
         path.mkdir(parents=True, exist_ok=True)
 
 
-def load_cached_schema(db_path: str) -> Union[SchemaDictType, None]:
-    """Loads the existing schema, that was provided when the DB was created for the first time."""
-    c_schema_path = os.path.join(db_path, "db.schema")
+def load_hash_scheme(db_path: str) -> Union[str, None]:
+    """Loads the hash scheme of the hash ids, that was chosen when the DB was created"""
+    path = os.path.join(db_path, "db.hash")
 
-    if Path(c_schema_path).is_file():
-        with open(c_schema_path, "rb") as f:
-            return pickle.load(f)
+    if Path(path).is_file():
+        with open(path, "rb") as f:
+            return f.read().decode("ascii")
     else:
         return None
 
 
-def dump_cached_schema(db_path: str, schema: SchemaDictType) -> None:
-    """Dumps the schema in a pickle form for later use"""
-    c_schema_path = os.path.join(db_path, "db.schema")
-
-    with open(c_schema_path, "wb") as f:
-        pickle.dump(schema, f)
+def dump_hash_scheme(db_path: str, scheme: str) -> None:
+    """Dumps the hash scheme of the hash ids"""
+    with atomic_write(os.path.join(db_path, "db.hash")) as f:
+        f.write(scheme.encode("ascii"))
 
 
 def generate_hash_id(values: List[str]) -> str:
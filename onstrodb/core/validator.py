@@ -0,0 +1,176 @@
+from typing import Any
+from typing import cast
+from typing import Dict
+from typing import FrozenSet
+from typing import List
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import infer_dtype
+
+SchemaDictType = Dict[str, Dict[str, object]]
+
+# the values returned by pandas' infer_dtype for each of the schema types
+INFERRED_TYPES: Dict[str, str] = {
+    "int": "integer",
+    "str": "string",
+    "bool": "boolean",
+    "float": "floating"
+}
+
+# the python types of the schema types
+TYPES: Dict[str, type] = {
+    "int": int,
+    "str": str,
+    "bool": bool,
+    "float": float
+}
+
+# the dtypes of the columns of the schema types. The int, bool and str columns can hold missing values
+DTYPES: Dict[str, Any] = {
+    "int": "Int64",
+    "str": pd.StringDtype(),
+    "bool": "boolean",
+    "float": "float64"
+}
+
+# the narrower dtypes, that can be chosen with the "dtype" property of a field
+DTYPE_HINTS: Dict[str, Dict[str, Any]] = {
+    "int": {"int64": "Int64", "int32": "Int32", "int16": "Int16", "int8": "Int8"},
+    "float": {"float64": "float64", "float32": "float32"}
+}
+
+
+def cast_value(field: str, value: object, schema: SchemaDictType) -> object:
+    """Returns the value as it is stored in the column of the field. The float32 columns
+        hold the values rounded to single precision, so a query must be rounded the same way
+    """
+
+    if schema[field].get("dtype") == "float32" and isinstance(value, float):
+        return _round(value)
+
+    return value
+
+
+def _round(value: float) -> float:
+    """returns the value rounded to single precision"""
+    return float(np.float32(value))
+
+
+class SchemaValidator:
+
+    """The schema compiled for validating the data, so the schema is not scanned for every record.
+        The schema is never changed
+    """
+
+    def __init__(self, schema: SchemaDictType) -> None:
+        self.fields: List[str] = list(schema)
+        self.field_set: FrozenSet[str] = frozenset(schema)
+        self.required: FrozenSet[str] = frozenset(i for i in schema if schema[i].get("required"))
+        self.types: Dict[str, type] = {i: TYPES[str(schema[i]["type"])] for i in schema}
+        self.dtypes: Dict[str, Any] = {
+            i: DTYPE_HINTS[str(schema[i]["type"])][str(schema[i]["dtype"])] if "dtype" in schema[i]
+            else DTYPES[str(schema[i]["type"])] for i in schema}
+
+        # the dictionary encoded fields are stored as the codes of their values in a dictionary
+        self.encoded: FrozenSet[str] = frozenset(i for i in schema if schema[i].get("encoding") == "dictionary")
+        for i in self.encoded:
+            self.dtypes[i] = "category"
+
+        # the range of the values that fit in the dtype of every int field
+        self.bounds: Dict[str, Tuple[int, int]] = {}
+        for i in schema:
+            if schema[i]["type"] == "int":
+                info = np.iinfo(str(schema[i].get("dtype", "int64")))
+                self.bounds[i] = (int(info.min), int(info.max))
+
+        # the float fields stored with single precision
+        self.rounded: FrozenSet[str] = frozenset(i for i in schema if schema[i].get("dtype") == "float32")
+
+        # the value of every field that is not required, when it is missing from the data
+        self.defaults: Dict[str, object] = {
+            i: schema[i].get("default") for i in schema if i not in self.required or "default" in schema[i]}
+
+    def validate_record(self, data: Dict[str, object]) -> bool:
+        """Check whether the data complies with the schema. bool values are not accepted for int fields"""
+
+        if not self.field_set.issuperset(data) or not self.required.issubset(data):
+            return False
+
+        types = self.types
+        for key, val in data.items():
+            if type(val) is not types[key]:
+                return False
+
+        for key, (low, high) in self.bounds.items():
+            val = data.get(key)
+            if val is not None and not low <= cast(int, val) <= high:
+                return False
+
+        return True
+
+    def add_defaults(self, data: Dict[str, object]) -> Dict[str, object]:
+        """Returns a copy of the data with the default values of the fields that are missing from it,
+            after the values of the data. The fields without a default value are set to None
+        """
+
+        record = dict(data)
+        if len(record) < len(self.fields):
+            for key, val in self.defaults.items():
+                if key not in record:
+                    record[key] = val
+
+        return record
+
+    def stored_values(self, data: Dict[str, object]) -> List[object]:
+        """Returns the values of the data as they are stored in the DB"""
+
+        if not self.rounded:
+            return list(data.values())
+
+        return [_round(val) if key in self.rounded and isinstance(val, float) else val for key, val in data.items()]
+
+    def validate_df(self, df: pd.DataFrame) -> bool:
+        """Column wise version of validate_record. Null values are treated as missing values"""
+
+        if not self.field_set.issuperset(df.columns):
+            return False
+
+        for r in self.required:
+            if r not in df.columns or df[r].isna().any():
+                return False
+
+        for col in df.columns:
+            values = df[col].dropna()
+            inferred = infer_dtype(values, skipna=True)
+            if inferred != "empty" and inferred != INFERRED_TYPES[self.types[col].__name__]:
+                return False
+
+            if col in self.bounds and len(values.index):
+                low, high = self.bounds[col]
+                if values.min() < low or values.max() > high:
+                    return False
+
+        return True
+
+    def add_defaults_to_df(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Column wise version of add_defaults. Returns a new DataFrame with the columns in the
+            same order as the schema
+        """
+
+        new_df = pd.DataFrame(index=df.index)
+
+        for col in self.fields:
+            default = self.defaults.get(col)
+
+            if col not in df.columns:
+                new_df[col] = pd.Series([default] * len(df.index), index=df.index, dtype=object)
+
+            elif default is not None and df[col].isna().any():
+                new_df[col] = df[col].astype(object).where(df[col].notna(), default)
+
+            else:
+                new_df[col] = df[col]
+
+        return new_df
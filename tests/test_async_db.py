@@ -0,0 +1,102 @@
+import asyncio
+import shutil
+from typing import Dict
+
+import pytest
+
+from onstrodb import AsyncOnstroDb
+from onstrodb import OnstroDb
+from onstrodb.errors.common_errors import DataDuplicateError
+from onstrodb.errors.common_errors import DataError
+
+
+test_schema: Dict[str, Dict[str, object]] = {
+    "name": {"type": "str", "required": True},
+    "age": {"type": "int", "required": True},
+    "place": {"type": "str", "default": "canada"}
+}
+
+
+@pytest.fixture
+def rm_folder():
+    yield
+    shutil.rmtree('./test_onstro')
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_async_db_api():
+    async def main():
+        db = await AsyncOnstroDb.open("test", test_schema, in_memory=True)
+
+        assert await db.add([{"name": "ab", "age": 3}, {"name": "ad", "age": 4}], get_hash_id=True) == [
+            "a811ebf6", "e160bb9c"]
+        assert await db.get_by_query({"age": 3}) == {'a811ebf6': {'name': 'ab', 'age': 3, 'place': 'canada'}}
+        assert await db.get_by_filter({"age": {"$gt": 3}}, columns=["name"]) == {'e160bb9c': {'name': 'ad'}}
+
+        assert await db.update_by_hash_id("a811ebf6", {"place": "france"}) == {"a811ebf6": "bf9c2b1b"}
+        assert await db.get_by_hash_id("bf9c2b1b") == {'name': 'ab', 'age': 3, 'place': 'france'}
+
+        await db.delete_by_query({"age": 4})
+        assert await db.get_hash_id({"name": "ab"}) == ["bf9c2b1b"]
+
+        await db.purge()
+        assert await db.get_all() == {}
+
+    run(main())
+
+
+def test_async_db_concurrent_adds_are_batched(monkeypatch):
+    calls = []
+    add = OnstroDb.add
+
+    def counted_add(self, *args, **kwargs):
+        calls.append(args[0])
+        return add(self, *args, **kwargs)
+
+    monkeypatch.setattr(OnstroDb, "add", counted_add)
+
+    async def main():
+        db = await AsyncOnstroDb.open("test", test_schema, in_memory=True)
+        ids = await asyncio.gather(*(db.add([{"name": f"n{i}", "age": i}], get_hash_id=True) for i in range(10)))
+
+        assert [len(i or []) for i in ids] == [1] * 10
+        assert len(await db.get_all() or {}) == 10
+        assert len(calls) < 10
+
+    run(main())
+
+
+def test_async_db_batch_errors_are_per_call():
+    async def main():
+        db = await AsyncOnstroDb.open("test", test_schema, in_memory=True)
+        results = await asyncio.gather(
+            db.add([{"name": "ab", "age": 3}]),
+            db.add([{"name": "ab", "age": 3}]),
+            db.add([{"name": 1, "age": 3}]),
+            db.add([{"name": "ad", "age": 4}], get_hash_id=True),
+            return_exceptions=True
+        )
+
+        assert results[0] is None
+        assert isinstance(results[1], DataDuplicateError)
+        assert isinstance(results[2], DataError)
+        assert results[3] == ["e160bb9c"]
+        assert len(db.db) == 2
+
+    run(main())
+
+
+@pytest.mark.usefixtures("rm_folder")
+def test_async_db_commit():
+    async def main():
+        async with await AsyncOnstroDb.open("test", test_schema, db_path="test_onstro") as db:
+            await asyncio.gather(db.add([{"name": "ab", "age": 3}]), db.commit(),
+                                 db.add([{"name": "ad", "age": 4}]), db.commit())
+
+        db = await AsyncOnstroDb.open("test", db_path="test_onstro")
+        assert len(await db.get_all() or {}) == 2
+
+    run(main())
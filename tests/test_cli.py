@@ -0,0 +1,241 @@
+import json
+import sys
+from typing import Any
+from typing import cast
+from typing import Dict
+from typing import List
+
+import pandas as pd
+import pytest
+
+from onstrodb import OnstroDb
+from onstrodb.cli.main import main
+
+schema: Dict[str, Dict[str, Any]] = {
+    "name": {"type": "str", "required": True},
+    "age": {"type": "int", "dtype": "int16"},
+    "score": {"type": "float"},
+    "alive": {"type": "bool"},
+    "city": {"type": "str", "encoding": "dictionary"}
+}
+
+rows: List[Dict[str, Any]] = [
+    {"name": "ab", "age": 3, "score": 0.1, "alive": True, "city": "texas"},
+    {"name": "ac", "age": None, "score": None, "alive": None, "city": None},
+    {"name": "é,\"x\"", "age": 5, "score": 1e20, "alive": False, "city": "texas"}
+]
+
+
+def run(monkeypatch, *args):
+    monkeypatch.setattr(sys, "argv", ["onstro", *args])
+    return main()
+
+
+@pytest.fixture
+def db_dir(tmp_path, monkeypatch):
+    (tmp_path / "schema.json").write_text(json.dumps(schema))
+    assert run(monkeypatch, "create", "test", str(tmp_path / "schema.json"), "-d", str(tmp_path)) == 0
+
+    with open(tmp_path / "rows.jsonl", "w") as f:
+        f.writelines(json.dumps(i) + "\n" for i in rows)
+
+    return tmp_path
+
+
+def get_rows(path):
+    db = OnstroDb(db_name="test", db_path=str(path))
+    result = cast(Dict[str, Dict[str, Any]], db.get_all(columns=["name", "age", "alive", "city"]) or {})
+    return sorted(result.values(), key=lambda i: i["name"])
+
+
+def expected_rows():
+    return [{k: v for k, v in i.items() if k != "score"} for i in sorted(rows, key=lambda i: i["name"])]
+
+
+@pytest.mark.parametrize("fmt", ["csv", "jsonl"])
+def test_cli_import_export(fmt, db_dir, monkeypatch, capsys):
+    d = str(db_dir)
+    assert run(monkeypatch, "import", "test", str(db_dir / "rows.jsonl"), "-d", d, "--chunk-size", "2") == 0
+    assert "imported 3 rows" in capsys.readouterr().err
+    assert get_rows(db_dir) == expected_rows()
+
+    # the exported rows can be imported back into an empty DB
+    assert run(monkeypatch, "export", "test", str(db_dir / f"out.{fmt}"), "-d", d, "--chunk-size", "2") == 0
+    assert "exported 3 rows" in capsys.readouterr().err
+    assert run(monkeypatch, "purge", "test", "-d", d) == 0
+    assert get_rows(db_dir) == []
+
+    assert run(monkeypatch, "import", "test", str(db_dir / f"out.{fmt}"), "-d", d) == 0
+    assert get_rows(db_dir) == expected_rows()
+
+
+@pytest.mark.parametrize("fmt", ["csv", "jsonl"])
+@pytest.mark.parametrize("method", ["add", "import"])
+def test_cli_export_import_keeps_the_hash_ids(fmt, method, db_dir, monkeypatch):
+    d = str(db_dir)
+    # a missing value is a missing field, which is hashed after the fields of the row
+    backup = rows + [{"name": "ad", "age": None, "score": 2.5, "alive": None, "city": "ny"}]
+    if method == "add":
+        db = OnstroDb(db_name="test", db_path=d)
+        db.add([{k: v for k, v in i.items() if v is not None} for i in backup])
+        db.commit()
+    else:
+        with open(db_dir / "backup.jsonl", "w") as f:
+            f.writelines(json.dumps(i) + "\n" for i in backup)
+        assert run(monkeypatch, "import", "test", str(db_dir / "backup.jsonl"), "-d", d) == 0
+
+    expected = OnstroDb(db_name="test", db_path=d).get_all()
+    assert run(monkeypatch, "export", "test", str(db_dir / f"out.{fmt}"), "-d", d) == 0
+    assert run(monkeypatch, "purge", "test", "-d", d) == 0
+    assert run(monkeypatch, "import", "test", str(db_dir / f"out.{fmt}"), "-d", d) == 0
+
+    # the rows of the backup get the hash ids they had, since the ids are computed from their values
+    assert list(OnstroDb(db_name="test", db_path=d).get_all() or {}) == list(expected or {})
+
+
+def test_cli_export_columns(db_dir, monkeypatch):
+    d = str(db_dir)
+    assert run(monkeypatch, "import", "test", str(db_dir / "rows.jsonl"), "-d", d) == 0
+    assert run(monkeypatch, "export", "test", str(db_dir / "out.jsonl"), "-d", d, "--columns", "name", "city") == 0
+
+    with open(db_dir / "out.jsonl") as f:
+        assert [json.loads(i) for i in f] == [{"name": i["name"], "city": i["city"]} for i in rows]
+
+
+def test_cli_import_is_atomic(db_dir, monkeypatch, capsys):
+    d = str(db_dir)
+    with open(db_dir / "bad.jsonl", "w") as f:
+        f.writelines(json.dumps(i) + "\n" for i in rows[:2] + [{"name": "ad", "age": "3"}])
+
+    # the first chunk is valid, but the second one is not, so none of them are committed
+    assert run(monkeypatch, "import", "test", str(db_dir / "bad.jsonl"), "-d", d, "--chunk-size", "2") == 1
+    assert "Nothing was imported" in capsys.readouterr().err
+    assert get_rows(db_dir) == []
+
+    assert run(monkeypatch, "import", "test", str(db_dir / "rows.jsonl"), "-d", d) == 0
+    assert run(monkeypatch, "import", "test", str(db_dir / "rows.jsonl"), "-d", d) == 1
+    assert "duplicate" in capsys.readouterr().err
+
+
+@pytest.mark.parametrize("args", [
+    ["import", "nodb", "rows.jsonl"],
+    ["import", "test", "missing.csv"],
+    ["import", "test", "rows.txt"],
+    ["import", "test", "rows.jsonl", "--chunk-size", "0"],
+    ["export", "test", "out.csv", "--columns", "unknown"]
+])
+def test_cli_import_export_errors(args, db_dir, monkeypatch, capsys):
+    args = [str(db_dir / i) if "." in i else i for i in args]
+    assert run(monkeypatch, *args, "-d", str(db_dir)) == 1
+    assert capsys.readouterr().err
+
+
+@pytest.mark.parametrize("conditions, options, expected", [
+    ([], [], ["ab", "ac", "é,\"x\""]),
+    (["city=texas"], [], ["ab", "é,\"x\""]),
+    (["city=texas", "alive=false"], [], ["é,\"x\""]),
+    (["age=3"], ["--columns", "name", "score"], ["ab"]),
+    ([], ["--limit", "2"], ["ab", "ac"]),
+    (["name=ad"], [], [])
+])
+def test_cli_query(conditions, options, expected, db_dir, monkeypatch, capsys):
+    d = str(db_dir)
+    assert run(monkeypatch, "import", "test", str(db_dir / "rows.jsonl"), "-d", d) == 0
+    capsys.readouterr()
+
+    assert run(monkeypatch, "query", "test", *conditions, *options, "-d", d) == 0
+    lines = [json.loads(i) for i in capsys.readouterr().out.splitlines()]
+    db = OnstroDb(db_name="test", db_path=d)
+
+    assert [list(i.values())[0]["name"] for i in lines] == expected
+    for line in lines:
+        hash_id, row = list(line.items())[0]
+        stored = cast(Dict[str, object], db.get_by_hash_id(hash_id))
+        assert list(row) == (["name", "score"] if "--columns" in options else list(schema))
+        # the missing values are printed as null
+        assert row == {k: None if v != v else v for k, v in stored.items() if k in row}
+
+
+@pytest.mark.parametrize("args", [
+    ["query", "nodb"],
+    ["query", "test", "age"],
+    ["query", "test", "age=x"],
+    ["query", "test", "country=texas"],
+    ["query", "test", "--columns", "unknown"],
+    ["query", "test", "--limit", "-1"],
+    ["stats", "nodb"]
+])
+def test_cli_query_stats_errors(args, db_dir, monkeypatch, capsys):
+    assert run(monkeypatch, *args, "-d", str(db_dir)) == 1
+    assert capsys.readouterr().err
+
+
+def values_memory(column):
+    """returns the memory used by the values of the column, without the hash table pandas < 3 counts
+        for the dictionary of a categorical once it is built
+    """
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        return column.cat.codes.nbytes + pd.Index(list(column.cat.categories), dtype=object).memory_usage(deep=True)
+    return column.memory_usage(index=False, deep=True)
+
+
+def file_states(path):
+    return {str(i): (i.stat().st_size, i.stat().st_mtime_ns) for i in sorted(path.rglob("*")) if i.is_file()}
+
+
+@pytest.mark.parametrize("storage_format", ["pickle", "columnar"])
+def test_cli_stats(storage_format, db_dir, monkeypatch, capsys):
+    d = str(db_dir)
+    db = OnstroDb(db_name="test", db_path=d, storage_format=storage_format)
+    db.add_bulk(rows)
+    db.create_index("age")
+    db.commit()
+    db.checkpoint()
+
+    assert run(monkeypatch, "stats", "test", "-d", d, "--json") == 0
+    stats = json.loads(capsys.readouterr().out)
+    loaded = OnstroDb(db_name="test", db_path=d)._frame()
+
+    assert stats["rows"] == 3 and stats["storage_format"] == storage_format
+    assert stats["indexes"] == {"age": "stored"}
+    assert stats["generation"] > 0 and stats["last_commit"] is not None
+    assert stats["files"]["wal"] == 0
+    assert stats["files"]["total"] == sum(v for k, v in stats["files"].items() if k != "total")
+
+    for column, info in stats["columns"].items():
+        assert info["type"] == schema[column]["type"]
+        # the columnar DB is not loaded, so the memory of its columns is estimated from their files
+        assert info["memory_estimated"] is (storage_format == "columnar")
+        assert info["memory"] == pytest.approx(values_memory(loaded[column]), rel=0.5)
+        assert (info["disk"] is None) is (storage_format == "pickle")
+
+    # the changes in the write ahead log are counted
+    db.add([{"name": "ad"}, {"name": "ae"}])
+    db.delete_by_query({"name": "ab"})
+    db.update_by_query({"name": "ac"}, {"age": 7})
+    db.commit()
+    assert run(monkeypatch, "stats", "test", "-d", d) == 0
+    out = capsys.readouterr().out
+    assert "rows:           4" in out and f"storage format: {storage_format}" in out and "index age:" in out
+
+
+@pytest.mark.parametrize("storage_format", ["pickle", "columnar"])
+def test_cli_stats_does_not_change_the_files(storage_format, db_dir, monkeypatch, capsys):
+    d = str(db_dir)
+    db = OnstroDb(db_name="test", db_path=d, storage_format=storage_format)
+    db.add_bulk(rows[:2])
+    db.checkpoint()
+    db.add([rows[2]])
+    db.commit()
+
+    # the incomplete entry at the end of the log is truncated when the DB is opened, but not by stats
+    with open(db_dir / "test" / "test.wal", "ab") as f:
+        f.write(b"\x10\x00")
+    before = file_states(db_dir)
+
+    assert run(monkeypatch, "stats", "test", "-d", d, "--json") == 0
+    stats = json.loads(capsys.readouterr().out)
+    assert file_states(db_dir) == before
+
+    assert stats["rows"] == 3 and stats["files"]["wal"] > 0
+    assert all(i["memory_estimated"] and i["memory"] > 0 for i in stats["columns"].values())
@@ -1,15 +1,23 @@
+import multiprocessing
 import os
 import shutil
+import threading
+import time
 from pathlib import Path
+from typing import cast
 from typing import Dict
+from typing import List
 
+import pandas as pd
 import pytest
 
+import onstrodb.core.db
 from onstrodb.core.db import OnstroDb
 from onstrodb.core.utils import create_db_folders
 from onstrodb.core.utils import dump_cached_schema
 from onstrodb.core.utils import generate_hash_id
 from onstrodb.errors.common_errors import DataDuplicateError
+from onstrodb.errors.common_errors import DataError
 from onstrodb.errors.common_errors import QueryError
 from onstrodb.errors.schema_errors import SchemaError
 
@@ -337,3 +345,956 @@ def test_db_get_by_query_data_dupe(q, d, db_w_data):
 def test_get_by_hash_id_data_dupe(hash_id, d, db_w_data):
     with pytest.raises(DataDuplicateError):
         db_w_data.update_by_hash_id(hash_id, d)
+
+
+@pytest.mark.parametrize(
+    "test_input",
+    (
+        [{"name": "ab", "age": 3}, {"name": "ac", "age": 3, "place": "france"}, {"name": "ad", "age": 4}],
+        pd.DataFrame({"name": ["ab", "ac", "ad"], "age": [3, 3, 4], "place": ["canada", "france", None]}),
+    )
+)
+def test_db_add_bulk(test_input, db_w_data):
+    db = OnstroDb(db_name="test", in_memory=True, schema=test_schema)
+    ids = db.add_bulk(test_input, get_hash_id=True)
+
+    assert ids == list(db_w_data.get_all())
+    assert db.get_all() == db_w_data.get_all()
+
+
+@pytest.mark.parametrize("rows", [1, 100])
+@pytest.mark.parametrize("mixed", [False, True])
+@pytest.mark.parametrize("as_frame", [False, True])
+def test_db_add_bulk_hash_ids_with_defaults(rows, mixed, as_frame):
+    # the defaulted fields are hashed after the fields of the record, as add hashes them
+    schema: Dict[str, Dict[str, object]] = {
+        "name": {"type": "str", "required": True},
+        "age": {"type": "int", "default": 0},
+        "place": {"type": "str"}
+    }
+    records: List[Dict[str, object]] = [{"name": f"n{i}", "place": "x"} for i in range(rows)]
+    if mixed:
+        records.append({"name": "a", "age": 1})
+
+    db = OnstroDb(db_name="test", in_memory=True, schema=schema)
+    ids = db.add(records, get_hash_id=True)
+
+    bulk = OnstroDb(db_name="test", in_memory=True, schema=schema)
+    frame = pd.DataFrame(records)
+    if mixed:
+        frame = frame.astype({"age": "Int64"})
+    assert bulk.add_bulk(frame if as_frame else records, get_hash_id=True) == ids
+    assert bulk.get_all() == db.get_all()
+
+    with pytest.raises(DataDuplicateError):
+        db.add_bulk(records[:1])
+
+
+def test_db_add_bulk_empty(db_w_data):
+    assert db_w_data.add_bulk([], get_hash_id=True) == []
+    assert db_w_data.add_bulk(pd.DataFrame(), get_hash_id=True) == []
+    assert len(db_w_data) == 3
+
+
+@pytest.mark.parametrize(
+    "test_input",
+    (
+        [{"name": "ab"}],
+        [{"name": "ab", "age": "3"}],
+        [{"name": "ab", "age": 3, "country": "india"}],
+        [{"name": "ab", "age": 3}, {"name": "ac", "age": 3.5}],
+        pd.DataFrame({"name": ["ab"], "age": [3.0]}),
+    )
+)
+def test_db_add_bulk_failure(test_input):
+    db = OnstroDb(db_name="test", in_memory=True, schema=test_schema)
+    with pytest.raises(DataError):
+        db.add_bulk(test_input)
+
+
+def test_db_add_bulk_raises_dupe_error(db_w_data):
+    with pytest.raises(DataDuplicateError):
+        db_w_data.add_bulk([{"name": "ae", "age": 5}, {"name": "ae", "age": 5}])
+
+    with pytest.raises(DataDuplicateError):
+        db_w_data.add_bulk([{"name": "ab", "age": 3}])
+
+    assert len(db_w_data) == 3
+
+
+def test_db_add_bulk_with_dupe():
+    db = OnstroDb(db_name="test", in_memory=True, schema=test_schema, allow_data_duplication=True)
+    ids = db.add_bulk([{"name": "ab", "age": 3}, {"name": "ab", "age": 3}], get_hash_id=True)
+
+    assert ids is not None
+    assert len(set(ids)) == 2
+    assert len(db) == 2
+
+
+def test_db_hash_id_index_in_sync(db_w_data):
+    assert db_w_data._hash_ids == set(db_w_data._db.index)
+
+    db_w_data.add([{"name": "ae", "age": 5}])
+    db_w_data.update_by_query({"age": 3}, {"place": "denmark"})
+    db_w_data.update_by_hash_id("e160bb9c", {"age": 6})
+    db_w_data.delete_by_query({"name": "ae"})
+    assert db_w_data._hash_ids == set(db_w_data._db.index)
+
+    db_w_data.delete_by_hash_id(list(db_w_data._hash_ids)[0])
+    assert db_w_data._hash_ids == set(db_w_data._db.index)
+    assert len(db_w_data._hash_ids) == 2
+
+    db_w_data.purge()
+    assert db_w_data._hash_ids == set()
+
+
+def test_db_hash_id_index_after_reload(rm_folder):
+    db = OnstroDb(db_name="test", db_path="test_onstro", schema=test_schema)
+    db.add([{"name": "ad", "age": 34, "place": "texas"}])
+    db.commit()
+
+    db = OnstroDb(db_name="test", db_path="test_onstro", schema=test_schema)
+    assert db._hash_ids == {"ec676189"}
+
+    with pytest.raises(DataDuplicateError):
+        db.add([{"name": "ad", "age": 34, "place": "texas"}])
+
+
+@pytest.fixture
+def db_w_index(db_w_data):
+    db_w_data.create_index("age")
+    db_w_data.create_index("place")
+    return db_w_data
+
+
+@pytest.mark.parametrize(
+    "test_input,output",
+    (
+        ({"age": 3},  {'a811ebf6': {'name': 'ab', 'age': 3, 'place': 'canada'},
+                       'a103f392': {'name': 'ac', 'age': 3, 'place': 'france'}}),
+        ({"place": "france"}, {'a103f392': {
+            'name': 'ac', 'age': 3, 'place': 'france'}}),
+        ({"age": 5}, {})
+    )
+)
+def test_db_get_by_query_with_index(test_input, output, db_w_index):
+    assert db_w_index.get_by_query(test_input) == output
+
+
+def test_db_index_in_sync(db_w_index):
+    db_w_index.add([{"name": "ae", "age": 3}])
+    db_w_index.update_by_query({"place": "france"}, {"age": 4})
+    db_w_index.update_by_hash_id("a811ebf6", {"place": "texas"})
+    db_w_index.delete_by_query({"name": "ad"})
+
+    assert db_w_index._indexes["age"].mapping == {3: {"261516c9", "f8e967d9"}, 4: {"5401527e"}}
+    for field in ("age", "place"):
+        for val in db_w_index._db[field].unique().tolist():
+            assert set(db_w_index.get_by_query({field: val})) == set(
+                db_w_index._db.loc[db_w_index._db[field] == val].index)
+
+    db_w_index.delete_by_query({"age": 3})
+    assert db_w_index.get_by_query({"age": 3}) == {}
+
+    db_w_index.purge()
+    assert db_w_index._indexes["age"].mapping == {}
+
+
+@pytest.mark.usefixtures("rm_folder")
+def test_db_index_persistence():
+    schema: Dict[str, Dict[str, object]] = {
+        "name": {"type": "str", "required": True, "index": True},
+        "age": {"type": "int", "required": True},
+    }
+    db = OnstroDb(db_name="test", db_path="test_onstro", schema=schema)
+    db.add([{"name": "ad", "age": 3}, {"name": "ac", "age": 3}])
+    db.create_index("age")
+    db.commit()
+
+    assert Path(os.path.join("test_onstro", "test", "test.idx")).is_file() is True
+
+    db = OnstroDb(db_name="test", db_path="test_onstro")
+    assert set(db._indexes) == {"name", "age"}
+    assert len(db.get_by_query({"age": 3}) or {}) == 2
+
+
+@pytest.mark.usefixtures("rm_folder")
+def test_db_index_of_an_older_snapshot_is_rebuilt(monkeypatch):
+    schema: Dict[str, Dict[str, object]] = {
+        "name": {"type": "str", "required": True},
+        "age": {"type": "int", "required": True, "index": True},
+    }
+    db = OnstroDb(db_name="test", db_path="test_onstro", schema=schema)
+    db.add([{"name": "ad", "age": 1}, {"name": "ac", "age": 3}])
+    db.commit()
+    db.checkpoint()
+
+    def failing_dump(*args, **kwargs):
+        raise OSError("disk full")
+
+    # the snapshot is written, but the indexes of the previous one are left, with the same number of rows
+    db.update_by_query({"name": "ad"}, {"age": 5})
+    monkeypatch.setattr(onstrodb.core.db, "dump_indexes", failing_dump)
+    with pytest.raises(OSError):
+        db.checkpoint()
+
+    db = OnstroDb(db_name="test", db_path="test_onstro")
+    assert list((db.get_by_query({"age": 5}) or {}).values()) == [{"name": "ad", "age": 5}]
+    assert db.get_by_query({"age": 1}) == {}
+
+
+def test_db_add_nothing_with_index(db_w_index):
+    assert db_w_index.add([], get_hash_id=True) == []
+    assert db_w_index.add([]) is None
+    assert len(db_w_index) == 3 and len(db_w_index._indexes["age"]) == 3
+
+
+def test_db_create_index_unknown_field(db_w_data):
+    with pytest.raises(SchemaError):
+        db_w_data.create_index("country")
+
+
+def test_db_update_rolls_back_on_failure(db_w_data, monkeypatch):
+    before = db_w_data.get_all()
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("re-keying failed")
+
+    monkeypatch.setattr("onstrodb.core.db.pd.Index", fail)
+    with pytest.raises(RuntimeError):
+        db_w_data.update_by_query({"age": 3}, {"place": "denmark"})
+    monkeypatch.undo()
+
+    assert db_w_data.get_all() == before
+    assert db_w_data._hash_ids == set(before)
+
+
+def test_db_update_dupe_leaves_db_unchanged(db_w_data):
+    before = db_w_data.get_all()
+
+    with pytest.raises(DataDuplicateError):
+        db_w_data.update_by_query({"age": 3}, {"place": "france", "name": "ad"})
+
+    assert db_w_data.get_all() == before
+
+
+def test_db_update_leaves_the_old_frame_unchanged(db_w_data):
+    # the update is made to a shallow copy of the DB, so the frame seen by the readers is not changed
+    frame = db_w_data._frame()
+    before = frame.copy(deep=True)
+    db_w_data.update_by_query({"name": "ab"}, {"age": 5, "place": "denmark"})
+
+    assert db_w_data._frame() is not frame
+    pd.testing.assert_frame_equal(frame, before)
+    assert len(db_w_data.get_by_query({"age": 5})) == 1
+
+
+@pytest.mark.usefixtures("rm_folder")
+def test_db_commit_writes_wal():
+    db = OnstroDb(db_name="test", db_path="test_onstro", schema=test_schema)
+    db.add([{"name": "ab", "age": 3}, {"name": "ac", "age": 3, "place": "france"}, {"name": "ad", "age": 4}])
+    db.commit()
+
+    wal_path = Path(os.path.join("test_onstro", "test", "test.wal"))
+    assert wal_path.is_file() is False
+
+    db.add([{"name": "ae", "age": 5}])
+    db.update_by_query({"name": "ab"}, {"name": "adw", "age": 4})
+    db.delete_by_hash_id("e160bb9c")
+    db.create_index("age")
+    db.commit()
+
+    assert wal_path.stat().st_size > 0
+
+    db = OnstroDb(db_name="test", db_path="test_onstro")
+    assert db.get_all() == {'f350b1aa': {'name': 'adw', 'age': 4, 'place': 'canada'},
+                            'a103f392': {'name': 'ac', 'age': 3, 'place': 'france'},
+                            '1ccb608c': {'name': 'ae', 'age': 5, 'place': 'canada'}}
+    assert "age" in db._indexes
+
+    db.checkpoint()
+    assert wal_path.stat().st_size == 0
+
+    db = OnstroDb(db_name="test", db_path="test_onstro")
+    assert len(db) == 3
+
+
+@pytest.mark.usefixtures("rm_folder")
+def test_db_wal_uncommitted_changes_are_lost():
+    db = OnstroDb(db_name="test", db_path="test_onstro", schema=test_schema)
+    db.add([{"name": "ab", "age": 3}])
+    db.commit()
+    db.purge()
+
+    db = OnstroDb(db_name="test", db_path="test_onstro")
+    assert len(db) == 1
+
+
+@pytest.mark.usefixtures("rm_folder")
+def test_db_wal_torn_write():
+    db = OnstroDb(db_name="test", db_path="test_onstro", schema=test_schema)
+    db.commit()
+    db.add([{"name": "ab", "age": 3}])
+    db.commit()
+
+    wal_path = os.path.join("test_onstro", "test", "test.wal")
+    size = os.path.getsize(wal_path)
+    with open(wal_path, "ab") as f:
+        f.write(b"\x10\x00\x00\x00partial")
+
+    db = OnstroDb(db_name="test", db_path="test_onstro")
+    assert list(db.get_all() or {}) == ["a811ebf6"]
+    assert os.path.getsize(wal_path) == size
+
+
+@pytest.mark.usefixtures("rm_folder")
+def test_db_wal_entries_in_snapshot_are_skipped(monkeypatch):
+    db = OnstroDb(db_name="test", db_path="test_onstro", schema=test_schema)
+    db.commit()
+    db.add([{"name": "ab", "age": 3}])
+    db.commit()
+
+    # crash after the snapshot is written, but before the log is cleared
+    monkeypatch.setattr("onstrodb.core.db.truncate_wal", lambda *args: None)
+    db.checkpoint()
+    monkeypatch.undo()
+
+    db = OnstroDb(db_name="test", db_path="test_onstro")
+    assert len(db) == 1
+
+
+@pytest.mark.usefixtures("rm_folder")
+def test_db_refresh():
+    db_1 = OnstroDb(db_name="test", db_path="test_onstro", schema=test_schema)
+    db_2 = OnstroDb(db_name="test", db_path="test_onstro", schema=test_schema)
+    assert db_2.refresh() is False
+
+    db_1.add([{"name": "ab", "age": 3}])
+    db_1.commit()
+    db_1.add([{"name": "ac", "age": 3, "place": "france"}])
+    db_1.commit()
+
+    assert len(db_2) == 0
+    assert db_2.refresh() is True
+    assert db_2.get_all() == db_1.get_all()
+    assert db_2.refresh() is False
+
+
+@pytest.mark.usefixtures("rm_folder")
+def test_db_commit_keeps_the_changes_of_other_processes():
+    db_1 = OnstroDb(db_name="test", db_path="test_onstro", schema=test_schema)
+    db_2 = OnstroDb(db_name="test", db_path="test_onstro", schema=test_schema)
+
+    db_1.add([{"name": "ab", "age": 3}, {"name": "ac", "age": 3, "place": "france"}])
+    db_1.commit()
+
+    # db_2 has not seen the commit of db_1
+    db_2.add([{"name": "ad", "age": 4}, {"name": "ab", "age": 3}])
+    db_2.commit()
+    db_2.delete_by_hash_id("a103f392")
+    db_2.commit()
+
+    expected = {'a811ebf6': {'name': 'ab', 'age': 3, 'place': 'canada'},
+                'e160bb9c': {'name': 'ad', 'age': 4, 'place': 'canada'}}
+
+    assert db_2.get_all() == expected
+    assert OnstroDb(db_name="test", db_path="test_onstro").get_all() == expected
+
+
+def add_and_commit(worker):
+    db = OnstroDb(db_name="test", db_path="test_onstro", schema=test_schema)
+    for i in range(5):
+        db.add([{"name": f"w{worker}", "age": i}])
+        db.commit()
+
+
+@pytest.mark.usefixtures("rm_folder")
+def test_db_commit_from_many_processes():
+    OnstroDb(db_name="test", db_path="test_onstro", schema=test_schema)
+
+    processes = [multiprocessing.Process(target=add_and_commit, args=(i,)) for i in range(3)]
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join()
+
+    assert [p.exitcode for p in processes] == [0, 0, 0]
+    assert len(OnstroDb(db_name="test", db_path="test_onstro")) == 15
+
+
+def test_db_get_with_columns(db_w_data):
+    assert db_w_data.get_all(columns=["name"]) == {'a811ebf6': {'name': 'ab'},
+                                                   'a103f392': {'name': 'ac'},
+                                                   'e160bb9c': {'name': 'ad'}}
+    assert db_w_data.get_by_query({"age": 3}, columns=["place", "name"]) == {
+        'a811ebf6': {'place': 'canada', 'name': 'ab'},
+        'a103f392': {'place': 'france', 'name': 'ac'}}
+    assert db_w_data.get_by_hash_id("e160bb9c", columns=["age"]) == {"age": 4}
+
+
+def test_db_get_with_unknown_columns(db_w_data):
+    with pytest.raises(QueryError):
+        db_w_data.get_all(columns=["country"])
+
+
+def test_db_iter_all(db_w_data):
+    assert dict(db_w_data.iter_all(chunk_size=2)) == db_w_data.get_all()
+    assert dict(db_w_data.iter_all(columns=["name"])) == db_w_data.get_all(columns=["name"])
+
+
+def test_db_iter_by_query(db_w_data):
+    assert dict(db_w_data.iter_by_query({"age": 3}, chunk_size=1)) == db_w_data.get_by_query({"age": 3})
+    assert list(db_w_data.iter_by_query({"age": 5})) == []
+
+
+def test_db_iter_chunks(db_w_data):
+    chunks = list(db_w_data.iter_chunks(chunk_size=2))
+
+    assert [len(i) for i in chunks] == [2, 1]
+    assert {k: v for c in chunks for k, v in c.items()} == db_w_data.get_all()
+
+
+def test_db_iter_is_a_snapshot(db_w_data):
+    before = db_w_data.get_all()
+    records = db_w_data.iter_all(chunk_size=1)
+
+    db_w_data.update_by_query({"name": "ab"}, {"place": "denmark"})
+    db_w_data.delete_by_hash_id("e160bb9c")
+
+    assert dict(records) == before
+
+
+@pytest.mark.parametrize("chunk_size", (0, -1))
+def test_db_iter_invalid_chunk_size(chunk_size, db_w_data):
+    with pytest.raises(ValueError):
+        db_w_data.iter_chunks(chunk_size=chunk_size)
+
+
+@pytest.mark.parametrize(
+    "query,output",
+    (
+        ({"age": 3, "place": "france"}, {'a103f392': {'name': 'ac', 'age': 3, 'place': 'france'}}),
+        ({"age": {"$gt": 3}}, {'e160bb9c': {'name': 'ad', 'age': 4, 'place': 'canada'}}),
+        ({"$or": [{"name": "ab"}, {"name": "ad"}]}, {'a811ebf6': {'name': 'ab', 'age': 3, 'place': 'canada'},
+                                                     'e160bb9c': {'name': 'ad', 'age': 4, 'place': 'canada'}}),
+        ({"name": {"$in": ["zz"]}}, {}),
+    )
+)
+def test_db_get_by_filter(query, output, db_w_data):
+    assert db_w_data.get_by_filter(query) == output
+
+    db_w_data.create_index("name")
+    db_w_data.create_index("place")
+    assert db_w_data.get_by_filter(query) == output
+
+
+def test_db_update_by_filter(db_w_data):
+    new_idx = db_w_data.update_by_filter({"age": {"$lt": 4}, "place": {"$ne": "france"}}, {"name": "adw", "age": 4})
+
+    assert new_idx == {"a811ebf6": "f350b1aa"}
+    assert db_w_data.get_by_hash_id("f350b1aa") == {'name': 'adw', 'age': 4, 'place': 'canada'}
+
+
+def test_db_delete_by_filter(db_w_data):
+    db_w_data.delete_by_filter({"$or": [{"age": 4}, {"place": "france"}]})
+
+    assert db_w_data.get_all() == {'a811ebf6': {'name': 'ab', 'age': 3, 'place': 'canada'}}
+    assert db_w_data._hash_ids == {"a811ebf6"}
+
+
+def test_db_writes_do_not_change_the_snapshot(db_w_index):
+    frame = db_w_index._frame()
+    before = frame.to_dict("index")
+
+    db_w_index.update_by_query({"age": 3}, {"place": "denmark"})
+    db_w_index.delete_by_hash_id("e160bb9c")
+    db_w_index.add([{"name": "ae", "age": 5}])
+
+    assert frame.to_dict("index") == before
+
+
+def test_db_concurrent_writers(db_w_data):
+    def write(start):
+        for i in range(start, start + 50):
+            db_w_data.add([{"name": f"n{i}", "age": i}])
+
+    threads = [threading.Thread(target=write, args=(i * 50,)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(db_w_data) == 203
+    assert db_w_data._hash_ids == set(db_w_data.raw_db().index)
+
+
+def test_db_concurrent_readers_and_writer(db_w_index):
+    errors = []
+    done = threading.Event()
+
+    def write():
+        try:
+            for i in range(40):
+                ids = db_w_index.add([{"name": f"n{i}", "age": 3, "place": "france"}], get_hash_id=True)
+                new_idx = db_w_index.update_by_hash_id(ids[0], {"age": 4})
+                if i % 2:
+                    db_w_index.delete_by_hash_id(new_idx[ids[0]])
+        finally:
+            done.set()
+
+    def read():
+        try:
+            while not done.is_set():
+                rows = db_w_index.get_by_query({"place": "france"})
+                assert all(row["place"] == "france" for row in rows.values())
+
+                rows = db_w_index.get_by_filter({"age": 4, "place": {"$in": ["france"]}})
+                assert all(row["age"] == 4 and row["place"] == "france" for row in rows.values())
+        except Exception as e:
+            errors.append(e)
+
+    readers = [threading.Thread(target=read) for _ in range(2)]
+    for t in readers:
+        t.start()
+    write()
+    for t in readers:
+        t.join()
+
+    assert errors == []
+    assert len(db_w_index.get_by_query({"age": 4})) == 21
+    assert db_w_index.get_by_query({"place": "france"}) == db_w_index.get_by_filter({"place": "france"})
+
+
+def test_db_write_buffer():
+    db = OnstroDb(db_name="test", in_memory=True, schema=test_schema, write_buffer_size=3, write_buffer_delay=60)
+    db.add([{"name": "ab", "age": 3}])
+    db.add([{"name": "ac", "age": 3, "place": "france"}])
+
+    assert len(db._db.index) == 0
+    with pytest.raises(DataDuplicateError):
+        db.add([{"name": "ab", "age": 3}])
+
+    db.add([{"name": "ad", "age": 4}])
+    assert list(db._db.index) == ["a811ebf6", "a103f392", "e160bb9c"]
+    assert db._buffer_ids == []
+
+
+def test_db_write_buffer_read_your_writes():
+    db = OnstroDb(db_name="test", in_memory=True, schema=test_schema, write_buffer_size=100, write_buffer_delay=60)
+    db.create_index("place")
+    db.add([{"name": "ab", "age": 3}])
+
+    assert db.get_by_hash_id("a811ebf6") == {'name': 'ab', 'age': 3, 'place': 'canada'}
+    db.add([{"name": "ac", "age": 3, "place": "france"}])
+    assert db.get_by_query({"place": "france"}) == {'a103f392': {'name': 'ac', 'age': 3, 'place': 'france'}}
+    db.add([{"name": "ad", "age": 4}])
+    assert db.update_by_hash_id("e160bb9c", {"age": 5}) == {"e160bb9c": "d3126238"}
+
+    db.add([{"name": "ae", "age": 5}])
+    db.purge()
+    assert db.get_all() == {}
+
+
+def test_db_write_buffer_delay():
+    db = OnstroDb(db_name="test", in_memory=True, schema=test_schema, write_buffer_size=100, write_buffer_delay=0)
+    db.add([{"name": "ab", "age": 3}])
+    assert len(db._db.index) == 1
+
+
+@pytest.mark.usefixtures("rm_folder")
+def test_db_write_buffer_commit():
+    db = OnstroDb(db_name="test", db_path="test_onstro", schema=test_schema, write_buffer_size=100)
+    db.commit()
+    db.add([{"name": "ab", "age": 3}])
+    db.add([{"name": "ad", "age": 4}])
+    db.commit()
+
+    assert len(OnstroDb(db_name="test", db_path="test_onstro")) == 2
+
+
+@pytest.mark.usefixtures("rm_folder")
+def test_db_group_commit(monkeypatch):
+    db = OnstroDb(db_name="test", db_path="test_onstro", schema=test_schema, group_commit_delay=0.05)
+    db.commit()
+
+    writes = []
+    append_wal = onstrodb.core.db.append_wal
+
+    def counted_append_wal(*args):
+        writes.append(args[0])
+        return append_wal(*args)
+
+    monkeypatch.setattr("onstrodb.core.db.append_wal", counted_append_wal)
+
+    def write(i):
+        db.add([{"name": f"n{i}", "age": i}])
+        db.commit()
+
+    threads = [threading.Thread(target=write, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert 0 < len(writes) < 8
+    assert len(OnstroDb(db_name="test", db_path="test_onstro")) == 8
+
+
+@pytest.mark.parametrize("kwargs", ({"write_buffer_size": -1}, {"write_buffer_delay": -1},
+                                    {"group_commit_delay": -0.5}))
+def test_db_write_buffer_invalid_arguments(kwargs):
+    with pytest.raises(ValueError):
+        OnstroDb(db_name="test", in_memory=True, schema=test_schema, **kwargs)
+
+
+def test_db_append_segments(db_w_data):
+    for i in range(20):
+        db_w_data.add([{"name": f"n{i}", "age": i}])
+
+    assert 1 < len(db_w_data._parts) <= 6
+    assert sum(len(i.index) for i in db_w_data._parts[1:]) == 23
+    assert len(db_w_data) == 23
+
+    # the point queries are answered from the parts, without merging them
+    assert [i["name"] for i in (db_w_data.get_by_query({"age": 3}) or {}).values()] == ["ab", "ac", "n3"]
+    assert [i["name"] for i in (db_w_data.get_by_filter({"age": {"$gte": 18}}) or {}).values()] == ["n18", "n19"]
+    assert db_w_data.get_hash_id({"name": "n19"}) == list(db_w_data.get_by_query({"name": "n19"}) or {})
+    assert len(db_w_data._parts) > 1
+
+    assert list(db_w_data.get_all())[:3] == ["a811ebf6", "a103f392", "e160bb9c"]
+    assert len(db_w_data._parts) == 1
+    assert len(db_w_data) == 23
+
+
+@pytest.mark.parametrize("indexed", [False, True])
+def test_db_read_segments_while_writer_holds_the_lock(db_w_data, indexed):
+    if indexed:
+        db_w_data.create_index("age")
+    for i in range(5):
+        db_w_data.add([{"name": f"n{i}", "age": i}])
+    expected = db_w_data.get_by_query({"age": 3})
+
+    locked, release = threading.Event(), threading.Event()
+
+    def write():
+        with db_w_data._lock:
+            locked.set()
+            release.wait(5)
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    locked.wait(5)
+
+    try:
+        start = time.monotonic()
+        assert db_w_data.get_by_query({"age": 3}) == expected
+        assert len(db_w_data.get_by_filter({"age": {"$lt": 3}}) or {}) == 3
+        assert db_w_data.get_hash_id({"age": 4}) == list(db_w_data.get_by_query({"age": 4}) or {})
+        assert len(db_w_data.get_all() or {}) == 8
+        assert len(db_w_data) == 8
+        assert time.monotonic() - start < 2
+
+        # the merged frame is not published while the writer holds the lock
+        assert len(db_w_data._parts) > 1
+    finally:
+        release.set()
+        writer.join()
+
+
+def test_db_segments_compacted_in_background(db_w_data, monkeypatch):
+    monkeypatch.setattr("onstrodb.core.db.COMPACT_MIN_ROWS", 4)
+
+    db_w_data.add([{"name": "n1", "age": 1}, {"name": "n2", "age": 2}])
+
+    deadline = time.monotonic() + 5
+    while db_w_data._compacting and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert len(db_w_data._parts) == 1
+    assert len(db_w_data._parts[0].index) == 5
+    assert db_w_data._hash_ids == set(db_w_data._parts[0].index)
+
+
+def test_db_read_keeps_the_background_compaction(db_w_data, monkeypatch):
+    monkeypatch.setattr("onstrodb.core.db.COMPACT_MIN_ROWS", 4)
+    merging, merged = threading.Event(), threading.Event()
+    concat = OnstroDb._concat
+
+    def slow_concat(self, frames, dtypes):
+        if threading.current_thread() is not threading.main_thread():
+            merging.set()
+            merged.wait(5)
+        return concat(self, frames, dtypes)
+
+    monkeypatch.setattr(OnstroDb, "_concat", slow_concat)
+    db_w_data.add([{"name": "n1", "age": 1}, {"name": "n2", "age": 2}])
+    merging.wait(5)
+    parts = db_w_data._parts
+
+    # the reader merges the parts for itself, and leaves them to the compaction
+    assert len(db_w_data.get_all() or {}) == 5
+    assert db_w_data._parts is parts
+    merged.set()
+
+    deadline = time.monotonic() + 5
+    while db_w_data._compacting and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert len(db_w_data._parts) == 1
+    assert list(db_w_data._parts[0].index) == list(db_w_data.get_all() or {})
+
+
+@pytest.mark.parametrize("hash_scheme", ["blake2b64", "blake2b128"])
+def test_db_hash_scheme(hash_scheme, rm_folder):
+    db = OnstroDb(db_name="test", db_path="test_onstro", schema=test_schema, hash_scheme=hash_scheme)
+    ids = db.add([{"name": "ab", "age": 3}, {"name": "ac", "age": 4}], get_hash_id=True)
+    assert ids is not None
+    assert all(isinstance(i, int if hash_scheme == "blake2b64" else str) for i in ids)
+
+    db.create_index("age")
+    assert db.get_by_hash_id(ids[0]) == {"name": "ab", "age": 3, "place": "canada"}
+    assert list(db.get_by_query({"age": 4}) or {}) == [ids[1]]
+
+    new_idx = db.update_by_hash_id(ids[0], {"age": 5})
+    assert db.get_by_query({"age": 5}) == {new_idx[ids[0]]: {"name": "ab", "age": 5, "place": "canada"}}
+    db.commit()
+
+    # the scheme is stored with the DB
+    db = OnstroDb(db_name="test", db_path="test_onstro")
+    assert db._hash_scheme == hash_scheme
+    assert db._hash_ids == {new_idx[ids[0]], ids[1]}
+
+    with pytest.raises(DataDuplicateError):
+        db.add([{"name": "ac", "age": 4}])
+
+    with pytest.raises(SchemaError):
+        OnstroDb(db_name="test", db_path="test_onstro", hash_scheme="sha256")
+
+
+def test_db_hash_scheme_int_ids_columnar(rm_folder):
+    db = OnstroDb(db_name="test", db_path="test_onstro", schema=test_schema,
+                  storage_format="columnar", hash_scheme="blake2b64")
+    ids = db.add([{"name": "ab", "age": 3}, {"name": "ac", "age": 4}], get_hash_id=True)
+    assert ids is not None
+    assert db._db.index.dtype == "int64"
+    db.commit()
+
+    db = OnstroDb(db_name="test", db_path="test_onstro", storage_format="columnar")
+    assert db.get_by_hash_id(ids[1]) == {"name": "ac", "age": 4, "place": "canada"}
+
+
+@pytest.mark.usefixtures("rm_folder")
+def test_db_hash_scheme_of_existing_db():
+    # the DBs created without a hash scheme use sha256
+    create_db_folders("./test_onstro/test")
+    dump_cached_schema(schema=test_schema, db_path="./test_onstro/test")
+    assert OnstroDb(db_name="test", db_path="./test_onstro")._hash_scheme == "sha256"
+
+    with pytest.raises(SchemaError):
+        OnstroDb(db_name="test", db_path="./test_onstro", hash_scheme="blake2b64")
+
+
+def test_db_invalid_hash_scheme():
+    with pytest.raises(ValueError):
+        OnstroDb(db_name="test", in_memory=True, schema=test_schema, hash_scheme="md5")
+
+
+def test_db_add_hash_ids_match_add_bulk():
+    records = [{"name": "ab", "age": 3}, {"name": "ac", "age": 4, "place": "france"}]
+    db = OnstroDb(db_name="test", in_memory=True, schema=test_schema)
+    db_bulk = OnstroDb(db_name="test", in_memory=True, schema=test_schema)
+
+    assert db.add(records, get_hash_id=True) == db_bulk.add_bulk(records, get_hash_id=True)
+
+    # the values are hashed in the order of the keys of every record
+    ids = db.add([{"name": "ad", "age": 5}, {"age": 6, "name": "ae"}], get_hash_id=True)
+    assert ids == [generate_hash_id(["ad", "5", "canada"]), generate_hash_id(["6", "ae", "canada"])]
+
+
+def test_db_add_duplicates_in_a_batch(db_w_data):
+    with pytest.raises(DataDuplicateError):
+        db_w_data.add([{"name": "ae", "age": 5}, {"name": "ae", "age": 5}])
+    assert len(db_w_data) == 3
+
+    db = OnstroDb(db_name="test", in_memory=True, schema=test_schema, allow_data_duplication=True)
+    ids = db.add([{"name": "ae", "age": 5}, {"name": "ae", "age": 5}], get_hash_id=True)
+    bulk_ids = db.add_bulk([{"name": "ae", "age": 5}], get_hash_id=True)
+    assert ids is not None and bulk_ids is not None
+    ids += bulk_ids
+    assert len(set(ids)) == 3
+    assert ids[0] == generate_hash_id(["ae", "5", "canada"])
+
+
+def test_db_add_does_not_change_the_schema(rm_folder):
+    schema: Dict[str, Dict[str, object]] = {"name": {"type": "str", "required": True}, "place": {"type": "str"}}
+    db = OnstroDb(db_name="test", db_path="test_onstro", schema=schema)
+    db.add([{"name": "ad"}])
+    db.commit()
+
+    assert schema == {"name": {"type": "str", "required": True}, "place": {"type": "str"}}
+    assert OnstroDb(db_name="test", db_path="test_onstro", schema=schema).get_all() == db.get_all()
+
+
+typed_schema: Dict[str, Dict[str, object]] = {
+    "name": {"type": "str", "required": True},
+    "age": {"type": "int", "dtype": "int32"},
+    "score": {"type": "float", "dtype": "float32"},
+    "alive": {"type": "bool"}
+}
+
+
+@pytest.mark.parametrize("storage_format", ["pickle", "columnar"])
+def test_db_dtypes(storage_format, rm_folder):
+    db = OnstroDb(db_name="test", db_path="test_onstro", schema=typed_schema, storage_format=storage_format)
+    dtypes = {"name": pd.StringDtype(), "age": "Int32", "score": "float32", "alive": "boolean"}
+    assert db._db.dtypes.to_dict() == dtypes
+
+    db.add([{"name": "ab", "age": 3, "score": 0.1}, {"name": "ac", "alive": True}])
+    db.add_bulk([{"name": "ad", "age": 5}])
+    db.update_by_query({"name": "ad"}, {"score": 2.5})
+    assert db._db.dtypes.to_dict() == dtypes
+
+    # the missing int, str and bool values are returned as None, and the float32 values can be
+    # queried with python floats
+    row = list((db.get_by_query({"name": "ac"}) or {}).values())[0]
+    assert isinstance(row, dict)
+    assert row["age"] is None and row["alive"] is True and pd.isna(row["score"])
+    assert len(db.get_by_query({"score": 0.1}) or {}) == 1
+    assert len(db.get_by_filter({"score": {"$in": [0.1, 2.5]}}) or {}) == 2
+    db.commit()
+    db.checkpoint()
+
+    db = OnstroDb(db_name="test", db_path="test_onstro")
+    assert db._frame().dtypes.to_dict() == dtypes
+    assert len(db) == 3
+
+
+def test_db_dtypes_of_an_old_db(rm_folder):
+    # the columns of the DBs stored before the dtypes were added are objects
+    create_db_folders("test_onstro/test")
+    dump_cached_schema("test_onstro/test", typed_schema)
+    df = pd.DataFrame({"name": ["ab"], "age": [3], "score": [None], "alive": [True]}, index=["h1"], dtype=object)
+    df.to_pickle("test_onstro/test/test.db")
+
+    db = OnstroDb(db_name="test", db_path="test_onstro")
+    assert db._db.dtypes.to_dict() == {"name": pd.StringDtype(), "age": "Int32", "score": "float32", "alive": "boolean"}
+    assert db.get_by_hash_id("h1", columns=["name", "age", "alive"]) == {"name": "ab", "age": 3, "alive": True}
+
+
+def test_db_values_out_of_the_dtype(rm_folder):
+    db = OnstroDb(db_name="test", db_path="test_onstro", schema=typed_schema)
+    db.add([{"name": "ab", "age": 3}])
+
+    with pytest.raises(DataError):
+        db.add([{"name": "ac", "age": 2 ** 31}])
+    with pytest.raises(DataError):
+        db.add_bulk([{"name": "ac", "age": 2 ** 31}])
+    with pytest.raises(DataError):
+        db.update_by_query({"name": "ab"}, {"age": 2 ** 31})
+
+    assert db.get_all(columns=["name", "age", "alive"]) == {generate_hash_id(["ab", "3", "None", "None"]): {
+        "name": "ab", "age": 3, "alive": None}}
+
+
+@pytest.mark.parametrize("indexed", [False, True])
+def test_db_large_ints_next_to_missing_values(indexed):
+    # the int64 values that floats can't hold are found with and without an index
+    schema: Dict[str, Dict[str, object]] = {"name": {"type": "str", "required": True}, "a": {"type": "int"}}
+    db = OnstroDb(db_name="test", in_memory=True, schema=schema)
+    if indexed:
+        db.create_index("a")
+
+    db.add([{"name": "x", "a": 2 ** 60 + 1}, {"name": "y"}])
+    assert len(db.get_by_query({"a": 2 ** 60 + 1}) or {}) == 1
+    assert len(db.get_by_query({"a": 2 ** 60}) or {}) == 0
+    assert len(db.get_by_filter({"a": 2 ** 60 + 1, "name": "x"}) or {}) == 1
+
+    db.update_by_query({"name": "x"}, {"a": 2 ** 60 + 3})
+    assert db.get_by_query({"a": 2 ** 60 + 1}) == {}
+    assert len(db.get_by_query({"a": 2 ** 60 + 3}) or {}) == 1
+
+
+encoded_schema: Dict[str, Dict[str, object]] = {
+    "name": {"type": "str", "required": True},
+    "city": {"type": "str", "encoding": "dictionary"},
+    "age": {"type": "int"}
+}
+
+
+@pytest.mark.parametrize("storage_format", ["pickle", "columnar"])
+def test_db_dictionary_encoding(storage_format, rm_folder):
+    db = OnstroDb(db_name="test", db_path="test_onstro", schema=encoded_schema, storage_format=storage_format)
+    db.add([{"name": f"n{i}", "city": ["ny", "la", "sf"][i % 3], "age": i} for i in range(90)])
+    db.add([{"name": "x"}])
+    db.add_bulk([{"name": f"m{i}", "city": ["dc", "ny"][i % 2], "age": i} for i in range(10)])
+
+    # the values are stored as the codes of the dictionary, and missing values are None
+    column = db.raw_db()["city"]
+    assert list(column.cat.categories) == ["ny", "la", "sf", "dc"]
+    assert column.cat.codes.tolist()[:4] == [0, 1, 2, 0]
+    assert db.get_by_query({"name": "x"}) == {generate_hash_id(["x", "None", "None"]): {
+        "name": "x", "city": None, "age": None}}
+
+    assert len(db.get_by_query({"city": "ny"}) or {}) == 35
+    assert len(db.get_by_query({"city": "boston"}) or {}) == 0
+    assert len(db.get_by_filter({"city": {"$gte": "sf"}}) or {}) == 30
+    assert len(db.get_by_filter({"city": {"$ne": "ny"}}) or {}) == 66
+    assert len(db.get_by_filter({"city": {"$in": ["la", "dc"]}}) or {}) == 35
+
+    db.update_by_query({"name": "x"}, {"city": "boston"})
+    db.delete_by_query({"city": "la"})
+    assert list((db.get_by_query({"city": "boston"}) or {}).values()) == [{"name": "x", "city": "boston", "age": None}]
+    assert len(db) == 71
+
+    with pytest.raises(DataDuplicateError):
+        db.add([{"name": "n0", "city": "ny", "age": 0}])
+
+    db.commit()
+    expected = db.get_all()
+    db.checkpoint()
+
+    db = OnstroDb(db_name="test", db_path="test_onstro")
+    assert db.get_all() == expected
+    assert isinstance(db.raw_db()["city"].dtype, pd.CategoricalDtype)
+    assert len(db.get_by_query({"city": "boston"}) or {}) == 1
+
+
+@pytest.mark.usefixtures("rm_folder")
+def test_db_dictionary_encoding_after_checkpoint():
+    # the dictionaries loaded from the column files and the ones extended in memory have the same dtype,
+    # so the rows added after a checkpoint are concatenated as codes
+    db = OnstroDb(db_name="test", db_path="test_onstro", schema=encoded_schema, storage_format="columnar")
+    db.add([{"name": "a", "city": "x"}])
+    db.checkpoint()
+    db.add([{"name": "b"}])
+    db.add([{"name": "c", "city": "x"}])
+    db.commit()
+    expected = db.get_all()
+
+    db = OnstroDb(db_name="test", db_path="test_onstro")
+    assert db.get_all() == expected
+    assert [cast(Dict[str, object], i)["city"] for i in (expected or {}).values()] == ["x", None, "x"]
+    assert isinstance(db.raw_db()["city"].dtype, pd.CategoricalDtype)
+
+
+@pytest.mark.usefixtures("rm_folder")
+def test_db_metrics():
+    db = OnstroDb(db_name="test", db_path="test_onstro", schema=test_schema)
+    db.add([{"name": "ad", "age": 3}])
+    assert db.stats() == {}
+
+    calls = []
+    db.add_metrics_hook(lambda op, seconds: calls.append(op))
+    db.add([{"name": "ac", "age": 4}])
+    db.get_by_query({"name": "ac"})
+    db.commit()
+
+    stats = db.stats()
+    assert {"add", "validate", "hash", "get_by_query", "to_dict", "commit", "dump_db"} <= set(stats)
+    assert stats["add"]["count"] == 1 and stats["add"]["total_s"] > 0
+    assert calls.count("add") == 1 and calls[-1] == "commit"
+
+    db.enable_metrics(False)
+    db.get_by_query({"name": "ac"})
+    assert db.stats(reset=True)["get_by_query"]["count"] == 1
+    assert db.stats() == {}
@@ -0,0 +1,75 @@
+import pickle
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict
+
+import pytest
+
+from onstrodb import OnstroDb
+from onstrodb.core.files import load_generation
+from onstrodb.core.files import load_index_fields
+from onstrodb.core.files import purge_db
+from onstrodb.core.utils import load_indexes
+
+
+@pytest.fixture
+def rm_folder():
+    yield
+    shutil.rmtree("./test_onstro")
+
+
+@pytest.mark.usefixtures("rm_folder")
+@pytest.mark.parametrize("storage_format", ["pickle", "columnar"])
+def test_purge_db(storage_format):
+    schema: Dict[str, Dict[str, object]] = {"name": {"type": "str"}, "age": {"type": "int", "index": True}}
+    db = OnstroDb(db_name="test", db_path="test_onstro", schema=schema, storage_format=storage_format)
+    db.add([{"name": "ab", "age": 3}, {"name": "ac", "age": 4}])
+    db.commit()
+    db.add([{"name": "ad", "age": 5}])
+    db.commit()
+    generation = load_generation("test_onstro/test", "test")
+
+    purge_db("test_onstro/test", "test")
+    assert load_generation("test_onstro/test", "test") == generation + 1
+    assert not Path("test_onstro/test/test.db").exists() and not Path("test_onstro/test/test.cols").exists()
+
+    # the DB that was open sees the purge once it is refreshed
+    assert db.refresh() is True
+    assert db.get_all() == {}
+
+    db = OnstroDb(db_name="test", db_path="test_onstro")
+    assert db.get_all() == {} and db.get_by_query({"age": 3}) == {}
+    db.add([{"name": "ab", "age": 3}])
+    db.commit()
+    assert len(OnstroDb(db_name="test", db_path="test_onstro").get_by_query({"age": 3}) or {}) == 1
+
+
+def test_cli_does_not_import_pandas():
+    code = "import sys; import onstrodb.cli.main; print('pandas' in sys.modules)"
+    assert subprocess.check_output([sys.executable, "-c", code], text=True).strip() == "False"
+
+
+@pytest.mark.usefixtures("rm_folder")
+def test_load_index_fields():
+    schema: Dict[str, Dict[str, object]] = {"name": {"type": "str", "index": True}, "age": {"type": "int"}}
+    db = OnstroDb(db_name="test", db_path="test_onstro", schema=schema)
+    db.add([{"name": "ab", "age": 3}, {"name": "ac", "age": 4}])
+    db.create_index("age")
+    db.commit()
+    db.checkpoint()
+
+    assert load_index_fields("test_onstro/test", "test") == (2, ["name", "age"])
+    stored = load_indexes("test_onstro/test", "test")
+    assert stored is not None
+    rows, lsn, indexes = stored
+    assert rows == 2 and lsn == 2 and set(indexes) == {"name", "age"}
+
+    # the indexes dumped before the fields were dumped separately can still be loaded
+    with open("test_onstro/test/test.idx", "wb") as f:
+        pickle.dump({"rows": rows, "indexes": indexes}, f)
+
+    assert load_index_fields("test_onstro/test", "test") == (2, ["name", "age"])
+    assert load_indexes("test_onstro/test", "test") == (rows, None, indexes)
+    assert load_index_fields("test_onstro/test", "missing") is None
@@ -0,0 +1,70 @@
+import pandas as pd
+import pytest
+
+from onstrodb.core.hashing import encode_row
+from onstrodb.core.hashing import hash_frame
+from onstrodb.core.hashing import hash_row
+from onstrodb.core.utils import generate_hash_id
+
+
+@pytest.mark.parametrize(
+    "test_input,output",
+    [
+        (["ab", 3], b"2:ab1:3"),
+        (["ab", None, 3.5], b"2:ab-:3:3.5"),
+        ([float("nan"), ""], b"-:0:"),
+        (["é"], b"2:\xc3\xa9")
+    ]
+)
+def test_encode_row(test_input, output):
+    assert encode_row(test_input) == output
+
+
+@pytest.mark.parametrize(
+    "first,second",
+    [
+        (["ab", "c"], ["a", "bc"]),
+        (["1", "23"], ["12", "3"]),
+        (["", "a"], ["a", ""])
+    ]
+)
+def test_length_prefix_avoids_collisions(first, second):
+    # the joined values are the same, which the sha256 scheme can't tell apart
+    assert hash_row(first) == hash_row(second)
+    assert hash_row(first, "blake2b64") != hash_row(second, "blake2b64")
+    assert hash_row(first, "blake2b128") != hash_row(second, "blake2b128")
+
+
+def test_hash_row_sha256_is_the_legacy_hash():
+    assert hash_row(["ad", 34, "texas"]) == generate_hash_id(["ad", "34", "texas"]) == "ec676189"
+
+
+def test_hash_row_blake2b():
+    id64 = hash_row(["ad", 34, "texas"], "blake2b64")
+    assert isinstance(id64, int)
+    assert 0 <= id64 < 2 ** 62
+
+    id128 = hash_row(["ad", 34, "texas"], "blake2b128")
+    assert isinstance(id128, str)
+    assert len(id128) == 32
+
+    assert hash_row(["ad", 34, "texas"], "blake2b64") == id64
+    assert hash_row(["ad", 35, "texas"], "blake2b64") != id64
+
+
+@pytest.mark.parametrize("scheme", ["sha256", "blake2b64", "blake2b128"])
+def test_hash_frame_matches_hash_row(scheme):
+    df = pd.DataFrame({
+        "name": pd.Series(["ab", "ac", "é", None, ""], dtype=object),
+        "age": pd.Series([3, 4, 5, 6, 7], dtype=object),
+        "score": [1.5, float("nan"), 0.1, 2.0, 1e20],
+        "alive": [True, False, True, True, False]
+    })
+
+    assert hash_frame(df, scheme) == [hash_row(row, scheme) for row in df.to_numpy(dtype=object).tolist()]
+
+
+@pytest.mark.parametrize("scheme", ["sha256", "blake2b64", "blake2b128"])
+def test_hash_frame_empty(scheme):
+    assert hash_frame(pd.DataFrame({"name": pd.Series([], dtype=object)}), scheme) == []
+    assert hash_frame(pd.DataFrame(index=range(2)), scheme) == [hash_row([], scheme)] * 2
@@ -0,0 +1,43 @@
+import pytest
+
+from onstrodb.core.metrics import BUCKET_BOUNDS
+from onstrodb.core.metrics import Histogram
+from onstrodb.core.metrics import Metrics
+
+
+def test_histogram():
+    histogram = Histogram()
+    for seconds in [0.5e-6, 3e-6, 3e-6, 0.01, 1000.0]:
+        histogram.add(seconds)
+
+    result = histogram.to_dict()
+    assert result["count"] == 5
+    assert result["min_s"] == 0.5e-6 and result["max_s"] == 1000.0
+    assert result["total_s"] == pytest.approx(1000.010006)
+    assert result["p50_s"] == 4e-6
+    assert result["p99_s"] == 1000.0
+    assert result["histogram"] == [[1e-6, 1], [4e-6, 2], [BUCKET_BOUNDS[14], 1], [None, 1]]
+
+
+def test_metrics_disabled():
+    metrics = Metrics()
+    with metrics.measure("add"):
+        pass
+
+    assert metrics.snapshot() == {}
+
+
+def test_metrics_hooks_and_reset():
+    calls = []
+    metrics = Metrics(enabled=True)
+    metrics.add_hook(lambda op, seconds: calls.append(op))
+
+    with metrics.measure("add"):
+        pass
+    with pytest.raises(ValueError):
+        with metrics.measure("commit"):
+            raise ValueError
+
+    assert calls == ["add", "commit"]
+    assert list(metrics.snapshot(reset=True)) == ["add", "commit"]
+    assert metrics.snapshot() == {}
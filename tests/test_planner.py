@@ -0,0 +1,156 @@
+import shutil
+from pathlib import Path
+from typing import Dict
+
+import pandas as pd
+import pytest
+
+from onstrodb.core.db import OnstroDb
+from onstrodb.core.index import SecondaryIndex
+from onstrodb.core.planner import execute_plan
+from onstrodb.core.planner import plan_query
+from onstrodb.core.query import compile_query
+from onstrodb.core.stats import ColumnStats
+from onstrodb.core.stats import TableStats
+
+
+test_schema: Dict[str, Dict[str, object]] = {
+    "name": {"type": "str", "required": True},
+    "age": {"type": "int", "required": True},
+    "place": {"type": "str", "default": "canada"}
+}
+
+test_df = pd.DataFrame({
+    "name": [f"n{i}" for i in range(100)],
+    "age": list(range(100)),
+    "place": ["canada"] * 90 + ["texas"] * 9 + [None],
+}, index=[f"h{i}" for i in range(100)])
+
+
+def remove_folders():
+    "removes the test folders"
+    shutil.rmtree('./test_onstro')
+
+
+@pytest.fixture
+def rm_folder():
+    yield
+    remove_folders()
+
+
+@pytest.fixture
+def stats():
+    table = TableStats(list(test_schema), len(test_df.index))
+    for col, column_stats in table.columns.items():
+        column_stats.analyze(test_df[col])
+
+    return table
+
+
+def test_column_stats_analyze(stats):
+    place = stats.columns["place"]
+
+    assert (place.nulls, place.distinct, place.min, place.max) == (1, 2, "canada", "texas")
+    assert stats.columns["age"].histogram[0] == [10] * 10
+    assert place.histogram is None
+
+
+def test_column_stats_analyze_large_ints():
+    # the floats can't tell the values apart, so there is no histogram
+    stats = ColumnStats()
+    stats.analyze(pd.Series([2 ** 60 + 1, 2 ** 60 + 2, None], dtype="Int64"))
+
+    assert (stats.nulls, stats.distinct, stats.min, stats.max) == (1, 2, 2 ** 60 + 1, 2 ** 60 + 2)
+    assert stats.histogram is None
+    assert stats.selectivity("$lt", 2 ** 60 + 3, 3) == pytest.approx(2 / 3)
+
+
+@pytest.mark.parametrize(
+    "op,value,output",
+    (
+        ("$eq", "texas", 0.495),
+        ("$eq", "zz", 0.0),
+        ("$ne", "texas", 0.505),
+        ("$in", ["canada", "texas"], 0.99),
+    )
+)
+def test_column_stats_selectivity(op, value, output, stats):
+    assert stats.columns["place"].selectivity(op, value, 100) == pytest.approx(output)
+
+
+@pytest.mark.parametrize(
+    "op,value,output",
+    (
+        ("$gt", 89.1, 0.1),
+        ("$lt", 10, 0.1),
+        ("$gt", 200, 0.0),
+        ("$lte", 200, 1.0),
+    )
+)
+def test_column_stats_range_selectivity(op, value, output, stats):
+    assert stats.columns["age"].selectivity(op, value, 100) == pytest.approx(output, abs=0.02)
+
+
+def test_column_stats_changes():
+    column_stats = ColumnStats()
+    column_stats.analyze(pd.Series([1, 2, 3]))
+    assert column_stats.stale(3) is False
+
+    column_stats.add(pd.Series([10, None]))
+    assert (column_stats.max, column_stats.nulls) == (10, 1)
+    assert column_stats.stale(5) is True
+
+
+def test_plan_orders_and_conditions(stats):
+    plan = plan_query(compile_query({"age": {"$gt": 5}, "place": "texas", "name": "n95"}, test_schema),
+                      stats, {})
+
+    assert [repr(i.condition) for i in plan.children] == ["name $eq 'n95'", "place $eq 'texas'", "age $gt 5"]
+    assert list(test_df.index[execute_plan(plan, test_df, {})]) == ["h95"]
+
+
+def test_plan_chooses_index_by_selectivity(stats):
+    indexes = {"place": SecondaryIndex("place")}
+    indexes["place"].build(test_df["place"])
+
+    plan = plan_query(compile_query({"place": "texas"}, test_schema), stats, indexes)
+    assert plan.children[0].use_index is True
+    assert plan.columns() == []
+
+    plan = plan_query(compile_query({"place": "canada"}, test_schema), stats, indexes)
+    assert plan.children[0].use_index is False
+    assert plan.columns() == ["place"]
+
+    plan = plan_query(compile_query({"place": {"$ne": "canada"}, "age": {"$lt": 95}}, test_schema), stats, indexes)
+    assert list(test_df.index[execute_plan(plan, test_df, indexes)]) == [f"h{i}" for i in range(90, 95)]
+
+
+def test_db_explain():
+    db = OnstroDb(db_name="test", in_memory=True, schema=test_schema)
+    db.add_bulk(test_df.reset_index(drop=True).fillna("canada"))
+    db.create_index("place")
+
+    assert db.explain({"age": {"$gt": 50}, "$or": [{"place": "texas"}, {"name": "n1"}]}) == "\n".join([
+        "$and: estimated rows: 5",
+        "  $or: estimated rows: 10",
+        "    place $eq 'texas': index lookup, estimated rows: 9",
+        "    name $eq 'n1': scan, estimated rows: 1",
+        "  age $gt 50: scan, estimated rows: 49",
+    ])
+
+
+@pytest.mark.usefixtures("rm_folder")
+def test_db_stats_persistence():
+    db = OnstroDb(db_name="test", db_path="test_onstro", schema=test_schema)
+    db.add_bulk(test_df.reset_index(drop=True).fillna("canada"))
+    db.get_by_filter({"age": {"$gt": 50}})
+    db.commit()
+
+    assert Path("test_onstro/test/db.stats").is_file() is True
+
+    db = OnstroDb(db_name="test", db_path="test_onstro")
+    assert db._stats.rows == 100
+    assert db._stats.columns["age"].analyzed is True
+
+    db.delete_by_filter({"age": {"$lt": 10}})
+    assert db._stats.rows == 90
@@ -0,0 +1,80 @@
+from typing import Dict
+
+import pandas as pd
+import pytest
+
+from onstrodb.core.index import SecondaryIndex
+from onstrodb.core.query import compile_query
+from onstrodb.errors.common_errors import QueryError
+
+
+test_schema: Dict[str, Dict[str, object]] = {
+    "name": {"type": "str", "required": True},
+    "age": {"type": "int", "required": True},
+    "place": {"type": "str", "default": "canada"}
+}
+
+test_df = pd.DataFrame({
+    "name": ["ab", "ac", "ad", "ae"],
+    "age": [3, 3, 4, 10],
+    "place": ["canada", "france", None, "texas"],
+}, index=["h1", "h2", "h3", "h4"])
+
+
+@pytest.mark.parametrize(
+    "query,output",
+    (
+        ({}, ["h1", "h2", "h3", "h4"]),
+        ({"age": 3}, ["h1", "h2"]),
+        ({"age": 3, "place": "france"}, ["h2"]),
+        ({"age": {"$gt": 3}}, ["h3", "h4"]),
+        ({"age": {"$gte": 4, "$lt": 10}}, ["h3"]),
+        ({"age": {"$lte": 3}}, ["h1", "h2"]),
+        ({"age": {"$ne": 3}}, ["h3", "h4"]),
+        ({"place": {"$ne": "canada"}}, ["h2", "h3", "h4"]),
+        ({"place": {"$gt": "d"}}, ["h2", "h4"]),
+        ({"name": {"$in": ["ab", "ae", "zz"]}}, ["h1", "h4"]),
+        ({"$or": [{"age": 10}, {"place": "france"}]}, ["h2", "h4"]),
+        ({"age": {"$lt": 10}, "$or": [{"name": "ab"}, {"name": "ad"}]}, ["h1", "h3"]),
+        ({"$and": [{"age": 3}, {"$or": [{"name": "ac"}, {"place": "texas"}]}]}, ["h2"]),
+    )
+)
+def test_compile_query_evaluate(query, output):
+    condition = compile_query(query, test_schema)
+
+    assert list(test_df.index[condition.evaluate(test_df, {})]) == output
+
+    indexes = {}
+    for field in ("name", "age", "place"):
+        indexes[field] = SecondaryIndex(field)
+        indexes[field].build(test_df[field])
+
+    assert list(test_df.index[condition.evaluate(test_df, indexes)]) == output
+
+
+@pytest.mark.parametrize(
+    "query",
+    (
+        {"Name": "ab"},
+        {"age": "3"},
+        {"age": {"$gt": 3.5}},
+        {"age": {"$in": 3}},
+        {"age": {"$in": [3, "4"]}},
+        {"age": {"$like": 3}},
+        {"age": {}},
+        {"$or": []},
+        {"$or": {"age": 3}},
+        {"$and": [{"age": 3}, {"place": 4}]},
+    )
+)
+def test_compile_query_failure(query):
+    with pytest.raises(QueryError):
+        compile_query(query, test_schema)
+
+
+def test_compile_query_columns():
+    condition = compile_query({"age": {"$gt": 3}, "$or": [{"name": "ab"}, {"place": "texas"}]}, test_schema)
+    index = SecondaryIndex("name")
+
+    assert condition.columns({}) == ["age", "name", "place"]
+    assert condition.columns({"name": index}) == ["age", "place"]
@@ -0,0 +1,316 @@
+import copy
+import os
+import shutil
+from pathlib import Path
+from typing import cast
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from onstrodb.core.db import OnstroDb
+from onstrodb.core.files import purge_db
+from onstrodb.core.storage import dump_columnar
+from onstrodb.core.storage import load_columnar
+
+
+test_schema: Dict[str, Dict[str, object]] = {
+    "name": {"type": "str", "required": True},
+    "age": {"type": "int", "required": True},
+    "score": {"type": "float", "default": 1.5},
+    "active": {"type": "bool", "default": True},
+    "place": {"type": "str"}
+}
+
+
+def remove_folders():
+    "removes the test folders"
+    shutil.rmtree('./test_onstro')
+
+
+def as_records(df):
+    "returns the rows of the df as dicts, with the missing values as None"
+    return df.astype(object).where(df.notna(), None).to_dict("index")
+
+
+@pytest.fixture
+def rm_folder():
+    os.makedirs("./test_onstro")
+    yield
+    remove_folders()
+
+
+@pytest.mark.usefixtures("rm_folder")
+def test_columnar_round_trip():
+    df = pd.DataFrame({
+        "name": ["ab", "ac", "ä"],
+        "age": [3, 4, 5],
+        "score": [1.5, np.nan, 2.0],
+        "active": [True, False, True],
+        "place": pd.Series(["texas", None, "france"], dtype=object),
+        "mixed": pd.Series([1, "a", None], dtype=object),
+    }, index=["h1", "h2", "h3"])
+
+    dump_columnar(df, "test_onstro", "test", lsn=7)
+    loaded = load_columnar("test_onstro", "test")
+
+    assert loaded is not None
+    assert loaded.attrs == {"lsn": 7}
+    assert list(loaded.index) == ["h1", "h2", "h3"]
+    assert as_records(loaded) == as_records(df)
+    assert any(isinstance(b.values, np.memmap) for b in loaded._mgr.blocks)
+
+
+@pytest.mark.usefixtures("rm_folder")
+def test_columnar_nullable_columns():
+    df = pd.DataFrame({
+        "age": pd.array([3, None, 5], dtype="Int32"),
+        "active": pd.array([True, False, None], dtype="boolean"),
+        "count": pd.array([1, 2, 3], dtype="Int64")
+    }, index=["h1", "h2", "h3"])
+
+    dump_columnar(df, "test_onstro", "test")
+    loaded = load_columnar("test_onstro", "test")
+
+    assert loaded is not None
+    assert loaded.dtypes.to_dict() == df.dtypes.to_dict()
+    assert as_records(loaded) == as_records(df)
+
+    # the values are memory mapped, and the missing ones are masked
+    assert isinstance(loaded["age"].array._data, np.memmap)
+    assert loaded["age"].isna().tolist() == [False, True, False]
+    assert not Path("test_onstro/test.cols/2.null").exists()
+
+
+@pytest.mark.usefixtures("rm_folder")
+def test_columnar_dictionary_columns():
+    df = pd.DataFrame({"city": pd.Categorical(["ny", None, "la", "ny"])}, index=["h1", "h2", "h3", "h4"])
+
+    dump_columnar(df, "test_onstro", "test")
+    loaded = load_columnar("test_onstro", "test")
+
+    assert loaded is not None
+    # the codes are stored as they are, with the dictionary in its own files
+    assert loaded["city"].cat.codes.tolist() == df["city"].cat.codes.tolist()
+    assert loaded["city"].cat.categories.tolist() == ["la", "ny"]
+    assert Path("test_onstro/test.cols/0d.dat").exists()
+
+
+@pytest.mark.usefixtures("rm_folder")
+def test_columnar_projection():
+    df = pd.DataFrame({"name": ["ab", "ac"], "age": [3, 4]}, index=["h1", "h2"])
+    dump_columnar(df, "test_onstro", "test")
+
+    loaded = load_columnar("test_onstro", "test", columns=["age"])
+    assert loaded is not None
+    assert list(loaded.columns) == ["age"]
+    assert loaded["age"].tolist() == [3, 4]
+
+
+@pytest.mark.usefixtures("rm_folder")
+def test_columnar_missing():
+    assert load_columnar("test_onstro", "test") is None
+
+
+@pytest.mark.usefixtures("rm_folder")
+@pytest.mark.parametrize("failed_rename, rows, lsn", [(1, 1, 1), (2, 3, 2)])
+def test_columnar_dump_is_atomic(failed_rename, rows, lsn, monkeypatch):
+    df = pd.DataFrame({"name": ["ab", "ac", "ad"]}, index=["1", "2", "3"])
+    dump_columnar(df.iloc[:1], "test_onstro", "test", lsn=1)
+
+    # the dump crashes before or after the directory is moved away, and the files of the
+    # previous or of the new dump are read
+    rename = os.rename
+    calls = []
+
+    def crash(src, dst):
+        calls.append(src)
+        if len(calls) == failed_rename:
+            raise OSError("crash")
+        rename(src, dst)
+
+    monkeypatch.setattr(os, "rename", crash)
+    with pytest.raises(OSError):
+        dump_columnar(df, "test_onstro", "test", lsn=2)
+    monkeypatch.undo()
+
+    loaded = load_columnar("test_onstro", "test")
+    assert loaded is not None
+    assert len(loaded.index) == rows and loaded.attrs == {"lsn": lsn}
+
+    # the next dump replaces the directory, and removes the ones left by the crash
+    dump_columnar(df.iloc[:2], "test_onstro", "test", lsn=3)
+    assert sorted(os.listdir("test_onstro")) == ["test.cols"]
+    loaded = load_columnar("test_onstro", "test")
+    assert loaded is not None and list(loaded.index) == ["1", "2"]
+
+
+@pytest.mark.usefixtures("rm_folder")
+def test_db_columnar_checkpoint_crash(monkeypatch):
+    db = OnstroDb(db_name="test", db_path="test_onstro", schema=copy.deepcopy(test_schema), storage_format="columnar")
+    db.add([{"name": "a", "age": 1}])
+    db.checkpoint()
+    db.add([{"name": "b", "age": 2}, {"name": "c", "age": 3}])
+    db.commit()
+    expected = db.get_all()
+
+    def crash(src, dst):
+        raise OSError("crash")
+
+    # the directory of the previous checkpoint is moved away, and the new one is not moved in its place
+    rename = os.rename
+    monkeypatch.setattr(os, "rename", lambda src, dst: crash(src, dst) if src.endswith(".tmp") else rename(src, dst))
+    with pytest.raises(OSError):
+        db.checkpoint()
+    monkeypatch.undo()
+
+    db = OnstroDb(db_name="test", db_path="test_onstro")
+    assert db.get_all() == expected
+
+    db.add([{"name": "d", "age": 4}])
+    db.checkpoint()
+    assert len(OnstroDb(db_name="test", db_path="test_onstro")) == 4
+    assert not Path("test_onstro/test/test.cols.old").exists()
+
+
+@pytest.mark.usefixtures("rm_folder")
+def test_db_columnar_storage():
+    db = OnstroDb(db_name="test", db_path="test_onstro", schema=copy.deepcopy(test_schema), storage_format="columnar")
+    ids = db.add([{"name": "ab", "age": 3}, {"name": "ac", "age": 4, "score": 3.0, "place": "texas"}],
+                 get_hash_id=True)
+    assert ids is not None
+    db.commit()
+
+    assert Path("test_onstro/test/test.cols/meta").is_file() is True
+    assert Path("test_onstro/test/test.db").is_file() is False
+
+    db.update_by_hash_id(ids[0], {"age": 5})
+    db.commit()
+    before = db.get_all()
+
+    db = OnstroDb(db_name="test", db_path="test_onstro", storage_format="columnar")
+    assert db.get_all() == before
+
+    db.checkpoint()
+    db = OnstroDb(db_name="test", db_path="test_onstro")
+    assert db.get_all() == before
+
+    # the in memory changes must not be written to the memory mapped files
+    db.update_by_query({"name": "ac"}, {"age": 10})
+    db = OnstroDb(db_name="test", db_path="test_onstro")
+    assert db.get_all() == before
+
+
+@pytest.mark.usefixtures("rm_folder")
+def test_db_switch_storage_format():
+    db = OnstroDb(db_name="test", db_path="test_onstro", schema=copy.deepcopy(test_schema))
+    db.add([{"name": "ab", "age": 3}])
+    db.commit()
+
+    db = OnstroDb(db_name="test", db_path="test_onstro", storage_format="columnar")
+    db.checkpoint()
+
+    assert Path("test_onstro/test/test.db").is_file() is False
+    assert len(OnstroDb(db_name="test", db_path="test_onstro")) == 1
+
+
+def test_db_invalid_storage_format():
+    with pytest.raises(ValueError):
+        OnstroDb(db_name="test", in_memory=True, schema=copy.deepcopy(test_schema), storage_format="parquet")
+
+
+@pytest.mark.usefixtures("rm_folder")
+def test_db_columnar_lazy_loading():
+    db = OnstroDb(db_name="test", db_path="test_onstro", schema=copy.deepcopy(test_schema), storage_format="columnar")
+    db.add([{"name": "ab", "age": 3}, {"name": "ac", "age": 4, "place": "texas"}])
+    db.commit()
+    expected = db.get_all()
+
+    db = OnstroDb(db_name="test", db_path="test_onstro")
+    assert list(db._db.columns) == []
+
+    assert db.get_by_query({"age": 4}, columns=["name"]) == {"8e96765f": {"name": "ac"}}
+    assert sorted(db._db.columns) == ["age", "name"]
+
+    assert db.get_by_hash_id("8e96765f", columns=["place"]) == {"place": "texas"}
+    assert db._column_reader is not None
+
+    assert db.get_all() == expected
+    assert list(db._db.columns) == list(test_schema)
+    assert db._column_reader is None
+
+
+@pytest.mark.usefixtures("rm_folder")
+def test_db_columnar_lazy_writes():
+    db = OnstroDb(db_name="test", db_path="test_onstro", schema=copy.deepcopy(test_schema), storage_format="columnar")
+    db.add([{"name": "ab", "age": 3}, {"name": "ac", "age": 4, "place": "texas"}])
+    db.commit()
+    expected = db.get_all()
+
+    db = OnstroDb(db_name="test", db_path="test_onstro")
+    db.get_all(columns=["age"])
+    db.add([{"name": "ad", "age": 5}])
+    db.delete_by_query({"name": "ad"})
+    assert db.get_all() == expected
+
+    db = OnstroDb(db_name="test", db_path="test_onstro")
+    db.get_all(columns=["age"])
+    db.purge()
+    assert db.get_all() == {}
+
+
+@pytest.mark.usefixtures("rm_folder")
+def test_db_columnar_lazy_reads_after_checkpoint_of_other_process():
+    db = OnstroDb(db_name="test", db_path="test_onstro", schema=copy.deepcopy(test_schema), storage_format="columnar")
+    db.add([{"name": "a", "age": 1}, {"name": "b", "age": 2}, {"name": "c", "age": 3}])
+    db.commit()
+
+    reader = OnstroDb(db_name="test", db_path="test_onstro")
+    reader.get_all(columns=["age"])
+    reader.create_index("age")
+
+    # the files the reader was opened on are replaced, so it reloads the DB before it reads them
+    db.delete_by_query({"name": "a"})
+    db.add([{"name": "z", "age": 26}])
+    db.checkpoint()
+
+    assert reader.get_by_query({"name": "a"}) == {}
+    assert reader.get_all() == db.get_all()
+    assert sorted(cast(Dict[str, str], i)["name"] for i in (reader.get_all() or {}).values()) == ["b", "c", "z"]
+
+    # the changes that were not committed are kept
+    assert len(reader.get_by_query({"age": 26}) or {}) == 1 and "age" in reader._indexes
+    reader.commit()
+    assert "age" in OnstroDb(db_name="test", db_path="test_onstro")._indexes
+
+
+@pytest.mark.usefixtures("rm_folder")
+def test_db_columnar_lazy_reads_after_purge_of_other_process():
+    db = OnstroDb(db_name="test", db_path="test_onstro", schema=copy.deepcopy(test_schema), storage_format="columnar")
+    db.add([{"name": "a", "age": 1}, {"name": "b", "age": 2}])
+    db.commit()
+
+    reader = OnstroDb(db_name="test", db_path="test_onstro")
+    hash_id = list(reader.get_by_query({"name": "b"}, columns=["age"]) or {})[0]
+    purge_db("test_onstro/test", "test")
+
+    assert reader.get_by_hash_id(hash_id) == {}
+    assert reader.update_by_hash_id(hash_id, {"age": 5}) == {}
+    assert reader.get_all() == {}
+
+
+@pytest.mark.usefixtures("rm_folder")
+def test_db_columnar_lazy_add_after_checkpoint_of_other_process():
+    db = OnstroDb(db_name="test", db_path="test_onstro", schema=copy.deepcopy(test_schema), storage_format="columnar")
+    db.add([{"name": "a", "age": 1}])
+    db.commit()
+
+    reader = OnstroDb(db_name="test", db_path="test_onstro")
+    db.add([{"name": "z", "age": 26}])
+    db.checkpoint()
+
+    # the row added by the other process is not added twice, when the DB is reloaded by the add
+    reader.add([{"name": "z", "age": 26}, {"name": "y", "age": 25}])
+    assert sorted(cast(Dict[str, str], i)["name"] for i in (reader.get_all() or {}).values()) == ["a", "y", "z"]
+    assert reader.raw_db().index.is_unique
@@ -1,11 +1,22 @@
+import os
 import shutil
+from pathlib import Path
 from typing import Dict
 
+import pandas as pd
 import pytest
 
 from onstrodb.core.utils import add_default_to_data
+from onstrodb.core.utils import add_default_to_df
+from onstrodb.core.utils import create_db_folders
+from onstrodb.core.utils import dump_db
+from onstrodb.core.utils import dump_generation
 from onstrodb.core.utils import generate_hash_id
+from onstrodb.core.utils import load_db
+from onstrodb.core.utils import load_generation
+from onstrodb.core.utils import records_to_df
 from onstrodb.core.utils import validate_data_with_schema
+from onstrodb.core.utils import validate_df_with_schema
 from onstrodb.core.utils import validate_query_data
 from onstrodb.core.utils import validate_schema
 from onstrodb.core.utils import validate_update_data
@@ -49,7 +60,10 @@ def test_generate_hash_id(test_input, output):
     [
         ({"name": {"type": "str", "required": True, "default": "ad"}}, True),
         ({"name": {"type": "str"}, "age": {"type": "int"}}, True),
-        ({"name": {"type": "str"}, "age": {"type": "float"}}, True)
+        ({"name": {"type": "str"}, "age": {"type": "float"}}, True),
+        ({"name": {"type": "str", "index": True}}, True),
+        ({"age": {"type": "int", "dtype": "int32"}, "score": {"type": "float", "dtype": "float32"}}, True),
+        ({"city": {"type": "str", "encoding": "dictionary"}}, True)
     ]
 )
 def test_validate_schema_accepted_conditions(test_input, output):
@@ -63,7 +77,12 @@ def test_validate_schema_accepted_conditions(test_input, output):
         {"name": {"type": "str", "default": 12}},
         {"name": {"default": "fr"}},
         {"name": {"type": "str", "required": 3}},
-        {"name": {"type": str}}
+        {"name": {"type": str}},
+        {"name": {"type": "str", "index": "yes"}},
+        {"name": {"type": "int", "dtype": "float32"}},
+        {"name": {"type": "str", "dtype": "int32"}},
+        {"name": {"type": "str", "encoding": "plain"}},
+        {"name": {"type": "int", "encoding": "dictionary"}}
     ]
 )
 def test_validate_schema_error_conditions(test_schema):
@@ -86,6 +105,41 @@ def test_validate_data_with_schema(test_input, output):
     assert validate_data_with_schema(test_input, test_schema) == output
 
 
+@pytest.mark.parametrize(
+    "test_input,output",
+    [
+        ({"name": "ad", "age": 3, "place": "texas"}, True),
+        ({"name": "ad", "age": 3}, True),
+        ({"name": "ad"}, False),
+        ({"name": "ad", "place": "texas"}, False),
+        ({"name": "ad", "age": "test"}, False),
+        ({"name": "ad", "age": 12, "place": 3}, False),
+        ({"name": "ad", "age": True}, False),
+        ({"name": "ad", "age": 12, "country": "india"}, False)
+    ]
+)
+def test_validate_df_with_schema(test_input, output):
+    assert validate_df_with_schema(records_to_df([test_input]), test_schema) == output
+
+
+def test_validate_df_with_schema_missing_required():
+    df = records_to_df([{"name": "ad", "age": 3}, {"name": "ac"}])
+    assert validate_df_with_schema(df, test_schema) is False
+
+
+def test_add_default_to_df():
+    schema: Dict[str, Dict[str, object]] = {
+        "name": {"type": "str", "required": True},
+        "place": {"type": "str", "default": "canada"},
+        "exp": {"type": "float"}
+    }
+    df = add_default_to_df(records_to_df([{"name": "ad"}, {"place": "texas", "name": "ac"}]), schema)
+
+    assert list(df.columns) == ["name", "place", "exp"]
+    assert df.to_dict("records") == [{"name": "ad", "place": "canada", "exp": None},
+                                     {"name": "ac", "place": "texas", "exp": None}]
+
+
 @pytest.mark.parametrize(
     "test_input,output",
     [
@@ -160,3 +214,32 @@ def test_validate_update_data(test_input):
 def test_validate_update_data_failure(test_input):
     with pytest.raises(DataError):
         validate_update_data(test_input, test_schema)
+
+
+@pytest.mark.usefixtures("rm_folder")
+def test_dump_db_is_atomic(monkeypatch):
+    create_db_folders("./test_onstro")
+    df = pd.DataFrame({"name": ["ab", "ac"]}, index=["1", "2"])
+    dump_db(df, "./test_onstro", "test")
+
+    def fail(self, f, *args, **kwargs):
+        f.write(b"partial")
+        raise OSError("disk full")
+
+    monkeypatch.setattr(pd.DataFrame, "to_pickle", fail)
+    with pytest.raises(OSError):
+        dump_db(df.iloc[:1], "./test_onstro", "test")
+    monkeypatch.undo()
+
+    pd.testing.assert_frame_equal(load_db("./test_onstro", "test"), df)
+    assert os.listdir("./test_onstro") == ["test.db"]
+
+
+@pytest.mark.usefixtures("rm_folder")
+def test_generation():
+    create_db_folders("./test_onstro")
+    assert load_generation("./test_onstro", "test") == 0
+
+    dump_generation(3, "./test_onstro", "test")
+    assert load_generation("./test_onstro", "test") == 3
+    assert Path("./test_onstro/test.gen.tmp").is_file() is False
@@ -0,0 +1,102 @@
+import copy
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from onstrodb.core.utils import records_to_df
+from onstrodb.core.validator import SchemaValidator
+
+
+test_schema: Dict[str, Dict[str, object]] = {
+    "name": {"type": "str", "required": True},
+    "age": {"type": "int", "required": True},
+    "place": {"type": "str", "default": "canada"},
+    "exp": {"type": "float"}
+}
+
+
+@pytest.fixture
+def validator():
+    return SchemaValidator(test_schema)
+
+
+def test_validator_compiled_schema(validator):
+    assert validator.fields == ["name", "age", "place", "exp"]
+    assert validator.required == {"name", "age"}
+    assert validator.types == {"name": str, "age": int, "place": str, "exp": float}
+    assert validator.defaults == {"place": "canada", "exp": None}
+
+
+@pytest.mark.parametrize(
+    "test_input,output",
+    [
+        ({"name": "ad", "age": 3}, True),
+        ({"name": "ad", "age": 3, "place": "texas", "exp": 1.5}, True),
+        ({"name": "ad"}, False),
+        ({"name": "ad", "age": 3, "city": "texas"}, False),
+        ({"name": "ad", "age": 3.0}, False),
+        ({"name": "ad", "age": True}, False),
+        ({"name": "ad", "age": 3, "exp": None}, False)
+    ]
+)
+def test_validate_record(test_input, output, validator):
+    assert validator.validate_record(test_input) is output
+
+
+@pytest.mark.parametrize(
+    "test_input,output",
+    [
+        ([{"name": "ad", "age": 3}, {"name": "ac", "age": 4, "exp": 1.5}], True),
+        ([{"name": "ad", "age": 3}, {"name": "ac"}], False),
+        ([{"name": "ad", "age": 3}, {"name": "ac", "age": "4"}], False),
+        ([{"name": "ad", "age": 3, "city": "texas"}], False)
+    ]
+)
+def test_validate_df(test_input, output, validator):
+    assert validator.validate_df(records_to_df(test_input)) is output
+
+
+def test_add_defaults(validator):
+    data = {"age": 3, "name": "ad"}
+    assert list(validator.add_defaults(data).items()) == [
+        ("age", 3), ("name", "ad"), ("place", "canada"), ("exp", None)]
+    assert data == {"age": 3, "name": "ad"}
+
+
+def test_validator_does_not_change_the_schema():
+    schema = copy.deepcopy(test_schema)
+    validator = SchemaValidator(schema)
+
+    validator.add_defaults({"name": "ad", "age": 3})
+    validator.add_defaults_to_df(records_to_df([{"name": "ad", "age": 3}]))
+    assert schema == test_schema
+
+
+def test_validator_dtypes():
+    validator = SchemaValidator({
+        "name": {"type": "str"},
+        "age": {"type": "int"},
+        "small": {"type": "int", "dtype": "int8"},
+        "score": {"type": "float", "dtype": "float32"},
+        "alive": {"type": "bool"}
+    })
+
+    assert validator.dtypes == {
+        "name": pd.StringDtype(), "age": "Int64", "small": "Int8", "score": "float32", "alive": "boolean"}
+    assert validator.bounds["small"] == (-128, 127)
+
+    assert validator.validate_record({"small": 127}) is True
+    assert validator.validate_record({"small": 128}) is False
+    assert validator.validate_df(records_to_df([{"small": -129}])) is False
+    assert validator.stored_values({"score": 0.1, "small": 3}) == [float(np.float32(0.1)), 3]
+
+
+def test_validator_dictionary_encoding():
+    validator = SchemaValidator({"name": {"type": "str"}, "city": {"type": "str", "encoding": "dictionary"}})
+
+    assert validator.encoded == {"city"}
+    assert validator.dtypes == {"name": pd.StringDtype(), "city": "category"}
+    assert validator.validate_record({"city": "texas"}) is True
+    assert validator.validate_record({"city": 3}) is False